@@ -19,10 +19,32 @@ class Settings(BaseSettings):
     
     # Telegram Bot
     BOT_TOKEN: str
+    # Другой адрес Bot API (например, scripts/fake_telegram_api.py для нагрузочных тестов)
+    TELEGRAM_API_URL: str | None = None
+
+    # Режим получения апдейтов: "polling" или "webhook" (bot/webhook.py + воркеры из Redis streams)
+    BOT_MODE: str = "polling"
+    WEBHOOK_URL: str | None = None  # публичный адрес, который регистрируется в Telegram
+    WEBHOOK_PATH: str = "/webhook"
+    WEBHOOK_HOST: str = "127.0.0.1"
+    WEBHOOK_PORT: int = 8080
+    WEBHOOK_SECRET: str | None = None
+    UPDATE_STREAM_PARTITIONS: int = 16
+    UPDATE_STREAM_MAXLEN: int = 100_000
+    # Номер этого процесса-воркера и общее число воркеров (партиция p достается воркеру p % count)
+    UPDATE_WORKER_INDEX: int = 0
+    UPDATE_WORKER_COUNT: int = 1
+
+    # Выбор лидера среди реплик: только лидер запускает планировщик и догоняющую генерацию
+    LEADER_ELECTION_ENABLED: bool = True
+    LEADER_LEASE_SECONDS: int = 30  # за это время после падения лидера его место займет другая реплика
+    LEADER_RENEW_SECONDS: int = 10
     
     # Database
     DATABASE_URL: str
     REDIS_URL: str
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
     
     # LLM
     PROXY_API_URL: str
@@ -34,5 +56,90 @@ class Settings(BaseSettings):
     WORKOUT_COOLDOWN_HOURS: int = 12
     LOG_LEVEL: str = "INFO"
 
+    # Weekly generation
+    WEEKLY_GENERATION_CONCURRENCY: int = 5
+    WEEKLY_GENERATION_USER_TIMEOUT: int = 600  # секунды на одного пользователя
+    GENERATION_PAGE_SIZE: int = 500  # пользователей на одну страницу выборки кандидатов
+    MISSED_GENERATION_CONCURRENCY: int = 3  # догоняющая генерация при старте лидера
+
+    # Workout notification queue
+    NOTIFICATION_POLL_SECONDS: int = 30
+    NOTIFICATION_BATCH_SIZE: int = 100
+    NOTIFICATION_LEASE_SECONDS: int = 300
+    NOTIFICATION_SEND_CONCURRENCY: int = 10
+    NOTIFICATION_MAX_LATENESS_HOURS: int = 12
+    EXPIRY_BATCH_SIZE: int = 500  # подписок на один UPDATE при обработке истекших
+    EXPIRY_TIMELINE_SIZE: int = 1000  # ближайших истечений в таймере лидера
+    EXPIRY_TIMELINE_RESYNC_MINUTES: int = 60  # плановая сверка таймера с БД
+
+    # Доступность пользователей: через сколько часов перепроверять через send_chat_action
+    REACHABILITY_STALE_HOURS: int = 72
+
+    # Компактный формат списков упражнений в промпте генерации планов
+    PROMPT_COMPACT_ENCODING: bool = True
+
+    # Фоновая генерация планов по действиям пользователя (bot/services/generation_jobs.py)
+    GENERATION_JOB_WORKERS: int = 3
+    GENERATION_JOB_MAX_ATTEMPTS: int = 2
+    GENERATION_JOB_TTL_SECONDS: int = 1800  # сколько держится защита от повторной постановки
+    GENERATION_JOB_HEARTBEAT_SECONDS: int = 10  # задачи реплики без пульса 3 интервала возвращаются в очередь
+
+    # Клиент LLM-прокси (bot/services/llm_client.py): пулы по назначению, AIMD, предохранитель
+    LLM_CHAT_MAX_CONCURRENCY: int = 20
+    LLM_PLAN_MAX_CONCURRENCY: int = 10
+    LLM_BATCH_MAX_CONCURRENCY: int = 8
+    LLM_CHAT_TARGET_LATENCY: float = 10.0  # секунды; медленнее — лимит пула снижается
+    LLM_PLAN_TARGET_LATENCY: float = 60.0
+    LLM_BATCH_TARGET_LATENCY: float = 90.0
+    LLM_AIMD_DECREASE: float = 0.7
+    LLM_AIMD_COOLDOWN_SECONDS: float = 5.0
+    LLM_BREAKER_FAILURE_THRESHOLD: int = 5
+    LLM_BREAKER_OPEN_SECONDS: int = 30
+    LLM_HEDGING_ENABLED: bool = True
+
+    # Предварительная генерация планов на следующую неделю (bot/services/pregeneration.py)
+    PREGENERATION_ENABLED: bool = True
+    PREGENERATION_LEAD_HOURS: int = 12  # через сколько после последней тренировки недели строить план
+    PREGENERATION_POLL_SECONDS: int = 300
+    PREGENERATION_BATCH_SIZE: int = 50
+    PREGENERATION_CONCURRENCY: int = 2
+    # Предгенерация ждет, пока интерактивных запросов к LLM не станет не больше этого числа
+    PREGENERATION_MAX_INTERACTIVE_LLM: int = 2
+
+    # Локальная периодизация для середины цикла (bot/services/periodization.py); False — всегда через LLM
+    LOCAL_PERIODIZATION_ENABLED: bool = True
+
+    # Стриминг ответов AI-тренера
+    COACH_STREAMING_ENABLED: bool = True
+    COACH_STREAM_EDIT_INTERVAL: float = 1.2  # секунды между правками сообщения
+
+    # Контекст диалога с AI-тренером
+    COACH_CONTEXT_ENABLED: bool = True
+    COACH_CONTEXT_TOKEN_BUDGET: int = 1500  # оценка токенов истории в промпте
+    COACH_CONTEXT_SUMMARY_TOKENS: int = 300
+    COACH_CONTEXT_MAX_TURNS: int = 20  # сколько реплик подгружать из БД при промахе кэша
+    COACH_CONTEXT_TTL_HOURS: int = 72
+
+    # AI coach message quotas
+    MESSAGE_QUOTA_RECONCILE_MINUTES: int = 60
+    MESSAGE_BUFFER_MAX_SIZE: int = 10000  # при заполнении новые сообщения ждут места
+    MESSAGE_BUFFER_BATCH_SIZE: int = 200
+    MESSAGE_BUFFER_FLUSH_SECONDS: float = 2.0
+
+    # Telegram message dispatcher
+    DISPATCHER_GLOBAL_RATE: float = 25.0  # сообщений в секунду на весь бот
+    DISPATCHER_CHAT_RATE: float = 1.0  # сообщений в секунду в один чат
+    DISPATCHER_CHAT_BURST: int = 3
+    DISPATCHER_WORKERS: int = 4
+    DISPATCHER_MAX_RETRIES: int = 3
+
+    # LLM plan cache (только для середины цикла, см. bot/services/plan_cache.py)
+    PLAN_CACHE_ENABLED: bool = True
+    PLAN_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    PLAN_CACHE_LOCAL_SIZE: int = 256
+    PLAN_CACHE_AGE_BUCKET: int = 5
+    PLAN_CACHE_HEIGHT_BUCKET: int = 5
+    PLAN_CACHE_WEIGHT_BUCKET: int = 5
+
 
 settings = Settings()
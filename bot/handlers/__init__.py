@@ -7,6 +7,7 @@ from . import (
     admin,
     payment,
     playlists,
+    chat_member,
 )
 
 # Порядок роутеров важен
@@ -18,6 +19,7 @@ routers = [
     payment.router,
     playlists.router,
     workout.router,
+    chat_member.router,
 ]
 
 # Главный роутер для всех обработчиков
@@ -30,3 +32,4 @@ main_router.include_router(profile.router)
 main_router.include_router(payment.router)
 main_router.include_router(playlists.router)
 main_router.include_router(workout.router)
+main_router.include_router(chat_member.router)
@@ -1,6 +1,7 @@
 from aiogram import Router
 from aiogram.filters import Command
 from aiogram.types import Message
+from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession
 import logging
 
@@ -10,6 +11,20 @@ from bot.requests.user_requests import get_user_by_telegram_id
 from bot.requests.workout_requests import get_next_workout_for_user, get_workout_with_exercises
 from bot.handlers.workout import format_workout_message, get_start_workout_keyboard
 from bot.services.subscription_service import subscription_service
+from bot.services.exercise_catalog import exercise_catalog
+from bot.services.plan_cache import plan_cache
+from bot.services.plan_repair import plan_repair_stats
+from bot.services.periodization import periodization_stats
+from bot.services.pregeneration import pregeneration_queue
+from bot.services.generation_jobs import generation_jobs
+from bot.services.leader_election import leader_election
+from bot.services.expiry_timeline import expiry_timeline
+from bot.services.llm_service import llm_service
+from bot.services.message_quota import message_quota
+from bot.services.message_buffer import message_buffer
+from bot.services.coach_stream import coach_latency
+from bot.middlewares.db import session_metrics
+from bot.utils.message_dispatcher import message_dispatcher
 from datetime import datetime, timedelta
 from database.models import WorkoutStatusEnum
 from bot.requests.stats_requests import (
@@ -66,8 +81,9 @@ async def generate_workout_command(
     )
 
     try:
+        # `/generate true` всегда обращается к LLM, минуя кэш планов
         result = await workout_service.create_and_schedule_weekly_workout(
-            session, message.from_user.id
+            session, message.from_user.id, use_cache=not force_generate
         )
 
         if result:
@@ -221,9 +237,150 @@ async def get_stats_command(message: Message, session: AsyncSession):
             stats_text += f"<b>🆓 Бесплатные (триал):</b> {free_users}\n"
         else:
             stats_text += "Нет данных."
+
+        cache_stats = plan_cache.stats()
+        stats_text += (
+            "\n\n<b>🧠 Кэш планов LLM:</b>\n"
+            f"▪️ Попадания (память/Redis): {cache_stats['hits_local']}/{cache_stats['hits_redis']}\n"
+            f"▪️ Промахи: {cache_stats['misses']}\n"
+            f"▪️ Обход кэша: {cache_stats['bypassed']}\n"
+            f"▪️ Локальная периодизация: {periodization_stats.local_plans}, "
+            f"откатов на LLM: {periodization_stats.llm_fallbacks}\n"
+        )
+
+        stats_text += (
+            "\n<b>⚙️ Генерация после регистрации/оплаты:</b>\n"
+            f"▪️ В очереди: {await generation_jobs.pending()}, поставлено: {generation_jobs.submitted}, "
+            f"повторных нажатий: {generation_jobs.deduplicated}\n"
+            f"▪️ Готово: {generation_jobs.completed}, ошибок: {generation_jobs.failed}, "
+            f"восстановлено после рестарта: {generation_jobs.recovered}\n"
+        )
+
+        stats_text += (
+            "\n<b>👑 Фоновые задачи:</b>\n"
+            f"▪️ Реплика: {leader_election.instance_id}\n"
+            f"▪️ Лидер: {'да' if leader_election.is_leader else 'нет'}, "
+            f"срок: {leader_election.term}, избраний: {leader_election.elections}\n"
+            f"▪️ Таймер подписок: {len(expiry_timeline)} в очереди, ближайшее истечение: "
+            f"{expiry_timeline.next_expiry or '—'}, срабатываний: {expiry_timeline.fired}\n"
+        )
+
+        stats_text += (
+            "\n<b>📅 Предварительная генерация:</b>\n"
+            f"▪️ В очереди: {await pregeneration_queue.size()}, поставлено: {pregeneration_queue.scheduled}\n"
+            f"▪️ Сгенерировано: {pregeneration_queue.generated}, пропущено: {pregeneration_queue.skipped}, "
+            f"ошибок: {pregeneration_queue.failed}\n"
+            f"▪️ Интерактивных запросов к LLM сейчас: {llm_service.interactive_in_flight}\n"
+        )
+
+        stats_text += (
+            "\n<b>🛠 Проверка планов LLM:</b>\n"
+            f"▪️ Проверено: {plan_repair_stats.checked}, без исправлений: {plan_repair_stats.clean}\n"
+            f"▪️ Исправлено (без полной перегенерации): {plan_repair_stats.repaired}, "
+            f"на полную перегенерацию: {plan_repair_stats.failed}\n"
+            f"▪️ Названия: по id {plan_repair_stats.names_resolved_by_id}, нечетко {plan_repair_stats.names_fuzzy_matched}; "
+            f"повторения: {plan_repair_stats.reps_coerced}; order: {plan_repair_stats.orders_renumbered}\n"
+            f"▪️ Лишних дней отрезано: {plan_repair_stats.days_trimmed}, дней переспрошено: {plan_repair_stats.days_reasked}\n"
+        )
+
+        stats_text += (
+            "\n<b>🗄 Сессии БД:</b>\n"
+            f"▪️ Апдейтов: {session_metrics.updates}, с обращением к БД: {session_metrics.connections_used}\n"
+            f"▪️ Запросов: {session_metrics.statements}, время удержания: {session_metrics.held_seconds:.1f}с\n"
+        )
+
+        quota_stats = message_quota.stats()
+        last_reconciled = (
+            message_quota.last_reconciled_at.strftime('%d.%m %H:%M')
+            if message_quota.last_reconciled_at
+            else "не было"
+        )
+        stats_text += (
+            "\n<b>💬 Лимиты сообщений тренеру:</b>\n"
+            f"▪️ Проверок через Redis: {quota_stats['hits']}, засеяно из БД: {quota_stats['seeded']}\n"
+            f"▪️ Проверок через БД (Redis недоступен): {quota_stats['fallbacks']}\n"
+            f"▪️ Сверено счетчиков: {quota_stats['reconciled']}, исправлено: {quota_stats['repaired']}\n"
+            f"▪️ Последняя сверка: {last_reconciled}\n"
+        )
+
+        buffer_stats = message_buffer.stats
+        stats_text += (
+            "\n<b>📝 Запись сообщений:</b>\n"
+            f"▪️ В буфере: {message_buffer.pending}, записано: {buffer_stats.flushed} ({buffer_stats.batches} пачек)\n"
+            f"▪️ Средняя пачка: {buffer_stats.avg_batch:.1f}, скорость: {buffer_stats.rows_per_second:.0f} строк/с\n"
+            f"▪️ Макс. время записи: {buffer_stats.max_flush_seconds:.2f}с, ошибок: {buffer_stats.flush_errors}, "
+            f"отброшено: {buffer_stats.dropped}, "
+            f"ожиданий места: {buffer_stats.backpressure_waits}\n"
+        )
+
+        stats_text += (
+            "\n<b>🤖 Ответы тренера:</b>\n"
+            f"▪️ Стриминг: {coach_latency.streamed}, целиком: {coach_latency.single_shot}, "
+            f"откатов со стриминга: {coach_latency.fallbacks}\n"
+            f"▪️ TTFT p50/p90: {coach_latency.percentile(coach_latency.ttft, 50):.1f}с/"
+            f"{coach_latency.percentile(coach_latency.ttft, 90):.1f}с\n"
+            f"▪️ Полный ответ p50/p90: {coach_latency.percentile(coach_latency.total, 50):.1f}с/"
+            f"{coach_latency.percentile(coach_latency.total, 90):.1f}с\n"
+        )
+
+        dispatch_stats = message_dispatcher.stats
+        stats_text += (
+            "\n<b>📨 Отправка сообщений:</b>\n"
+            f"▪️ В очереди: {message_dispatcher.queue_size}\n"
+            f"▪️ Отправлено: {dispatch_stats.sent}, ошибок: {dispatch_stats.failed}, заблокировали: {dispatch_stats.blocked}\n"
+            f"▪️ RetryAfter: {dispatch_stats.retried}\n"
+            f"▪️ Задержка (средняя/макс.): {dispatch_stats.avg_latency:.1f}с/{dispatch_stats.max_latency:.1f}с\n"
+        )
         
         await message.answer(stats_text, parse_mode="HTML")
 
     except Exception as e:
         logging.error(f"Error in /stats command: {e}", exc_info=True)
         await message.answer("❌ Произошла ошибка при получении статистики.")
+
+
+@router.message(Command("reload_catalog"), is_admin)
+async def reload_catalog_command(message: Message, session: AsyncSession, redis: Redis):
+    """
+    Перезагружает каталог упражнений в памяти и оповещает остальные процессы бота.
+    """
+    try:
+        old_version = exercise_catalog.version
+        new_version = await exercise_catalog.load(session)
+        await exercise_catalog.publish_changed(redis)
+        await message.answer(
+            f"✅ Каталог упражнений перезагружен.\n"
+            f"Версия: <code>{old_version}</code> → <code>{new_version}</code>",
+            parse_mode="HTML",
+        )
+    except Exception as e:
+        logging.error(f"Error in /reload_catalog command: {e}", exc_info=True)
+        await message.answer("❌ Не удалось перезагрузить каталог упражнений.")
+
+
+@router.message(Command("llm"), is_admin)
+async def llm_state_command(message: Message):
+    """
+    Показывает состояние клиента LLM-прокси: предохранитель, пулы и хеджирование.
+    """
+    snapshot = llm_service.llm_client.snapshot()
+    breaker = snapshot["breaker"]
+    breaker_titles = {"closed": "🟢 замкнут", "open": "🔴 разомкнут", "half_open": "🟡 пробный запрос"}
+    text = (
+        "<b>🤖 LLM-прокси</b>\n\n"
+        f"<b>Предохранитель:</b> {breaker_titles.get(breaker['state'], breaker['state'])}\n"
+        f"▪️ Сбоев подряд: {breaker['consecutive_failures']}, размыканий: {breaker['times_opened']}\n"
+        f"▪️ Отклонено без запроса: {breaker['short_circuited']}\n"
+        f"▪️ Хеджирований: {snapshot['hedges_started']}, вторая попытка быстрее: {snapshot['hedges_won']}\n"
+    )
+    pool_titles = {"chat": "Чат с тренером", "plan": "Генерация по запросу", "batch": "Фоновая генерация"}
+    for name, pool in snapshot["pools"].items():
+        p50 = f"{pool['p50']:.1f}с" if pool["p50"] is not None else "—"
+        p90 = f"{pool['p90']:.1f}с" if pool["p90"] is not None else "—"
+        text += (
+            f"\n<b>{pool_titles.get(name, name)}:</b>\n"
+            f"▪️ Лимит: {pool['limit']}, выполняется: {pool['in_flight']}, ждут: {pool['waiting']}\n"
+            f"▪️ Успешно: {pool['completed']}, ошибок: {pool['errors']}, отказов по очереди: {pool['rejected']}\n"
+            f"▪️ Задержка p50/p90: {p50}/{p90}\n"
+        )
+    await message.answer(text, parse_mode="HTML")
@@ -0,0 +1,27 @@
+from aiogram import Router
+from aiogram.filters import ChatMemberUpdatedFilter, KICKED, MEMBER
+from aiogram.types import ChatMemberUpdated
+from sqlalchemy.ext.asyncio import AsyncSession
+import logging
+
+from bot.requests.user_requests import set_user_blocked
+from bot.utils.bot_messages import mark_user_blocked
+
+router = Router()
+
+
+@router.my_chat_member(ChatMemberUpdatedFilter(member_status_changed=KICKED))
+async def user_blocked_bot(event: ChatMemberUpdated, session: AsyncSession):
+    """
+    Пользователь заблокировал бота: запоминаем это, чтобы не тратить на него генерацию и отправки.
+    """
+    await mark_user_blocked(session, event.from_user.id)
+
+
+@router.my_chat_member(ChatMemberUpdatedFilter(member_status_changed=MEMBER))
+async def user_unblocked_bot(event: ChatMemberUpdated, session: AsyncSession):
+    """
+    Пользователь снова разблокировал бота.
+    """
+    logging.info(f"User {event.from_user.id} unblocked the bot.")
+    await set_user_blocked(session, event.from_user.id, blocked=False)
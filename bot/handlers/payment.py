@@ -1,4 +1,4 @@
-from aiogram import Router, F
+from aiogram import Bot, Router, F
 from aiogram.fsm.context import FSMContext
 from aiogram.types import (
     Message,
@@ -17,7 +17,7 @@ from bot.requests.workout_requests import get_next_workout_for_user
 from bot.requests import subscription_requests
 from bot.requests.payment_requests import create_payment
 from bot.services.subscription_service import subscription_service
-from bot.services.workout_service import WorkoutService
+from bot.services.generation_jobs import generation_jobs, GenerationJob
 from bot.keyboards.payment import get_payment_keyboard
 from bot.keyboards.registration import get_main_menu_keyboard
 
@@ -70,7 +70,7 @@ async def pre_checkout_query_handler(pre_checkout_query: PreCheckoutQuery):
 
 @router.message(F.successful_payment)
 async def successful_payment_handler(
-    message: Message, session: AsyncSession, workout_service: WorkoutService
+    message: Message, session: AsyncSession
 ):
     """Обрабатывает успешный платеж."""
     telegram_id = message.from_user.id
@@ -118,33 +118,33 @@ async def successful_payment_handler(
         "Сейчас я подготовлю для вас план тренировок на оставшуюся часть недели..."
     )
 
-    try:
-        result = await workout_service.create_and_schedule_weekly_workout(
-            session, user.telegram_id
+    # План строится в фоне, результат придет отдельным сообщением (см. send_payment_plan_result)
+    submitted = await generation_jobs.submit(user.telegram_id, "payment", {"chat_id": message.chat.id})
+    if not submitted:
+        logging.info(f"Plan generation for user {user.telegram_id} is already in progress.")
+
+
+@generation_jobs.on_result("payment")
+async def send_payment_plan_result(bot: Bot, job: GenerationJob, result) -> None:
+    """Присылает результат фоновой генерации плана после оплаты."""
+    chat_id = job.payload.get("chat_id", job.telegram_id)
+    if not result:
+        await bot.send_message(
+            chat_id, "Не удалось создать план тренировок. Пожалуйста, свяжитесь с поддержкой."
         )
-        if result:
-            plan_summary, next_workout_datetime = result
-            if next_workout_datetime:
-                await message.answer(
-                    f"🚀 Ваш план готов! Первая тренировка запланирована на "
-                    f"{next_workout_datetime.strftime('%d.%m.%Y в %H:%M')}. "
-                    "Я пришлю уведомление в нужное время."
-                )
-            else:
-                await message.answer(
-                    "✅ План на эту неделю сгенерирован, но на оставшиеся дни "
-                    "тренировок нет. Новый план будет создан в начале следующей недели."
-                )
-        else:
-            await message.answer(
-                "Не удалось создать план тренировок. Пожалуйста, свяжитесь с поддержкой."
-            )
-    except Exception as e:
-        logging.exception(
-            f"Error generating workout plan after payment for user {user.id}"
+        return
+
+    plan_summary, next_workout_datetime = result
+    if next_workout_datetime:
+        await bot.send_message(
+            chat_id,
+            f"🚀 Ваш план готов! Первая тренировка запланирована на "
+            f"{next_workout_datetime.strftime('%d.%m.%Y в %H:%M')}. "
+            "Я пришлю уведомление в нужное время."
         )
-        await message.answer(
-            "Произошла ошибка при создании вашего плана тренировок. "
-            "Пожалуйста, свяжитесь с поддержкой."
+    else:
+        await bot.send_message(
+            chat_id,
+            "✅ План на эту неделю сгенерирован, но на оставшиеся дни "
+            "тренировок нет. Новый план будет создан в начале следующей недели."
         )
-
@@ -1,4 +1,5 @@
-from aiogram import Router, F
+from aiogram import Bot, Router, F
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery, Message
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -27,7 +28,7 @@ from bot.schemas.user import UserRegistrationSchema
 from bot.requests import user_requests, subscription_requests
 from bot.requests.schedule_requests import create_or_update_user_schedule
 from bot.requests.user_requests import get_user_by_telegram_id
-from bot.services.workout_service import WorkoutService
+from bot.services.generation_jobs import generation_jobs, GenerationJob
 from bot.config.settings import DAYS_OF_WEEK_RU_FULL
 
 
@@ -345,7 +346,6 @@ async def confirm_registration(
     query: CallbackQuery,
     state: FSMContext,
     session: AsyncSession,
-    workout_service: WorkoutService,
 ):
     """
     Подтверждение регистрации, сохранение пользователя и запуск генерации плана.
@@ -426,56 +426,17 @@ async def confirm_registration(
             "🤖 Создаю для тебя индивидуальный план тренировок на неделю..."
         )
 
-        # Генерация, планирование и получение summary и даты
-        result = await workout_service.create_and_schedule_weekly_workout(
-            session, user.telegram_id
+        # План строится в фоне: хэндлер не держит сессию БД на время работы LLM,
+        # а результат придет отдельным сообщением (см. send_registration_plan_result)
+        submitted = await generation_jobs.submit(
+            user.telegram_id,
+            "registration",
+            {"chat_id": query.message.chat.id, "loading_message_id": loading_message.message_id},
         )
-
-        logging.info(f"Result from create_and_schedule_weekly_workout for user {user.telegram_id}: {result}")
-
-        if result:
-            plan_summary, next_workout_datetime = result
-
-            summary_text = (
-                f"<b>Тип программы:</b> {plan_summary.periodization_type}\n"
-                f"<b>Сплит:</b> {plan_summary.split_type}\n"
-                f"<b>Цель на неделю:</b> {plan_summary.primary_goal}"
-            )
-
-            if next_workout_datetime:
-                # Ручное форматирование даты для надежности
-                day_en = next_workout_datetime.strftime('%A')
-                day_ru = DAYS_OF_WEEK_RU.get(day_en, day_en)
-                formatted_date = f"{day_ru}, {next_workout_datetime.strftime('%d.%m.%Y в %H:%M')}"
-
-                final_text = (
-                    f"✅ <b>Ваш план тренировок на неделю готов!</b>\n\n"
-                    f"{summary_text}\n\n"
-                    f"🗓️ Ваша следующая тренировка запланирована на <b>{formatted_date}</b>. "
-                    "Я пришлю уведомление в назначенное время. Хотите посмотреть план уже сейчас?"
-                )
-            else:
-                final_text = (
-                    f"✅ <b>Ваш план тренировок на неделю готов!</b>\n\n"
-                    f"{summary_text}\n\n"
-                    "На этой неделе запланированных тренировок нет. "
-                    "Новый план будет создан в начале следующей недели."
-                )
-
+        if not submitted:
+            # Повторное нажатие: план для пользователя уже готовится
+            logging.info(f"Plan generation for user {user.telegram_id} is already in progress.")
             await loading_message.delete()
-            await query.message.answer(
-                final_text,
-                reply_markup=get_post_registration_keyboard(),
-                parse_mode="HTML"
-            )
-        else:
-            # Если workout_service вернул None
-            await loading_message.delete()
-            await query.message.answer(
-                "❌ Не удалось создать план тренировок. "
-                "Пожалуйста, попробуйте позже или свяжитесь с поддержкой.",
-                reply_markup=get_post_registration_keyboard(),
-            )
 
     except Exception as e:
         logging.exception("Error during registration confirmation")
@@ -492,6 +453,62 @@ async def confirm_registration(
         await query.answer()
 
 
+@generation_jobs.on_result("registration")
+async def send_registration_plan_result(bot: Bot, job: GenerationJob, result) -> None:
+    """Присылает новому пользователю результат фоновой генерации первого плана."""
+    chat_id = job.payload.get("chat_id", job.telegram_id)
+    loading_message_id = job.payload.get("loading_message_id")
+    if loading_message_id:
+        try:
+            await bot.delete_message(chat_id, loading_message_id)
+        except TelegramBadRequest:
+            pass
+
+    if not result:
+        await bot.send_message(
+            chat_id,
+            "❌ Не удалось создать план тренировок. "
+            "Пожалуйста, попробуйте позже или свяжитесь с поддержкой.",
+            reply_markup=get_post_registration_keyboard(),
+        )
+        return
+
+    plan_summary, next_workout_datetime = result
+
+    summary_text = (
+        f"<b>Тип программы:</b> {plan_summary.periodization_type}\n"
+        f"<b>Сплит:</b> {plan_summary.split_type}\n"
+        f"<b>Цель на неделю:</b> {plan_summary.primary_goal}"
+    )
+
+    if next_workout_datetime:
+        # Ручное форматирование даты для надежности
+        day_en = next_workout_datetime.strftime('%A')
+        day_ru = DAYS_OF_WEEK_RU.get(day_en, day_en)
+        formatted_date = f"{day_ru}, {next_workout_datetime.strftime('%d.%m.%Y в %H:%M')}"
+
+        final_text = (
+            f"✅ <b>Ваш план тренировок на неделю готов!</b>\n\n"
+            f"{summary_text}\n\n"
+            f"🗓️ Ваша следующая тренировка запланирована на <b>{formatted_date}</b>. "
+            "Я пришлю уведомление в назначенное время. Хотите посмотреть план уже сейчас?"
+        )
+    else:
+        final_text = (
+            f"✅ <b>Ваш план тренировок на неделю готов!</b>\n\n"
+            f"{summary_text}\n\n"
+            "На этой неделе запланированных тренировок нет. "
+            "Новый план будет создан в начале следующей недели."
+        )
+
+    await bot.send_message(
+        chat_id,
+        final_text,
+        reply_markup=get_post_registration_keyboard(),
+        parse_mode="HTML"
+    )
+
+
 @router.callback_query(RegistrationStates.waiting_for_confirmation, F.data == "edit_registration")
 async def edit_registration(query: CallbackQuery, state: FSMContext):
     """
@@ -4,6 +4,7 @@ from aiogram.types import Message, CallbackQuery, ReplyKeyboardRemove
 from aiogram.fsm.context import FSMContext
 from sqlalchemy.ext.asyncio import AsyncSession
 import logging
+from datetime import datetime
 from aiogram.exceptions import TelegramBadRequest
 
 from bot.requests.user_requests import get_user_by_telegram_id, add_score_to_user
@@ -12,12 +13,17 @@ from bot.requests.workout_requests import (
     update_workout_status,
     get_next_workout_for_user,
     get_workout_exercise_details,
+    mark_workout_notified,
 )
-from bot.requests import message_requests
+from bot.requests.exercise_requests import get_exercise_by_id
 from bot.services.workout_service import WorkoutService
-from bot.services.llm_service import llm_service, MessageLimitStatus
+from bot.services.message_quota import message_quota
+from bot.services.message_buffer import message_buffer
+from bot.services.coach_stream import answer_coach_question
+from bot.services.llm_client import LLMUnavailableError
+from bot.services.coach_context import coach_context
+from bot.services.exercise_catalog import exercise_catalog
 from database.models import Workout, WorkoutStatusEnum
-from bot.scheduler import scheduler
 from bot.states.workout import WorkoutState
 from bot.states.llm import LLMState
 from bot.states.chat import ChatState
@@ -109,16 +115,21 @@ async def send_current_exercise(
 
     workout_exercise_id = exercise_ids[current_index]
 
-    # Получаем детали упражнения из БД
-    workout_exercise = await get_workout_exercise_details(session, workout_exercise_id)
-    if not workout_exercise or not workout_exercise.exercise:
+    # Получаем подходы/повторения из БД, а само упражнение — из каталога в памяти
+    workout_exercise = await get_workout_exercise_details(
+        session, workout_exercise_id, load_exercise=False
+    )
+    exercise = None
+    if workout_exercise:
+        exercise = exercise_catalog.get(workout_exercise.exercise_id)
+        if not exercise:
+            exercise = await get_exercise_by_id(session, workout_exercise.exercise_id)
+    if not workout_exercise or not exercise:
         # Обработка ошибки, если упражнение не найдено
         await message.answer("Не удалось загрузить упражнение. Тренировка прервана.")
         await state.clear()
         return
 
-    exercise = workout_exercise.exercise
-
     # Формируем сообщение
     caption = (
         f"Упражнение {current_index + 1}/{total_exercises}\n\n"
@@ -255,10 +266,8 @@ async def get_workout_handler_callback(
             # Фиксируем отправку тренировки для триала
             await subscription_service.record_workout_sent(session, user)
 
-            try:
-                scheduler.remove_job(f"workout_{workout.id}")
-            except Exception as e:
-                logging.warning(f"Could not remove job workout_{workout.id}. Maybe it was already triggered. Error: {e}")
+            # Тренировка уже показана — убираем ее из очереди уведомлений
+            await mark_workout_notified(session, workout.id)
         else:
             await query.message.answer("Не удалось загрузить детали тренировки.")
     else:
@@ -303,10 +312,8 @@ async def get_workout_now_handler(query: CallbackQuery, session: AsyncSession):
         # Фиксируем отправку тренировки для триала
         await subscription_service.record_workout_sent(session, user)
 
-        try:
-            scheduler.remove_job(f"workout_{workout_id}")
-        except Exception as e:
-            logging.warning(f"Could not remove job workout_{workout_id}. Maybe it was already triggered. Error: {e}")
+        # Тренировка уже показана — убираем ее из очереди уведомлений
+        await mark_workout_notified(session, workout_id)
     else:
         await query.message.answer(
             "Не удалось найти эту тренировку. Возможно, она была удалена."
@@ -541,8 +548,8 @@ async def ai_coach_text_handler(message: Message, state: FSMContext, session: As
         )
         return
 
-    # Проверка лимита сообщений
-    limit_status = await llm_service.get_message_limit_status(session, user.id)
+    # Проверка лимита сообщений (атомарный счетчик в Redis; сообщение сразу засчитывается)
+    limit_status = await message_quota.try_consume(session, user.id)
 
     if not limit_status.can_send:
         if limit_status.is_trial:
@@ -559,8 +566,8 @@ async def ai_coach_text_handler(message: Message, state: FSMContext, session: As
             )
         return
 
-    # Сохраняем сообщение пользователя
-    await message_requests.add_message(session, user_id=user.id, message=message.text)
+    # Время сообщения фиксируем сразу, а в БД оно запишется вместе с ответом тренера
+    received_at = datetime.now()
 
     # Предупреждения для триального периода
     if limit_status.is_trial:
@@ -579,11 +586,17 @@ async def ai_coach_text_handler(message: Message, state: FSMContext, session: As
 
     await message.bot.send_chat_action(chat_id=message.chat.id, action="typing")
     await state.set_state(LLMState.processing)
+    response = None
     try:
-        response = await llm_service.generate_ai_coach_response(
-            message.text,
+        history = await coach_context.get_history(session, user.id)
+        response = await answer_coach_question(message, message.text, history)
+        await coach_context.add_turn(session, user.id, message.text, response)
+    except LLMUnavailableError:
+        logging.warning("AI coach is unavailable: LLM proxy is overloaded or down")
+        await message.answer(
+            "⏳ Тренер сейчас перегружен вопросами. "
+            "Пожалуйста, попробуйте задать вопрос через минуту."
         )
-        await message.answer(response, parse_mode="HTML")
     except Exception as e:
         logging.exception("Error in AI coach response generation")
         await message.answer(
@@ -591,6 +604,9 @@ async def ai_coach_text_handler(message: Message, state: FSMContext, session: As
             "Попробуйте задать вопрос еще раз."
         )
     finally:
+        # Сохраняем сообщение пользователя (запись в БД идет пачками в фоне)
+        await message_buffer.add(user.id, message.text, response=response, created_at=received_at)
+
         # После ответа LLM, возвращаемся в правильное состояние
         current_state_str = await state.get_state()
         if current_state_str == LLMState.processing:
@@ -1,6 +1,6 @@
 import asyncio
 import logging
-from aiogram import Bot, Dispatcher
+from aiogram import Dispatcher
 from aiogram.fsm.storage.redis import RedisStorage
 from redis.asyncio import Redis
 from aiogram.types import TelegramObject
@@ -15,11 +15,21 @@ from database.connection import create_session_pool, create_tables
 from bot.scheduler import (
     scheduler,
     check_expired_subscriptions,
-    restore_scheduled_jobs,
     setup_scheduler,
 )
 from aiogram.dispatcher.middlewares.base import BaseMiddleware
 
+from bot.services.exercise_catalog import exercise_catalog
+from bot.services.plan_cache import plan_cache
+from bot.services.message_quota import message_quota
+from bot.services.message_buffer import message_buffer
+from bot.services.coach_context import coach_context
+from bot.services.pregeneration import pregeneration_queue
+from bot.services.generation_jobs import generation_jobs
+from bot.services.leader_election import leader_election
+from bot.utils.message_dispatcher import message_dispatcher
+from bot.update_stream import UpdateStreamConsumer
+from bot.webhook import create_bot
 from bot.services.workout_service import (
     WorkoutService,
     check_and_generate_missed_workouts,
@@ -46,33 +56,88 @@ async def main():
     storage = RedisStorage(redis=redis)
     
     # Инициализация бота и диспетчера
-    bot = Bot(token=settings.BOT_TOKEN, default_parse_mode="HTML")
+    bot = create_bot()
     dp = Dispatcher(storage=storage)
     
     # Создание пула сессий БД
     session_pool = create_session_pool()
+
+    # Загрузка каталога упражнений в память и подписка на его изменения
+    await exercise_catalog.refresh(session_pool)
+    catalog_listener = asyncio.create_task(exercise_catalog.listen_for_changes(redis, session_pool))
+    dp["redis"] = redis
+    plan_cache.setup(redis)
+    message_quota.setup(redis)
+    coach_context.setup(redis)
+    pregeneration_queue.setup(redis)
+
+    # Фоновая пакетная запись сообщений пользователей
+    message_buffer.setup(session_pool)
+    message_buffer.start()
+
+    # Очередь исходящих сообщений с учетом лимитов Telegram
+    message_dispatcher.setup(bot, session_pool)
+    message_dispatcher.start()
     
     # Подключение middleware
     dp.update.middleware(DbSessionMiddleware(session_pool=session_pool))
     dp.update.middleware(BotObjectMiddleware(bot_instance=bot))
     workout_service = WorkoutService(bot, session_pool)
     dp.update.middleware(WorkoutServiceMiddleware(workout_service=workout_service))
+
+    # Фоновая генерация планов после регистрации и оплаты
+    generation_jobs.setup(redis, bot, session_pool, workout_service)
+    await generation_jobs.start()
     
     # Подключение роутеров
     dp.include_router(admin_router)
     dp.include_router(main_router)
 
-    # Запускаем восстановление и проверку в фоновом режиме
-    asyncio.create_task(restore_scheduled_jobs(bot, session_pool))
-    asyncio.create_task(check_and_generate_missed_workouts(bot, session_pool, workout_service))
+    # Запуск фоновых задач (проверка подписок, еженедельная генерация).
+    # Они выполняются только на реплике-лидере; апдейты и уведомления о тренировках
+    # обрабатывают все реплики.
+    setup_scheduler(bot, session_pool, workout_service, redis)
+
+    missed_check: asyncio.Task | None = None
+
+    async def on_elected():
+        # Проверка пропущенной генерации — в фоне, при каждом избрании лидером.
+        # Уведомления о тренировках восстанавливать не нужно: они берутся из очереди в БД.
+        nonlocal missed_check
+        if missed_check is None or missed_check.done():
+            missed_check = asyncio.create_task(
+                check_and_generate_missed_workouts(bot, session_pool, workout_service, redis)
+            )
+
+    async def on_demoted():
+        # Бывший лидер не должен догенерировать планы параллельно с новым
+        if missed_check is not None:
+            missed_check.cancel()
+            await asyncio.gather(missed_check, return_exceptions=True)
 
-    # Запуск фоновых задач (проверка подписок, еженедельная генерация)
-    setup_scheduler(bot, session_pool, workout_service)
+    leader_election.setup(redis)
+    leader_election.on_elected(on_elected)
+    leader_election.on_demoted(on_demoted)
+    leader_election.start()
 
     try:
-        await bot.delete_webhook(drop_pending_updates=True)
-        await dp.start_polling(bot)
+        if settings.BOT_MODE == "webhook":
+            # Апдейты принимает bot/webhook.py, здесь — только обработка своих партиций
+            consumer = UpdateStreamConsumer(
+                redis, dp, bot, settings.UPDATE_WORKER_INDEX, settings.UPDATE_WORKER_COUNT
+            )
+            await consumer.run()
+        else:
+            await bot.delete_webhook(drop_pending_updates=True)
+            await dp.start_polling(bot)
     finally:
+        await leader_election.stop()
+        await on_demoted()
+        await generation_jobs.stop()
+        await message_dispatcher.stop()
+        await message_buffer.stop()
+        catalog_listener.cancel()
+        await asyncio.gather(catalog_listener, return_exceptions=True)
         await bot.session.close()
         await redis.close()
         logger.info("Бот остановлен")
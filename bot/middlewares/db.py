@@ -2,13 +2,49 @@
 
 # Строки 1-6: Импорты
 # Импортируем стандартные типы Python для аннотаций, чтобы сделать код более читаемым.
+import logging
+from dataclasses import dataclass
+from time import monotonic
 from typing import Callable, Dict, Any, Awaitable
 
 # Импортируем классы из aiogram, необходимые для создания middleware.
 from aiogram import BaseMiddleware, Bot
 from aiogram.types import TelegramObject
 # Импортируем "фабрику сессий" из SQLAlchemy для создания подключений к БД.
-from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+
+@dataclass
+class SessionMetrics:
+    """Накопительная статистика использования сессий БД по апдейтам."""
+    updates: int = 0
+    connections_used: int = 0  # апдейты, в которых сессия действительно взяла соединение
+    statements: int = 0
+    held_seconds: float = 0.0
+
+
+session_metrics = SessionMetrics()
+
+
+class _SessionUsage:
+    """
+    Счетчики одной сессии: AsyncSession берет соединение из пула только при первом
+    запросе (событие after_begin), поэтому время удержания считается с этого момента.
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.statements = 0
+        self.connected_at: float | None = None
+        event.listen(session.sync_session, "after_begin", self._on_begin)
+        event.listen(session.sync_session, "do_orm_execute", self._on_execute)
+
+    def _on_begin(self, session, transaction, connection) -> None:
+        if self.connected_at is None:
+            self.connected_at = monotonic()
+
+    def _on_execute(self, orm_execute_state) -> None:
+        self.statements += 1
 
 # Строка 9: Объявление класса
 # Мы создаем наш собственный класс DbSessionMiddleware и указываем, что он наследуется
@@ -37,10 +73,12 @@ class DbSessionMiddleware(BaseMiddleware):
     ) -> Any:
 
         # Строка 24: Создание сессии
-        # 'async with' создает новое, свежее подключение (сессию) к базе данных
-        # и гарантирует, что оно будет автоматически и безопасно закрыто после
-        # выполнения кода внутри блока, даже если произойдет ошибка.
+        # 'async with' создает новую сессию и гарантирует, что она будет закрыта после
+        # выполнения кода внутри блока, даже если произойдет ошибка. Соединение из пула
+        # сессия берет только при первом запросе, так что апдейты без обращений к БД
+        # соединение не занимают.
         async with self.session_pool() as session:
+            usage = _SessionUsage(session)
 
             # Строка 25: "Прокидывание" сессии в data
             # Это ключевой момент! Мы добавляем в словарь 'data' нашу созданную сессию
@@ -50,7 +88,19 @@ class DbSessionMiddleware(BaseMiddleware):
             # Строка 26: Вызов следующего обработчика
             # Мы вызываем следующий обработчик (например, наш хэндлер process_age),
             # передавая ему событие и обновленный словарь 'data' с сессией.
-            return await handler(event, data)
+            try:
+                return await handler(event, data)
+            finally:
+                held_seconds = monotonic() - usage.connected_at if usage.connected_at is not None else 0.0
+                session_metrics.updates += 1
+                if usage.connected_at is not None:
+                    session_metrics.connections_used += 1
+                    session_metrics.statements += usage.statements
+                    session_metrics.held_seconds += held_seconds
+                logging.debug(
+                    f"Update processed: connection_used={usage.connected_at is not None}, "
+                    f"statements={usage.statements}, held={held_seconds:.3f}s"
+                )
 
 
 class BotObjectMiddleware(BaseMiddleware):
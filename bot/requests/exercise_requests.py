@@ -23,6 +23,17 @@ async def add_exercises_bulk(
     await session.commit()
 
 
+async def get_all_exercises(session: AsyncSession) -> Sequence[Exercise]:
+    """Получает все упражнения (для загрузки каталога в память)."""
+    result = await session.execute(select(Exercise).order_by(Exercise.id))
+    return result.scalars().all()
+
+
+async def get_exercise_by_id(session: AsyncSession, exercise_id: int) -> Exercise | None:
+    """Получает упражнение по его ID."""
+    return await session.get(Exercise, exercise_id)
+
+
 async def get_exercises_by_equipment(
     session: AsyncSession, equipment_type: EquipmentTypeEnum
 ) -> Sequence[Exercise]:
@@ -62,3 +73,15 @@ async def get_first_exercise_from_workout(session: AsyncSession, workout_id: int
     result = await session.execute(stmt)
     workout_exercise = result.scalars().first()
     return workout_exercise.exercise if workout_exercise else None
+
+
+async def get_first_exercise_id_from_workout(session: AsyncSession, workout_id: int) -> int | None:
+    """Получает ID первого упражнения тренировки (без загрузки самого упражнения)."""
+    stmt = (
+        select(WorkoutExercise.exercise_id)
+        .where(WorkoutExercise.workout_id == workout_id)
+        .order_by(WorkoutExercise.order)
+        .limit(1)
+    )
+    result = await session.execute(stmt)
+    return result.scalars().first()
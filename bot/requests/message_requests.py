@@ -1,6 +1,6 @@
 import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select, func, and_, insert
 
 from database.models import UserMessage
 
@@ -14,6 +14,34 @@ async def add_message(session: AsyncSession, user_id: int, message: str) -> User
     return new_message
 
 
+async def add_messages_bulk(session: AsyncSession, rows: list[dict]) -> None:
+    """
+    Сохраняет пачку сообщений одним многострочным INSERT.
+    Каждая строка — словарь с ключами user_id, message, response, created_at.
+    """
+    if not rows:
+        return
+    await session.execute(insert(UserMessage), rows)
+    await session.commit()
+
+
+async def get_recent_dialog(
+    session: AsyncSession, user_id: int, limit: int
+) -> list[tuple[str, str]]:
+    """
+    Возвращает последние `limit` пар (сообщение, ответ тренера) в хронологическом порядке.
+    Сообщения без сохраненного ответа пропускаются.
+    """
+    query = (
+        select(UserMessage.message, UserMessage.response)
+        .where(UserMessage.user_id == user_id, UserMessage.response.is_not(None))
+        .order_by(UserMessage.created_at.desc())
+        .limit(limit)
+    )
+    result = await session.execute(query)
+    return [(message, response) for message, response in reversed(result.all())]
+
+
 async def count_user_messages(
     session: AsyncSession, user_id: int, since: datetime.datetime = None
 ) -> int:
@@ -27,3 +55,27 @@ async def count_user_messages(
     
     result = await session.execute(query)
     return result.scalar_one()
+
+
+async def count_messages_for_periods(
+    session: AsyncSession, periods: list[tuple[int, datetime.datetime | None]]
+) -> list[int]:
+    """
+    Подсчитывает сообщения для списка пар (user_id, since) одним запросом.
+    Возвращает количества в том же порядке, что и `periods`.
+    """
+    if not periods:
+        return []
+    columns = [
+        func.count(UserMessage.id).filter(
+            and_(UserMessage.user_id == user_id, UserMessage.created_at >= since)
+            if since
+            else UserMessage.user_id == user_id
+        )
+        for user_id, since in periods
+    ]
+    query = select(*columns).where(
+        UserMessage.user_id.in_({user_id for user_id, _ in periods})
+    )
+    result = await session.execute(query)
+    return list(result.one())
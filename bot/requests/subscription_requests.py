@@ -2,10 +2,10 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from datetime import datetime
 from typing import Optional
-from sqlalchemy.orm import selectinload
-from sqlalchemy import update
+from sqlalchemy import and_, update
 
 from database.models import Subscription, User
+from bot.services.expiry_timeline import expiry_timeline
 
 
 async def create_subscription(
@@ -65,6 +65,7 @@ async def activate_paid_subscription(
         subscription.trial_workouts_used = 0  # Сбрасываем счетчик триала
         await session.commit()
         await session.refresh(subscription)
+        await expiry_timeline.track(subscription.id, subscription.expires_at)
     return subscription
 
 
@@ -83,35 +84,64 @@ async def extend_subscription(
     if subscription:
         await session.commit()
         await session.refresh(subscription)
+        await expiry_timeline.track(subscription.id, subscription.expires_at)
     return subscription
 
 
-async def get_expired_paid_subscriptions(session: AsyncSession) -> list[Subscription]:
-    """Находит все активные подписки, срок действия которых уже истек."""
+async def get_next_expiries(session: AsyncSession, limit: int) -> list[tuple[int, datetime]]:
+    """
+    Ближайшие `limit` истечений активных подписок (id, expires_at) по возрастанию —
+    читается по индексу ix_subscriptions_status_expires_at.
+    """
     result = await session.execute(
-        select(Subscription)
-        .options(selectinload(Subscription.user))
-        .where(
-            Subscription.status == "active",
-            Subscription.expires_at < datetime.now()
-        )
+        select(Subscription.id, Subscription.expires_at)
+        .where(Subscription.status == "active", Subscription.expires_at.is_not(None))
+        .order_by(Subscription.expires_at)
+        .limit(limit)
     )
-    return result.scalars().all()
+    return [(row.id, row.expires_at) for row in result]
 
 
-async def get_exhausted_trial_subscriptions(session: AsyncSession) -> list[Subscription]:
+async def _flip_status_page(
+    session: AsyncSession, condition, new_status: str, limit: int
+) -> list[tuple[int, int]]:
     """
-    Находит все триальные подписки, у которых количество использованных
-    тренировок равно или больше запланированного.
+    Переводит в `new_status` до `limit` подписок, подходящих под `condition`, одним
+    UPDATE ... FROM users ... RETURNING. Строки выбираются с FOR UPDATE SKIP LOCKED,
+    поэтому параллельный запуск не захватит одну подписку дважды.
+    Возвращает (user_id, telegram_id) переведенных подписок.
     """
+    page = (
+        select(Subscription.id)
+        .where(condition)
+        .order_by(Subscription.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
     stmt = (
-        select(Subscription)
-        .options(selectinload(Subscription.user))
-        .join(Subscription.user)
-        .where(
-            Subscription.status == "trial",
-            Subscription.trial_workouts_used >= 1
-        )
+        update(Subscription)
+        .where(Subscription.id.in_(page), User.id == Subscription.user_id)
+        .values(status=new_status)
+        .returning(Subscription.user_id, User.telegram_id)
+        .execution_options(synchronize_session=False)
     )
     result = await session.execute(stmt)
-    return result.scalars().all()
+    recipients = [(row.user_id, row.telegram_id) for row in result]
+    await session.commit()
+    return recipients
+
+
+async def expire_paid_subscriptions(session: AsyncSession, limit: int) -> list[tuple[int, int]]:
+    """Переводит в expired страницу активных подписок, срок действия которых уже истек."""
+    condition = and_(Subscription.status == "active", Subscription.expires_at < datetime.now())
+    return await _flip_status_page(session, condition, "expired", limit)
+
+
+async def expire_exhausted_trials(session: AsyncSession, limit: int) -> list[tuple[int, int]]:
+    """
+    Переводит в trial_expired страницу триальных подписок, у которых
+    израсходованы тренировки.
+    """
+    condition = and_(Subscription.status == "trial", Subscription.trial_workouts_used >= 1)
+    return await _flip_status_page(session, condition, "trial_expired", limit)
@@ -1,11 +1,20 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
-from datetime import datetime
-
-from database.models import User, WorkoutSchedule, Subscription, SubscriptionStatusEnum
+from sqlalchemy import select, update, or_, and_, exists
+from sqlalchemy.orm import contains_eager
+from datetime import date, datetime, timedelta
+
+from database.models import (
+    User,
+    WorkoutSchedule,
+    Subscription,
+    SubscriptionStatusEnum,
+    Workout,
+    WorkoutStatusEnum,
+)
 from bot.schemas.user import UserRegistrationSchema
 from bot.utils.rank_utils import get_rank_by_score
+from bot.config.settings import settings
+from bot.requests.workout_requests import get_end_of_next_week
 
 
 async def get_user_by_telegram_id(session: AsyncSession, telegram_id: int) -> User | None:
@@ -39,14 +48,22 @@ async def create_or_update_user(
 
 
 async def increment_user_training_week(
-    session: AsyncSession, user_id: int, week_to_set: int | None = None
+    session: AsyncSession,
+    user_id: int,
+    week_to_set: int | None = None,
+    generated_week: date | None = None,
 ) -> User | None:
     """
     Устанавливает номер недели тренировок пользователя.
     Если week_to_set не передано, увеличивает на 1.
+    `generated_week` сдвигает вперед водяной знак генерации (last_generated_week).
     """
     user = await session.get(User, user_id)
     if user:
+        if generated_week is not None and (
+            user.last_generated_week is None or user.last_generated_week < generated_week
+        ):
+            user.last_generated_week = generated_week
         if week_to_set is not None:
             user.current_training_week = week_to_set
         else:
@@ -78,6 +95,37 @@ async def add_score_to_user(
     return None, "Без звания", "Без звания"
 
 
+async def set_user_blocked(session: AsyncSession, telegram_id: int, blocked: bool) -> None:
+    """Отмечает, что пользователь заблокировал бота (или разблокировал)."""
+    await session.execute(
+        update(User)
+        .where(User.telegram_id == telegram_id)
+        .values(blocked_at=datetime.now() if blocked else None)
+    )
+    await session.commit()
+
+
+async def mark_users_delivered(session: AsyncSession, telegram_ids: list[int]) -> None:
+    """Фиксирует успешную доставку сообщений пачке пользователей одним запросом."""
+    if not telegram_ids:
+        return
+    await session.execute(
+        update(User)
+        .where(User.telegram_id.in_(telegram_ids))
+        .values(last_delivered_at=datetime.now(), blocked_at=None)
+    )
+    await session.commit()
+
+
+def reachability_filter(now: datetime | None = None):
+    """
+    SQL-условие: пользователь не заблокировал бота, либо блокировка устарела
+    и его пора перепроверить.
+    """
+    stale_before = (now or datetime.now()) - timedelta(hours=settings.REACHABILITY_STALE_HOURS)
+    return or_(User.blocked_at.is_(None), User.blocked_at < stale_before)
+
+
 async def get_users_with_schedule(session: AsyncSession) -> list[User]:
     """Получает всех пользователей, у которых есть хотя бы одна запись в расписании."""
     stmt = select(User).join(User.workout_schedules).distinct()
@@ -85,52 +133,72 @@ async def get_users_with_schedule(session: AsyncSession) -> list[User]:
     return list(result.scalars().all())
 
 
-async def get_users_for_workout_generation(session: AsyncSession) -> list[User]:
+async def get_users_for_workout_generation(
+    session: AsyncSession,
+    after_user_id: int = 0,
+    limit: int = 500,
+    without_planned_workouts: bool = True,
+    user_ids: list[int] | None = None,
+    generated_before: date | None = None,
+    without_workouts_in_week: date | None = None,
+) -> list[User]:
     """
-    Получает всех пользователей, которым нужны тренировки:
-    - Пользователи с расписанием (workout_schedules)
-    - ИЛИ пользователи с активной подпиской (active или trial)
+    Возвращает страницу пользователей (по возрастанию id, после `after_user_id`),
+    которым действительно нужен новый план, одним запросом:
+    - подписка active (не истекла) или trial с неизрасходованными тренировками;
+    - пользователь не заблокировал бота (см. reachability_filter);
+    - `without_planned_workouts`: нет запланированных тренировок до конца следующей недели;
+    - `user_ids`: только среди указанных пользователей;
+    - `generated_before`: водяной знак генерации раньше этой недели (или его нет);
+    - `without_workouts_in_week`: нет ни одной тренировки на неделе с этим понедельником.
+    Подписка подгружается тем же запросом (contains_eager).
     """
-    # Получаем пользователей с расписанием
-    users_with_schedule = await get_users_with_schedule(session)
-    
-    # Получаем всех пользователей с подпиской и фильтруем в Python
-    # Это позволяет избежать проблем с типами Enum в SQL запросах
     now = datetime.now()
     stmt = (
         select(User)
         .join(User.subscription)
-        .options(selectinload(User.subscription))
+        .options(contains_eager(User.subscription))
+        .where(
+            User.id > after_user_id,
+            reachability_filter(now),
+            or_(
+                and_(
+                    Subscription.status == SubscriptionStatusEnum.active,
+                    or_(Subscription.expires_at.is_(None), Subscription.expires_at > now),
+                ),
+                and_(
+                    Subscription.status == SubscriptionStatusEnum.trial,
+                    User.workout_frequency > 0,
+                    Subscription.trial_workouts_used < User.workout_frequency,
+                ),
+            ),
+        )
+        .order_by(User.id)
+        .limit(limit)
     )
+    if without_planned_workouts:
+        stmt = stmt.where(
+            ~exists().where(
+                Workout.user_id == User.id,
+                Workout.status == WorkoutStatusEnum.planned,
+                Workout.planned_date >= now,
+                Workout.planned_date <= get_end_of_next_week(now),
+            )
+        )
+    if user_ids is not None:
+        stmt = stmt.where(User.id.in_(user_ids))
+    if generated_before is not None:
+        stmt = stmt.where(
+            or_(User.last_generated_week.is_(None), User.last_generated_week < generated_before)
+        )
+    if without_workouts_in_week is not None:
+        week_start = datetime.combine(without_workouts_in_week, datetime.min.time())
+        stmt = stmt.where(
+            ~exists().where(
+                Workout.user_id == User.id,
+                Workout.planned_date >= week_start,
+                Workout.planned_date < week_start + timedelta(days=7),
+            )
+        )
     result = await session.execute(stmt)
-    all_users_with_subscription = list(result.scalars().all())
-    
-    # Фильтруем пользователей с активной подпиской
-    users_with_active_subscription = []
-    for user in all_users_with_subscription:
-        if not user.subscription:
-            continue
-        
-        subscription = user.subscription
-        status_str = subscription.status.value if isinstance(subscription.status, SubscriptionStatusEnum) else str(subscription.status)
-        
-        # Активная подписка (не истекла)
-        if status_str == "active" and (
-            subscription.expires_at is None or subscription.expires_at > now
-        ):
-            users_with_active_subscription.append(user)
-        # Триальная подписка (есть доступные тренировки)
-        elif status_str == "trial" and (
-            user.workout_frequency is not None
-            and user.workout_frequency > 0
-            and subscription.trial_workouts_used < user.workout_frequency
-        ):
-            users_with_active_subscription.append(user)
-    
-    # Объединяем списки, убирая дубликаты
-    all_users = {user.id: user for user in users_with_schedule}
-    for user in users_with_active_subscription:
-        if user.id not in all_users:
-            all_users[user.id] = user
-    
-    return list(all_users.values())
\ No newline at end of file
+    return list(result.scalars().all())
@@ -1,21 +1,22 @@
 import datetime
-from typing import List, Sequence
 from datetime import date
 
-from sqlalchemy import select, desc
+from sqlalchemy import select, desc, insert, update, or_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from database.models import Workout, WorkoutExercise, Exercise, User, WorkoutStatusEnum
 from bot.schemas.workout import LLMWorkoutPlan
-from bot.requests.exercise_requests import get_exercise_by_name
+from bot.requests.exercise_requests import get_exercises_by_names
+from bot.utils.workout_utils import moscow_now
 
 
-async def get_exercises_from_last_workouts(
+async def get_last_workouts_with_exercises(
     session: AsyncSession, user_id: int, limit: int
-) -> list[Exercise]:
+) -> list[Workout]:
     """
-    Получает уникальный список объектов Exercise из последних `limit` тренировок пользователя.
+    Возвращает последние `limit` тренировок пользователя (от новых к старым)
+    с загруженными упражнениями.
     """
     if not limit > 0:
         return []
@@ -30,7 +31,16 @@ async def get_exercises_from_last_workouts(
         )
     )
     result = await session.execute(stmt)
-    workouts = result.scalars().all()
+    return list(result.scalars().all())
+
+
+async def get_exercises_from_last_workouts(
+    session: AsyncSession, user_id: int, limit: int
+) -> list[Exercise]:
+    """
+    Получает уникальный список объектов Exercise из последних `limit` тренировок пользователя.
+    """
+    workouts = await get_last_workouts_with_exercises(session, user_id, limit)
 
     unique_exercises = {}
     for workout in workouts:
@@ -94,16 +104,20 @@ async def get_latest_future_planned_date(session: AsyncSession, user_id: int) ->
     return result.scalars().first()
 
 
+def get_end_of_next_week(now: datetime.datetime) -> datetime.datetime:
+    """Возвращает конец следующего воскресенья (23:59:59) относительно `now`."""
+    days_until_next_sunday = 6 - now.weekday() + 7
+    end_of_next_week = now + datetime.timedelta(days=days_until_next_sunday)
+    return end_of_next_week.replace(hour=23, minute=59, second=59)
+
+
 async def has_planned_workouts_for_upcoming_week(session: AsyncSession, user_id: int) -> bool:
     """
     Проверяет, есть ли у пользователя запланированные тренировки
     начиная с текущего момента и до конца следующего воскресенья.
     """
     now = datetime.datetime.now()
-    # Конец следующего воскресенья
-    days_until_next_sunday = 6 - now.weekday() + 7
-    end_of_next_week = now + datetime.timedelta(days=days_until_next_sunday)
-    end_of_next_week = end_of_next_week.replace(hour=23, minute=59, second=59)
+    end_of_next_week = get_end_of_next_week(now)
 
     stmt = (
         select(Workout.id)
@@ -212,44 +226,64 @@ async def save_weekly_plan(
     user_id: int,
     plan: LLMWorkoutPlan,
     workout_dates: list[datetime],
-) -> list[Workout]:
+    exercise_ids_by_name: dict[str, int] | None = None,
+) -> tuple[list[Workout], list[str]]:
     """
     Сохраняет сгенерированный недельный план тренировок в БД.
+    Все названия упражнений резолвятся одним запросом (или по переданному словарю
+    `exercise_ids_by_name` из каталога в памяти), тренировки и упражнения вставляются
+    пакетно, поэтому число запросов не зависит от размера плана.
+    Возвращает (созданные тренировки, названия упражнений, не найденные в каталоге).
     """
-    created_workouts = []
-    # Используем `workout_plan` вместо `sessions`
-    for idx, day_plan in enumerate(plan.workout_plan):
-        # Если дат меньше, чем сгенерировано тренировок, прекращаем сохранение
-        if idx >= len(workout_dates):
-            break
-
-        # Создаем саму тренировку
-        workout = Workout(
-            user_id=user_id,
-            planned_date=workout_dates[idx],
-            warm_up=day_plan.warm_up,
-            cool_down=day_plan.cool_down,
+    day_plans = plan.workout_plan[:len(workout_dates)]
+    if not day_plans:
+        return [], []
+
+    # 1. Резолвим все названия упражнений одним IN-запросом (если нет каталога в памяти)
+    names = {ex.exercise_name for day_plan in day_plans for ex in day_plan.exercises}
+    if exercise_ids_by_name is not None:
+        exercise_ids = {name: exercise_ids_by_name[name] for name in names if name in exercise_ids_by_name}
+    else:
+        exercises = await get_exercises_by_names(session, list(names))
+        exercise_ids = {}
+        for exercise in exercises:
+            exercise_ids.setdefault(exercise.name, exercise.id)
+    unresolved_names = sorted(names - exercise_ids.keys())
+
+    # 2. Создаем все тренировки одним INSERT ... RETURNING
+    workouts = list(
+        await session.scalars(
+            insert(Workout).returning(Workout, sort_by_parameter_order=True),
+            [
+                {
+                    "user_id": user_id,
+                    "planned_date": workout_dates[idx],
+                    "warm_up": day_plan.warm_up,
+                    "cool_down": day_plan.cool_down,
+                }
+                for idx, day_plan in enumerate(day_plans)
+            ],
         )
-        session.add(workout)
-        await session.flush()  # Получаем ID тренировки
-
-        # Добавляем упражнения к тренировке
-        for exercise_data in day_plan.exercises:
-            # Имя упражнения теперь в `exercise_name`
-            exercise = await get_exercise_by_name(session, exercise_data.exercise_name)
-            if exercise:
-                workout_exercise = WorkoutExercise(
-                    workout_id=workout.id,
-                    exercise_id=exercise.id,
-                    sets=exercise_data.sets,
-                    reps=exercise_data.reps,
-                    order=exercise_data.order,  # Сохраняем порядок из LLM
-                )
-                session.add(workout_exercise)
-        created_workouts.append(workout)
+    )
+
+    # 3. Добавляем упражнения ко всем тренировкам одним пакетным INSERT
+    workout_exercises = [
+        {
+            "workout_id": workout.id,
+            "exercise_id": exercise_ids[exercise_data.exercise_name],
+            "sets": exercise_data.sets,
+            "reps": str(exercise_data.reps),
+            "order": exercise_data.order,  # Сохраняем порядок из LLM
+        }
+        for workout, day_plan in zip(workouts, day_plans)
+        for exercise_data in day_plan.exercises
+        if exercise_data.exercise_name in exercise_ids
+    ]
+    if workout_exercises:
+        await session.execute(insert(WorkoutExercise), workout_exercises)
 
     await session.commit()
-    return created_workouts
+    return workouts, unresolved_names
 
 
 async def get_workout_with_exercises(
@@ -270,22 +304,6 @@ async def get_workout_with_exercises(
     return result.scalar_one_or_none()
 
 
-async def get_future_planned_workouts(session: AsyncSession) -> Sequence[Workout]:
-    """
-    Получает все запланированные тренировки, которые еще не начались.
-    """
-    stmt = (
-        select(Workout)
-        .where(
-            Workout.status == WorkoutStatusEnum.planned,
-            Workout.planned_date > datetime.datetime.now(),
-        )
-        .options(selectinload(Workout.user))
-    )
-    result = await session.execute(stmt)
-    return result.scalars().all()
-
-
 async def get_workouts_for_period(
     session: AsyncSession, user_id: int, start_date: date, end_date: date
 ) -> list[Workout]:
@@ -332,15 +350,92 @@ async def update_workout_status(
 
 
 async def get_workout_exercise_details(
-    session: AsyncSession, workout_exercise_id: int
+    session: AsyncSession, workout_exercise_id: int, load_exercise: bool = True
 ) -> WorkoutExercise | None:
     """
-    Получает WorkoutExercise со связанным Exercise по ID.
+    Получает WorkoutExercise по ID. Связанный Exercise подгружается только
+    при `load_exercise=True` (иначе его берут из каталога упражнений в памяти).
     """
+    stmt = select(WorkoutExercise).where(WorkoutExercise.id == workout_exercise_id)
+    if load_exercise:
+        stmt = stmt.options(selectinload(WorkoutExercise.exercise))
+    result = await session.execute(stmt)
+    return result.scalar_one_or_none()
+
+
+async def claim_due_workout_notifications(
+    session: AsyncSession,
+    batch_size: int,
+    lease: datetime.timedelta,
+    max_lateness: datetime.timedelta,
+    now: datetime.datetime | None = None,
+) -> list[tuple[int, int]]:
+    """
+    Захватывает пачку тренировок, по которым пора отправить уведомление.
+    Строки блокируются через FOR UPDATE SKIP LOCKED и помечаются арендой до now + lease,
+    поэтому несколько воркеров не получат одну и ту же тренировку, а захват упавшего
+    воркера истечет и тренировка будет взята повторно.
+    Время сравнивается по Москве (см. moscow_now), как и при планировании тренировок.
+    Возвращает список (workout_id, telegram_id).
+    """
+    now = now or moscow_now()
+    due_ids = (
+        select(Workout.id)
+        .where(
+            Workout.status == WorkoutStatusEnum.planned,
+            Workout.notification_sent_at.is_(None),
+            Workout.planned_date <= now,
+            Workout.planned_date >= now - max_lateness,
+            or_(
+                Workout.notification_claimed_until.is_(None),
+                Workout.notification_claimed_until < now,
+            ),
+        )
+        .order_by(Workout.planned_date)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    telegram_id = select(User.telegram_id).where(User.id == Workout.user_id).scalar_subquery()
     stmt = (
-        select(WorkoutExercise)
-        .where(WorkoutExercise.id == workout_exercise_id)
-        .options(selectinload(WorkoutExercise.exercise))
+        update(Workout)
+        .where(Workout.id.in_(due_ids))
+        .values(notification_claimed_until=now + lease)
+        .returning(Workout.id, telegram_id.label("telegram_id"))
     )
     result = await session.execute(stmt)
-    return result.scalar_one_or_none()
+    claimed = [(row.id, row.telegram_id) for row in result]
+    await session.commit()
+    return claimed
+
+
+async def mark_workout_notified(session: AsyncSession, workout_id: int) -> None:
+    """Отмечает, что уведомление о тренировке отправлено (или тренировка уже показана)."""
+    await session.execute(
+        update(Workout)
+        .where(Workout.id == workout_id)
+        .values(notification_sent_at=moscow_now(), notification_claimed_until=None)
+    )
+    await session.commit()
+
+
+async def extend_workout_notification_claims(
+    session: AsyncSession,
+    workout_ids: list[int],
+    lease: datetime.timedelta,
+    now: datetime.datetime | None = None,
+) -> int:
+    """
+    Продлевает аренду захваченных, но еще не отправленных уведомлений до now + lease.
+    Возвращает количество продленных строк.
+    """
+    if not workout_ids:
+        return 0
+    now = now or moscow_now()
+    result = await session.execute(
+        update(Workout)
+        .where(Workout.id.in_(workout_ids), Workout.notification_sent_at.is_(None))
+        .values(notification_claimed_until=now + lease)
+    )
+    await session.commit()
+    return result.rowcount
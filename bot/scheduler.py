@@ -1,33 +1,62 @@
+import asyncio
 import logging
+from functools import wraps
 
 from aiogram import Bot
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import async_sessionmaker
-from datetime import datetime
+from datetime import datetime, timedelta
 from apscheduler.triggers.cron import CronTrigger
 
 from bot.keyboards.workout import get_start_workout_keyboard
+from bot.config.settings import settings
 from bot.requests.workout_requests import (
     get_workout_with_exercises,
-    get_future_planned_workouts,
     update_workout_status,
+    claim_due_workout_notifications,
+    mark_workout_notified,
+    extend_workout_notification_claims,
+    get_next_workout_for_user,
 )
 from database.models import WorkoutStatusEnum
 from bot.requests import subscription_requests
 from bot.keyboards.workout import get_notification_keyboard
 from bot.keyboards.payment import get_payment_keyboard
 from bot.services.subscription_service import subscription_service
+from bot.services.message_quota import message_quota
+from bot.services.pregeneration import pregeneration_queue
+from bot.services.leader_election import leader_election
+from bot.services.expiry_timeline import expiry_timeline
 from bot.services.workout_service import (
     WorkoutService,
     scheduled_weekly_workout_generation,
+    scheduled_pregeneration,
 )
-from bot.utils.bot_messages import safe_send_message
+from bot.utils.message_dispatcher import message_dispatcher, PRIORITY_WORKOUT, PRIORITY_LOW
 
 scheduler = AsyncIOScheduler(timezone="Europe/Moscow")
+# Задачи, которые безопасно выполнять на всех репликах сразу: не ставятся на паузу без лидерства
+replica_scheduler = AsyncIOScheduler(timezone="Europe/Moscow")
 logger = logging.getLogger(__name__)
 
 
+def leader_only(job):
+    """
+    Задача выполняется, только если аренда лидера все еще принадлежит этой реплике.
+    Планировщик на бывшем лидере ставится на паузу, но уже сработавший триггер
+    (например, после долгой паузы процесса) должен отсеяться по номеру срока в аренде.
+    """
+    @wraps(job)
+    async def wrapper(*args, **kwargs):
+        if not await leader_election.holds_lease():
+            logger.warning(f"Skipping job {job.__name__}: this instance is not the leader.")
+            return
+        return await job(*args, **kwargs)
+    return wrapper
+
+
 async def send_workout_notification(
     bot: Bot, user_id: int, workout_id: int, session_pool: async_sessionmaker
 ):
@@ -41,6 +70,9 @@ async def send_workout_notification(
                 f"Тренировка с ID {workout_id} не найдена для отправки уведомления."
             )
             return
+        # Завершаем читающую транзакцию: пока сообщение ждет своей очереди
+        # в диспетчере, соединение из пула не удерживается
+        await session.commit()
 
         # TODO: Сделать красивое форматирование
         exercises_text = "\n".join(
@@ -57,17 +89,18 @@ async def send_workout_notification(
             f"Не забудьте сделать разминку перед началом."
         )
 
-        await safe_send_message(
-            bot,
-            session,
+        # Ждем фактической отправки: диспетчер соблюдает лимиты Telegram
+        delivered = await message_dispatcher.send(
             user_id,
             message,
+            priority=PRIORITY_WORKOUT,
             reply_markup=get_start_workout_keyboard(workout_id),
             parse_mode="HTML"
         )
-        logger.info(
-            f"Уведомление о тренировке #{workout_id} успешно отправлено пользователю {user_id}"
-        )
+        if delivered:
+            logger.info(
+                f"Уведомление о тренировке #{workout_id} успешно отправлено пользователю {user_id}"
+            )
 
         # Фиксируем отправку (важно для триала)
         await subscription_service.record_workout_sent(session, workout.user)
@@ -75,74 +108,128 @@ async def send_workout_notification(
             f"Отправка тренировки #{workout_id} засчитана для пользователя {user_id}"
         )
 
-        # Обновляем статус тренировки на "отправлено"
+        # Обновляем статус тренировки на "отправлено" и закрываем запись в очереди
         await update_workout_status(session, workout_id, WorkoutStatusEnum.sent)
+        await mark_workout_notified(session, workout_id)
         logger.info(
             f"Статус тренировки #{workout_id} обновлен на '{WorkoutStatusEnum.sent.value}'"
         )
 
+        # Отправлена последняя тренировка недели — план на следующую строим заранее
+        if not await get_next_workout_for_user(session, workout.user_id):
+            await pregeneration_queue.schedule(workout.user_id)
 
-async def restore_scheduled_jobs(bot: Bot, session_pool: async_sessionmaker):
+
+async def process_due_notifications(bot: Bot, session_pool: async_sessionmaker):
     """
-    Восстанавливает запланированные уведомления о тренировках после перезапуска.
+    Опрашивает очередь уведомлений в БД и отправляет уведомления о наступивших тренировках.
+    Захват строк через FOR UPDATE SKIP LOCKED позволяет запускать опрос на нескольких
+    процессах бота одновременно без дублей; после рестарта ничего восстанавливать не нужно.
+    Пачка отправляется параллельно (NOTIFICATION_SEND_CONCURRENCY), а пока она отправляется,
+    аренда неотправленных уведомлений продлевается, чтобы их не захватили повторно.
     """
-    async with session_pool() as session:
-        workouts = await get_future_planned_workouts(session)
-        logger.info(f"Найдено {len(workouts)} тренировок для восстановления.")
-        for workout in workouts:
-            scheduler.add_job(
-                send_workout_notification,
-                "date",
-                run_date=workout.planned_date,
-                args=[bot, workout.user.telegram_id, workout.id, session_pool],
-                id=f"workout_notification_{workout.id}",
-                replace_existing=True,
+    lease = timedelta(seconds=settings.NOTIFICATION_LEASE_SECONDS)
+    max_lateness = timedelta(hours=settings.NOTIFICATION_MAX_LATENESS_HOURS)
+    semaphore = asyncio.Semaphore(settings.NOTIFICATION_SEND_CONCURRENCY)
+
+    async def send_one(workout_id: int, telegram_id: int, pending: set[int]) -> None:
+        async with semaphore:
+            try:
+                await send_workout_notification(bot, telegram_id, workout_id, session_pool)
+            except Exception as e:
+                # Аренда истечет, и уведомление будет взято повторно
+                logger.error(
+                    f"Failed to send notification for workout #{workout_id}: {e}", exc_info=True
+                )
+            finally:
+                pending.discard(workout_id)
+
+    async def keep_claims(pending: set[int]) -> None:
+        while True:
+            await asyncio.sleep(lease.total_seconds() / 3)
+            try:
+                async with session_pool() as session:
+                    await extend_workout_notification_claims(session, list(pending), lease)
+            except Exception as e:
+                logger.warning(f"Failed to extend notification claims: {e}")
+
+    while True:
+        async with session_pool() as session:
+            claimed = await claim_due_workout_notifications(
+                session, settings.NOTIFICATION_BATCH_SIZE, lease, max_lateness
             )
-            logger.info(
-                f"Запланировано уведомление для тренировки #{workout.id} "
-                f"пользователя {workout.user.telegram_id} на {workout.planned_date}"
+        if not claimed:
+            return
+
+        logger.info(f"Claimed {len(claimed)} due workout notifications.")
+        pending = {workout_id for workout_id, _ in claimed}
+        heartbeat = asyncio.create_task(keep_claims(pending))
+        try:
+            await asyncio.gather(
+                *(send_one(workout_id, telegram_id, pending) for workout_id, telegram_id in claimed)
             )
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+
+        if len(claimed) < settings.NOTIFICATION_BATCH_SIZE:
+            return
+
+
+PAID_EXPIRED_TEXT = (
+    "ℹ️ Ваша подписка истекла. Чтобы продолжать получать тренировки, пожалуйста, оформите новую."
+)
 
 
 async def check_expired_subscriptions(bot: Bot, session_pool: async_sessionmaker):
     """
     Проверяет и обрабатывает истекшие платные и триальные подписки.
+    Статусы меняются страницами по EXPIRY_BATCH_SIZE одним UPDATE ... RETURNING,
+    получатели уведомлений передаются диспетчеру сообщений. Следующая страница
+    берется, только когда диспетчер разобрал очередь, поэтому память не растет.
     """
     logging.info("Running scheduled job: check_expired_subscriptions")
-    async with session_pool() as session:
-        # 1. Обработка истекших платных подписок
-        expired_paid = await subscription_requests.get_expired_paid_subscriptions(session)
-        for sub in expired_paid:
-            logging.info(f"Subscription for user {sub.user_id} has expired. Updating status to 'expired'.")
-            await subscription_requests.update_subscription_status(session, sub.id, "expired")
-            await safe_send_message(
-                bot,
-                session,
-                sub.user.telegram_id,
-                "ℹ️ Ваша подписка истекла. Чтобы продолжать получать тренировки, пожалуйста, оформите новую.",
-                reply_markup=get_payment_keyboard()
-            )
+    # 1. Истекшие платные подписки
+    expired = await _expire_in_pages(
+        session_pool,
+        subscription_requests.expire_paid_subscriptions,
+        PAID_EXPIRED_TEXT,
+    )
+    # 2. Триальные подписки, у которых закончились тренировки
+    # (статус меняется, чтобы уведомление не отправлялось повторно)
+    exhausted = await _expire_in_pages(
+        session_pool,
+        subscription_requests.expire_exhausted_trials,
+        "👋 Ваш пробный период завершен. Чтобы получать следующие   тренировки, оформите подписку.",
+    )
+    logging.info(f"Expired {expired} paid subscriptions and {exhausted} trials.")
+
 
-        # 2. Обработка триальных подписок, у которых закончились тренировки
-        exhausted_trials = await subscription_requests.get_exhausted_trial_subscriptions(session)
-        for sub in exhausted_trials:
-            logging.info(f"Trial for user {sub.user_id} has expired. Updating status to 'trial_expired'.")
-            # Меняем статус, чтобы уведомление не отправлялось повторно
-            await subscription_requests.update_subscription_status(session, sub.id, "trial_expired")
-            await safe_send_message(
-                bot,
-                session,
-                sub.user.telegram_id,
-                "👋 Ваш пробный период завершен. Чтобы получать следующие   тренировки, оформите подписку.",
-                reply_markup=get_payment_keyboard()
+async def _expire_in_pages(session_pool: async_sessionmaker, expire_page, text: str) -> int:
+    batch_size = settings.EXPIRY_BATCH_SIZE
+    total = 0
+    while True:
+        async with session_pool() as session:
+            recipients = await expire_page(session, batch_size)
+        for _, telegram_id in recipients:
+            message_dispatcher.enqueue(
+                telegram_id, text, priority=PRIORITY_LOW, reply_markup=get_payment_keyboard()
             )
+        total += len(recipients)
+        if len(recipients) < batch_size:
+            return total
+        while message_dispatcher.queue_size > batch_size:
+            await asyncio.sleep(1)
 
 
-def setup_scheduler(bot: Bot, session_pool: async_sessionmaker, workout_service: WorkoutService):
+def setup_scheduler(
+    bot: Bot, session_pool: async_sessionmaker, workout_service: WorkoutService, redis: Redis
+):
     """Настраивает и запускает все фоновые задачи."""
-    # Задача 1: Проверка истекших подписок (каждые 30 секунд)
+    # Задача 1: Проверка истекших подписок. Платные подписки точно в срок истекают
+    # по таймеру (expiry_timeline); этот опрос — страховка и обработка триалов.
     scheduler.add_job(
-        check_expired_subscriptions,
+        leader_only(check_expired_subscriptions),
         trigger="interval",
         hours=4,
         args=[bot, session_pool],
@@ -150,9 +237,46 @@ def setup_scheduler(bot: Bot, session_pool: async_sessionmaker, workout_service:
         replace_existing=True,
     )
 
-    # Задача 2: Еженедельная генерация тренировок (каждое ВС в 22:00)
+    # Задача 2: Опрос очереди уведомлений о тренировках — на каждой реплике:
+    # захват строк с арендой делит отправку между ними без дублей
+    replica_scheduler.add_job(
+        process_due_notifications,
+        trigger="interval",
+        seconds=settings.NOTIFICATION_POLL_SECONDS,
+        args=[bot, session_pool],
+        id="process_due_notifications",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+    )
+
+    # Задача 3: Сверка счетчиков сообщений AI-тренеру с БД
+    scheduler.add_job(
+        leader_only(message_quota.reconcile),
+        trigger="interval",
+        minutes=settings.MESSAGE_QUOTA_RECONCILE_MINUTES,
+        args=[session_pool],
+        id="reconcile_message_quotas",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+    )
+
+    # Задача 4: Предварительная генерация планов на следующую неделю
     scheduler.add_job(
-        scheduled_weekly_workout_generation,
+        leader_only(scheduled_pregeneration),
+        trigger="interval",
+        seconds=settings.PREGENERATION_POLL_SECONDS,
+        args=[bot, session_pool, workout_service],
+        id="workout_pregeneration",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+    )
+
+    # Задача 5: Еженедельная генерация тренировок для отставших (каждое ВС в 22:00)
+    scheduler.add_job(
+        leader_only(scheduled_weekly_workout_generation),
         trigger=CronTrigger(day_of_week="sun", hour=22, minute=0),
         args=[bot, session_pool, workout_service],
         id="weekly_workout_generation",
@@ -160,5 +284,38 @@ def setup_scheduler(bot: Bot, session_pool: async_sessionmaker, workout_service:
         misfire_grace_time=3600,  # 1 час
     )
 
-    scheduler.start()
-    logger.info("Scheduler started with all jobs.")
+    replica_scheduler.start()
+
+    # Остальные задачи выполняет только лидер: до избрания планировщик стоит на паузе
+    scheduler.start(paused=True)
+    leader_election.on_elected(_resume_scheduler)
+    leader_election.on_demoted(_pause_scheduler)
+
+    # Таймер точного истечения платных подписок (тоже только на лидере)
+    async def expire_due_subscriptions():
+        if not await leader_election.holds_lease():
+            return
+        expired = await _expire_in_pages(
+            session_pool, subscription_requests.expire_paid_subscriptions, PAID_EXPIRED_TEXT
+        )
+        logger.info(f"Expiry timer: expired {expired} paid subscriptions.")
+
+    expiry_timeline.setup(
+        redis, session_pool, subscription_requests.get_next_expiries, expire_due_subscriptions
+    )
+    logger.info(
+        "Scheduler started: notification polling runs on this replica, "
+        "singleton jobs are paused until this instance becomes leader."
+    )
+
+
+async def _resume_scheduler():
+    scheduler.resume()
+    expiry_timeline.start()
+    logger.info(f"Scheduler resumed: leader for term {leader_election.term}.")
+
+
+async def _pause_scheduler():
+    scheduler.pause()
+    await expiry_timeline.stop()
+    logger.info("Scheduler paused: leadership lost.")
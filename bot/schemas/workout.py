@@ -13,6 +13,7 @@ class ExercisePlan(BaseModel):
     exercise_name: str
     sets: int
     reps: int | str
+    exercise_id: int | None = None  # заполняется в компактном формате промпта
 
 
 
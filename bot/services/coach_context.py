@@ -0,0 +1,141 @@
+import json
+import logging
+
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.config.settings import settings
+from bot.requests import message_requests
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Грубая локальная оценка числа токенов без токенизатора:
+    для смешанного русского/английского текста у gpt-4o-mini выходит ~3 символа на токен.
+    """
+    return len(text) // 3 + 1
+
+
+def _shorten(text: str, limit: int) -> str:
+    """Первое предложение (или начало) текста не длиннее limit символов."""
+    text = " ".join(text.split())
+    for separator in (". ", "? ", "! ", "\n"):
+        index = text.find(separator)
+        if 0 < index < limit:
+            return text[: index + 1]
+    return text if len(text) <= limit else text[: limit - 1] + "…"
+
+
+def compact_context(context: dict, token_budget: int, summary_budget: int) -> dict:
+    """
+    Укладывает контекст {"summary": [...], "turns": [[вопрос, ответ], ...]} в бюджет токенов.
+    Старые реплики по одной уходят в summary в виде коротких пунктов
+    (локально, без вызова LLM); summary, в свою очередь, ограничено summary_budget.
+    """
+    summary: list[str] = list(context.get("summary", []))
+    turns: list[list[str]] = [list(turn) for turn in context.get("turns", [])]
+
+    def turns_tokens() -> int:
+        return sum(estimate_tokens(q) + estimate_tokens(a) for q, a in turns)
+
+    # Последний обмен репликами оставляем всегда
+    while len(turns) > 1 and turns_tokens() + estimate_tokens("\n".join(summary)) > token_budget:
+        question, answer = turns.pop(0)
+        summary.append(f"- Вопрос: {_shorten(question, 120)} Ответ: {_shorten(answer, 160)}")
+
+    while summary and estimate_tokens("\n".join(summary)) > summary_budget:
+        summary.pop(0)
+
+    return {"summary": summary, "turns": turns}
+
+
+def build_history_messages(context: dict) -> list[dict]:
+    """Превращает контекст в сообщения для chat.completions (между системным промптом и вопросом)."""
+    messages = []
+    if context.get("summary"):
+        messages.append({
+            "role": "system",
+            "content": "Краткое содержание предыдущего диалога с пользователем:\n" + "\n".join(context["summary"]),
+        })
+    for question, answer in context.get("turns", []):
+        messages.append({"role": "user", "content": question})
+        messages.append({"role": "assistant", "content": answer})
+    return messages
+
+
+class CoachContextStore:
+    """
+    Скользящий контекст диалога с AI-тренером для каждого пользователя.
+    Хранится в Redis (`coach_ctx:<user_id>`) и обновляется после каждого ответа;
+    из user_messages контекст собирается только при промахе кэша.
+    """
+
+    KEY_PREFIX = "coach_ctx:"
+
+    def __init__(self):
+        self.redis: Redis | None = None
+        self.hits = 0
+        self.misses = 0
+
+    def setup(self, redis: Redis) -> None:
+        self.redis = redis
+
+    @property
+    def ttl_seconds(self) -> int:
+        return settings.COACH_CONTEXT_TTL_HOURS * 3600
+
+    async def get_history(self, session: AsyncSession, user_id: int) -> list[dict]:
+        """Возвращает историю диалога в формате сообщений chat.completions."""
+        if not settings.COACH_CONTEXT_ENABLED:
+            return []
+        return build_history_messages(await self._load(session, user_id))
+
+    async def add_turn(self, session: AsyncSession, user_id: int, question: str, answer: str) -> None:
+        """Добавляет обмен репликами в контекст и укладывает его в бюджет токенов."""
+        if not settings.COACH_CONTEXT_ENABLED or self.redis is None:
+            return
+        context = await self._load(session, user_id)
+        context["turns"].append([question, answer])
+        await self._save(user_id, self._compact(context))
+
+    async def _load(self, session: AsyncSession, user_id: int) -> dict:
+        if self.redis is not None:
+            try:
+                raw = await self.redis.get(f"{self.KEY_PREFIX}{user_id}")
+            except Exception as e:
+                logging.warning(f"Coach context Redis read failed: {e}")
+                raw = None
+            if raw:
+                self.hits += 1
+                return json.loads(raw)
+
+        self.misses += 1
+        dialog = await message_requests.get_recent_dialog(
+            session, user_id, limit=settings.COACH_CONTEXT_MAX_TURNS
+        )
+        context = self._compact({"summary": [], "turns": [list(turn) for turn in dialog]})
+        await self._save(user_id, context)
+        return context
+
+    async def _save(self, user_id: int, context: dict) -> None:
+        if self.redis is None:
+            return
+        try:
+            await self.redis.set(
+                f"{self.KEY_PREFIX}{user_id}",
+                json.dumps(context, ensure_ascii=False),
+                ex=self.ttl_seconds,
+            )
+        except Exception as e:
+            logging.warning(f"Coach context Redis write failed: {e}")
+
+    @staticmethod
+    def _compact(context: dict) -> dict:
+        return compact_context(
+            context,
+            token_budget=settings.COACH_CONTEXT_TOKEN_BUDGET,
+            summary_budget=settings.COACH_CONTEXT_SUMMARY_TOKENS,
+        )
+
+
+coach_context = CoachContextStore()
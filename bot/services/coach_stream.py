@@ -0,0 +1,136 @@
+import asyncio
+import logging
+from collections import deque
+from time import monotonic
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import Message
+
+from bot.config.settings import settings
+from bot.services.llm_client import LLMUnavailableError
+from bot.services.llm_service import llm_service
+from bot.utils.html_utils import close_open_html_tags, split_html_message
+
+# Лимит длины сообщения Telegram
+MESSAGE_LIMIT = 4096
+
+
+class CoachLatencyStats:
+    """Метрики ответов AI-тренера: время до первого фрагмента (TTFT) и полное время ответа."""
+
+    def __init__(self, window: int = 500):
+        self.streamed = 0
+        self.single_shot = 0
+        self.fallbacks = 0
+        self.ttft: deque[float] = deque(maxlen=window)
+        self.total: deque[float] = deque(maxlen=window)
+
+    @staticmethod
+    def percentile(values, p: float) -> float:
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, round(p / 100 * (len(ordered) - 1)))]
+
+
+coach_latency = CoachLatencyStats()
+
+
+async def answer_coach_question(
+    message: Message, question: str, history: list[dict] | None = None
+) -> str:
+    """
+    Отвечает на вопрос пользователя и возвращает текст ответа. При включенном стриминге
+    ответ появляется сразу после первых токенов и дописывается правками одного сообщения
+    (не чаще COACH_STREAM_EDIT_INTERVAL). Если стриминг недоступен или оборвался,
+    ответ отправляется целиком, как раньше. `history` — предыдущие реплики диалога.
+    """
+    started = monotonic()
+    stream = _CoachStream(message)
+    if settings.COACH_STREAMING_ENABLED:
+        try:
+            if await stream.run(question, history, started):
+                return stream.text
+        except LLMUnavailableError:
+            # Прокси недоступен — повтор целиком тоже сразу упадет
+            raise
+        except Exception as e:
+            logging.warning(f"Coach streaming failed, falling back to single-shot: {e}", exc_info=True)
+        coach_latency.fallbacks += 1
+
+    response = await llm_service.generate_ai_coach_response(question, history)
+    if stream.sent is None:
+        coach_latency.ttft.append(monotonic() - started)
+    coach_latency.total.append(monotonic() - started)
+    coach_latency.single_shot += 1
+    # Если часть ответа уже показана, заменяем ее полным ответом
+    await stream.finish(response)
+    return response
+
+
+class _CoachStream:
+    """Одно сообщение с ответом, которое дописывается правками по мере генерации."""
+
+    def __init__(self, message: Message):
+        self.message = message
+        self.sent: Message | None = None
+        self.shown = ""
+        self.next_edit_at = 0.0
+        self.text = ""
+
+    async def run(self, question: str, history: list[dict] | None, started: float) -> bool:
+        """Стримит ответ. Возвращает False, если ответ нужно получить заново целиком."""
+        text = ""
+        async for delta in llm_service.stream_ai_coach_response(question, history):
+            text += delta
+            visible = close_open_html_tags(text.strip())
+            if self.sent is None:
+                if not visible:
+                    continue
+                coach_latency.ttft.append(monotonic() - started)
+                self.sent = await self.message.answer(visible, parse_mode="HTML")
+                self.shown = visible
+                self.next_edit_at = monotonic() + settings.COACH_STREAM_EDIT_INTERVAL
+            # Промежуточные правки только в пределах одного сообщения; остаток уйдет в финале
+            elif monotonic() >= self.next_edit_at and len(visible) < MESSAGE_LIMIT - 64:
+                await self._edit(visible)
+
+        if self.sent is None:
+            # Поток завершился без содержимого
+            return False
+        await self.finish(text)
+        self.text = text.strip()
+        coach_latency.total.append(monotonic() - started)
+        coach_latency.streamed += 1
+        return True
+
+    async def finish(self, text: str) -> None:
+        """Показывает итоговый ответ: правит уже отправленное сообщение и досылает остаток."""
+        parts = split_html_message(text.strip(), MESSAGE_LIMIT)
+        if self.sent is None:
+            for part in parts:
+                await self.message.answer(part, parse_mode="HTML")
+            return
+        if parts[0] != self.shown:
+            try:
+                await self.sent.edit_text(parts[0], parse_mode="HTML")
+            except TelegramRetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+                await self.sent.edit_text(parts[0], parse_mode="HTML")
+        for part in parts[1:]:
+            await self.message.answer(part, parse_mode="HTML")
+
+    async def _edit(self, visible: str) -> None:
+        interval = settings.COACH_STREAM_EDIT_INTERVAL
+        self.next_edit_at = monotonic() + interval
+        if visible == self.shown:
+            return
+        try:
+            await self.sent.edit_text(visible, parse_mode="HTML")
+            self.shown = visible
+        except TelegramRetryAfter as e:
+            # Упираемся в лимит правок — пропускаем промежуточные обновления
+            self.next_edit_at = monotonic() + max(interval, e.retry_after)
+        except TelegramBadRequest as e:
+            # Частичный HTML не разобрался — дождемся следующего фрагмента
+            logging.debug(f"Skipping intermediate coach message edit: {e}")
@@ -0,0 +1,154 @@
+import asyncio
+import hashlib
+import logging
+from datetime import datetime
+
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from bot.requests import exercise_requests
+from database.models import EquipmentTypeEnum, Exercise
+
+
+# Канал Redis, в который публикуется версия каталога после его изменения
+CATALOG_CHANNEL = "exercise_catalog:changed"
+
+
+def normalize_exercise_name(name: str) -> str:
+    """Приводит название упражнения к виду для поиска: нижний регистр, 'ё' -> 'е', без лишних пробелов."""
+    return " ".join(name.replace("ё", "е").replace("Ё", "Е").lower().split())
+
+
+class CatalogExercise:
+    """Неизменяемая запись каталога упражнений (копия строки таблицы exercises)."""
+
+    __slots__ = (
+        "id",
+        "name",
+        "description",
+        "muscle_groups",
+        "equipment_type",
+        "video_id",
+        "gif_id",
+        "instructions",
+    )
+
+    def __init__(self, exercise: Exercise):
+        for attr in self.__slots__:
+            object.__setattr__(self, attr, getattr(exercise, attr))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CatalogExercise is immutable")
+
+    def __repr__(self) -> str:
+        return f"CatalogExercise(id={self.id}, name={self.name!r})"
+
+
+class ExerciseCatalog:
+    """
+    In-process каталог упражнений с индексами по id, названию, оборудованию и группе мышц.
+    Загружается один раз при старте и перезагружается явно: командой администратора
+    или сообщением в Redis-канал CATALOG_CHANNEL (чтобы все процессы бота были согласованы).
+    """
+
+    def __init__(self):
+        self.version: str | None = None
+        self.loaded_at: datetime | None = None
+        self._by_id: dict[int, CatalogExercise] = {}
+        self._by_name: dict[str, CatalogExercise] = {}
+        self._by_equipment: dict[EquipmentTypeEnum, tuple[CatalogExercise, ...]] = {}
+        self._by_muscle: dict[str, tuple[CatalogExercise, ...]] = {}
+        self._lock = asyncio.Lock()
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.version is not None
+
+    async def load(self, session: AsyncSession) -> str:
+        """Загружает каталог из БД и атомарно заменяет индексы. Возвращает версию каталога."""
+        async with self._lock:
+            exercises = [
+                CatalogExercise(ex)
+                for ex in await exercise_requests.get_all_exercises(session)
+            ]
+
+            by_name: dict[str, CatalogExercise] = {}
+            by_equipment: dict[EquipmentTypeEnum, list[CatalogExercise]] = {}
+            by_muscle: dict[str, list[CatalogExercise]] = {}
+            for ex in exercises:
+                by_name.setdefault(normalize_exercise_name(ex.name), ex)
+                by_equipment.setdefault(ex.equipment_type, []).append(ex)
+                for muscle in (ex.muscle_groups or "").split(","):
+                    if muscle.strip():
+                        by_muscle.setdefault(muscle.strip().lower(), []).append(ex)
+
+            digest = hashlib.sha1()
+            for ex in exercises:
+                digest.update(repr(tuple(getattr(ex, attr) for attr in ex.__slots__)).encode())
+
+            # Заменяем ссылки целиком, чтобы читатели никогда не видели полуобновленный каталог
+            self._by_id = {ex.id: ex for ex in exercises}
+            self._by_name = by_name
+            self._by_equipment = {k: tuple(v) for k, v in by_equipment.items()}
+            self._by_muscle = {k: tuple(v) for k, v in by_muscle.items()}
+            self.version = digest.hexdigest()[:12]
+            self.loaded_at = datetime.now()
+
+        logging.info(f"Exercise catalog loaded: {len(exercises)} exercises, version {self.version}")
+        return self.version
+
+    async def refresh(self, session_pool: async_sessionmaker) -> str:
+        """Перезагружает каталог в отдельной сессии."""
+        async with session_pool() as session:
+            return await self.load(session)
+
+    async def ensure_loaded(self, session: AsyncSession) -> None:
+        """Загружает каталог, если он еще не был загружен (например, вне bot.main)."""
+        if not self.is_loaded:
+            await self.load(session)
+
+    def get(self, exercise_id: int) -> CatalogExercise | None:
+        return self._by_id.get(exercise_id)
+
+    def get_by_name(self, name: str) -> CatalogExercise | None:
+        return self._by_name.get(normalize_exercise_name(name))
+
+    def by_equipment(self, equipment_type: EquipmentTypeEnum) -> list[CatalogExercise]:
+        return list(self._by_equipment.get(equipment_type, ()))
+
+    def by_muscle(self, muscle_group: str) -> list[CatalogExercise]:
+        return list(self._by_muscle.get(muscle_group.strip().lower(), ()))
+
+    def ids_by_name(self) -> dict[str, int]:
+        """Словарь {точное название: id} для сохранения плана без запросов к БД."""
+        return {ex.name: ex.id for ex in self._by_id.values()}
+
+    async def publish_changed(self, redis: Redis) -> None:
+        """Сообщает остальным процессам, что каталог изменился."""
+        await redis.publish(CATALOG_CHANNEL, self.version or "")
+
+    async def listen_for_changes(self, redis: Redis, session_pool: async_sessionmaker) -> None:
+        """Фоновая задача: перезагружает каталог по сообщению из CATALOG_CHANNEL."""
+        while True:
+            pubsub = redis.pubsub()
+            try:
+                await pubsub.subscribe(CATALOG_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    data = message["data"]
+                    version = data.decode() if isinstance(data, bytes) else str(data)
+                    if version and version == self.version:
+                        continue
+                    logging.info(f"Exercise catalog change announced (version {version or '?'}). Reloading.")
+                    await self.refresh(session_pool)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Exercise catalog listener failed: {e}. Reconnecting in 5s.", exc_info=True)
+                await asyncio.sleep(5)
+            finally:
+                await pubsub.aclose()
+
+
+exercise_catalog = ExerciseCatalog()
@@ -0,0 +1,186 @@
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from bot.config.settings import settings
+
+EXPIRY_CHANNEL = "subscriptions:expiry_changed"
+
+# (сессия, сколько) -> ближайшие (subscription_id, expires_at) активных подписок по возрастанию
+LoadNext = Callable[[AsyncSession, int], Awaitable[list[tuple[int, datetime]]]]
+
+
+class ExpiryTimeline:
+    """
+    Таймер истечения платных подписок. В памяти лидера хранится min-heap ближайших
+    EXPIRY_TIMELINE_SIZE моментов истечения (индексированный запрос по status, expires_at);
+    цикл спит ровно до ближайшего из них, обрабатывает истекшие подписки и снова взводится.
+
+    Активация и продление подписки (subscription_requests) вызывают `track()`: запись
+    обновляется на месте (устаревшие элементы кучи отбрасываются лениво), а изменение
+    рассылается остальным репликам через Redis-канал EXPIRY_CHANNEL, чтобы таймер на
+    лидере узнал о подписке, оплаченной через другую реплику.
+    """
+
+    def __init__(self):
+        self.redis: Redis | None = None
+        self.session_pool: async_sessionmaker | None = None
+        self._load_next: LoadNext | None = None
+        self._on_due: Callable[[], Awaitable[None]] | None = None
+        self._heap: list[tuple[datetime, int]] = []
+        self._current: dict[int, datetime] = {}
+        # Самый поздний загруженный момент; подписки позже него в кучу не попадают.
+        # None — загружены все активные подписки.
+        self._horizon: datetime | None = None
+        self._loaded = False
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self.fired = 0
+        self.reloads = 0
+
+    def setup(
+        self,
+        redis: Redis,
+        session_pool: async_sessionmaker,
+        load_next: LoadNext,
+        on_due: Callable[[], Awaitable[None]],
+    ) -> None:
+        self.redis = redis
+        self.session_pool = session_pool
+        self._load_next = load_next
+        self._on_due = on_due
+
+    @property
+    def next_expiry(self) -> datetime | None:
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def __len__(self) -> int:
+        return len(self._current)
+
+    def start(self) -> None:
+        """Запускается на лидере (см. bot/scheduler.py)."""
+        if self._tasks:
+            return
+        self._tasks = [
+            asyncio.create_task(self._run()),
+            asyncio.create_task(self._listen_for_changes()),
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._heap, self._current, self._horizon, self._loaded = [], {}, None, False
+
+    async def track(self, subscription_id: int, expires_at: datetime | None) -> None:
+        """Новая дата истечения подписки: обновляет таймер и оповещает другие реплики."""
+        self._update(subscription_id, expires_at)
+        if self.redis is None:
+            return
+        try:
+            stamp = expires_at.isoformat() if expires_at else ""
+            await self.redis.publish(EXPIRY_CHANNEL, f"{subscription_id}|{stamp}")
+        except Exception as e:
+            logging.warning(f"Failed to publish subscription expiry change: {e}")
+
+    def _update(self, subscription_id: int, expires_at: datetime | None) -> None:
+        if not self._loaded:
+            return
+        if expires_at is None or (self._horizon is not None and expires_at > self._horizon):
+            # Вне загруженного окна: прежняя запись (если была) станет устаревшей
+            self._current.pop(subscription_id, None)
+        elif self._current.get(subscription_id) != expires_at:
+            self._current[subscription_id] = expires_at
+            heapq.heappush(self._heap, (expires_at, subscription_id))
+        self._wakeup.set()
+
+    def _drop_stale(self) -> None:
+        while self._heap and self._current.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    async def reload(self) -> None:
+        """Перечитывает ближайшие EXPIRY_TIMELINE_SIZE истечений из БД."""
+        size = settings.EXPIRY_TIMELINE_SIZE
+        async with self.session_pool() as session:
+            upcoming = await self._load_next(session, size)
+        self._current = {subscription_id: expires_at for subscription_id, expires_at in upcoming}
+        self._heap = [(expires_at, subscription_id) for subscription_id, expires_at in upcoming]
+        heapq.heapify(self._heap)
+        self._horizon = upcoming[-1][1] if len(upcoming) >= size else None
+        self._loaded = True
+        self.reloads += 1
+
+    async def _run(self) -> None:
+        resync = timedelta(minutes=settings.EXPIRY_TIMELINE_RESYNC_MINUTES)
+        reloaded_at = None
+        while True:
+            try:
+                now = datetime.now()
+                self._drop_stale()
+                if reloaded_at is None or now - reloaded_at >= resync or (
+                    not self._heap and self._horizon is not None
+                ):
+                    await self.reload()
+                    reloaded_at = now
+                    logging.info(f"Expiry timeline loaded: {len(self)} upcoming, next at {self.next_expiry}.")
+
+                # Спим до ближайшего истечения (не дольше, чем до плановой пересинхронизации)
+                wake_at = reloaded_at + resync
+                if self.next_expiry is not None:
+                    wake_at = min(wake_at, self.next_expiry + timedelta(seconds=1))
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(
+                        self._wakeup.wait(), timeout=max(0.0, (wake_at - datetime.now()).total_seconds())
+                    )
+                    continue  # таймер изменился — пересчитываем
+                except asyncio.TimeoutError:
+                    pass
+
+                now = datetime.now()
+                due = []
+                while self.next_expiry is not None and self.next_expiry < now:
+                    _, subscription_id = heapq.heappop(self._heap)
+                    due.append(subscription_id)
+                    self._current.pop(subscription_id, None)
+                if due:
+                    self.fired += 1
+                    logging.info(f"Expiry timeline fired for {len(due)} subscriptions.")
+                    await self._on_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Expiry timeline failed: {e}. Retrying in 30s.", exc_info=True)
+                reloaded_at = None
+                await asyncio.sleep(30)
+
+    async def _listen_for_changes(self) -> None:
+        """Принимает изменения дат истечения, сделанные на других репликах."""
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(EXPIRY_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    data = message["data"]
+                    raw = data.decode() if isinstance(data, bytes) else str(data)
+                    subscription_id, _, stamp = raw.partition("|")
+                    self._update(int(subscription_id), datetime.fromisoformat(stamp) if stamp else None)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Expiry timeline listener failed: {e}. Reconnecting in 5s.", exc_info=True)
+                await asyncio.sleep(5)
+            finally:
+                await pubsub.aclose()
+
+
+expiry_timeline = ExpiryTimeline()
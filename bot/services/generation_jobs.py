@@ -0,0 +1,256 @@
+import asyncio
+import json
+import logging
+from dataclasses import asdict, dataclass, field
+from typing import Awaitable, Callable
+
+from aiogram import Bot
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from bot.config.settings import settings
+from bot.schemas.workout import PlanSummary
+from bot.services.leader_election import leader_election
+
+
+@dataclass
+class GenerationJob:
+    telegram_id: int
+    kind: str  # какой обработчик результата вызвать (см. GenerationJobQueue.on_result)
+    payload: dict = field(default_factory=dict)
+    attempts: int = 0
+
+    def dumps(self) -> str:
+        return json.dumps(asdict(self), ensure_ascii=False)
+
+    @classmethod
+    def loads(cls, raw: bytes | str) -> "GenerationJob":
+        return cls(**json.loads(raw))
+
+
+# Обработчик результата: (bot, задача, результат create_and_schedule_weekly_workout или None)
+ResultHandler = Callable[[Bot, GenerationJob, tuple[PlanSummary, object] | None], Awaitable[None]]
+
+
+class GenerationJobQueue:
+    """
+    Фоновая генерация планов по действиям пользователя (регистрация, оплата).
+    Хэндлер ставит задачу и сразу отвечает; воркеры строят план в собственной сессии
+    и присылают результат отдельным сообщением через зарегистрированный обработчик.
+
+    Очередь хранится в Redis: `genjob:queue` (ожидают) и `genjob:processing:<instance_id>`
+    (взяты воркерами этой реплики). Реплика записана в `genjob:workers` и продлевает пульс
+    `genjob:alive:<instance_id>`; задачи реплики, чей пульс истек, любая другая реплика
+    возвращает в очередь. Ключ `genjob:user:<telegram_id>` (SET NX) не дает поставить
+    вторую задачу тому же пользователю, пока первая не завершена.
+    """
+
+    QUEUE_KEY = "genjob:queue"
+    PROCESSING_KEY_PREFIX = "genjob:processing:"
+    WORKERS_KEY = "genjob:workers"
+    ALIVE_KEY_PREFIX = "genjob:alive:"
+    USER_KEY_PREFIX = "genjob:user:"
+
+    def __init__(self):
+        self.redis: Redis | None = None
+        self.bot: Bot | None = None
+        self.session_pool: async_sessionmaker | None = None
+        self.workout_service = None
+        self.instance_id = leader_election.instance_id
+        self._handlers: dict[str, ResultHandler] = {}
+        self._workers: list[asyncio.Task] = []
+        self._heartbeat: asyncio.Task | None = None
+        self._local_tasks: set[asyncio.Task] = set()
+        self.submitted = 0
+        self.deduplicated = 0
+        self.completed = 0
+        self.failed = 0
+        self.recovered = 0
+
+    def setup(self, redis: Redis, bot: Bot, session_pool: async_sessionmaker, workout_service) -> None:
+        self.redis = redis
+        self.bot = bot
+        self.session_pool = session_pool
+        self.workout_service = workout_service
+
+    @property
+    def processing_key(self) -> str:
+        return f"{self.PROCESSING_KEY_PREFIX}{self.instance_id}"
+
+    def on_result(self, kind: str) -> Callable[[ResultHandler], ResultHandler]:
+        """Декоратор: регистрирует обработчик результата для задач вида `kind`."""
+        def decorator(handler: ResultHandler) -> ResultHandler:
+            self._handlers[kind] = handler
+            return handler
+        return decorator
+
+    async def submit(self, telegram_id: int, kind: str, payload: dict | None = None) -> bool:
+        """
+        Ставит генерацию плана в очередь. Возвращает False, если для пользователя
+        задача уже стоит в очереди или выполняется.
+        """
+        job = GenerationJob(telegram_id=telegram_id, kind=kind, payload=payload or {})
+        try:
+            acquired = await self.redis.set(
+                f"{self.USER_KEY_PREFIX}{telegram_id}", kind,
+                nx=True, ex=settings.GENERATION_JOB_TTL_SECONDS,
+            )
+            if not acquired:
+                self.deduplicated += 1
+                logging.info(f"Generation job for user {telegram_id} is already queued or running.")
+                return False
+            await self.redis.lpush(self.QUEUE_KEY, job.dumps())
+        except Exception as e:
+            # Redis недоступен — генерируем в этом процессе, без сохранения задачи
+            logging.warning(f"Generation job queue unavailable, running job in-process: {e}")
+            task = asyncio.create_task(self._run_in_process(job))
+            self._local_tasks.add(task)
+            task.add_done_callback(self._local_tasks.discard)
+        self.submitted += 1
+        return True
+
+    async def start(self) -> None:
+        """Регистрирует реплику, возвращает в очередь задачи упавших реплик и запускает воркеров."""
+        await self._beat()
+        await self.redis.sadd(self.WORKERS_KEY, self.instance_id)
+        await self.recover_orphaned()
+        self._workers = [
+            asyncio.create_task(self._worker()) for _ in range(settings.GENERATION_JOB_WORKERS)
+        ]
+        self._heartbeat = asyncio.create_task(self._keep_alive())
+
+    async def stop(self) -> None:
+        """Останавливает воркеров и возвращает их незавершенные задачи в очередь."""
+        tasks = self._workers + ([self._heartbeat] if self._heartbeat else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers, self._heartbeat = [], None
+        try:
+            returned = await self._requeue(self.instance_id)
+            await self.redis.srem(self.WORKERS_KEY, self.instance_id)
+            await self.redis.delete(f"{self.ALIVE_KEY_PREFIX}{self.instance_id}")
+            if returned:
+                logging.info(f"Returned {returned} unfinished generation jobs to the queue.")
+        except Exception as e:
+            logging.warning(f"Failed to return unfinished generation jobs, they will be recovered by another replica: {e}")
+
+    async def recover_orphaned(self) -> int:
+        """Возвращает в очередь задачи реплик, чей пульс истек."""
+        recovered = 0
+        for raw_id in await self.redis.smembers(self.WORKERS_KEY):
+            instance_id = raw_id.decode() if isinstance(raw_id, bytes) else raw_id
+            if instance_id == self.instance_id or await self.redis.exists(f"{self.ALIVE_KEY_PREFIX}{instance_id}"):
+                continue
+            recovered += await self._requeue(instance_id)
+            await self.redis.srem(self.WORKERS_KEY, instance_id)
+        if recovered:
+            self.recovered += recovered
+            logging.info(f"Recovered {recovered} generation jobs interrupted on other replicas.")
+        return recovered
+
+    async def _requeue(self, instance_id: str) -> int:
+        moved = 0
+        # LMOVE атомарен: если две реплики восстанавливают одну и ту же, задача не раздвоится
+        while await self.redis.lmove(
+            f"{self.PROCESSING_KEY_PREFIX}{instance_id}", self.QUEUE_KEY, "RIGHT", "RIGHT"
+        ):
+            moved += 1
+        return moved
+
+    async def _beat(self) -> None:
+        await self.redis.set(
+            f"{self.ALIVE_KEY_PREFIX}{self.instance_id}", 1, ex=settings.GENERATION_JOB_HEARTBEAT_SECONDS * 3
+        )
+
+    async def _keep_alive(self) -> None:
+        while True:
+            await asyncio.sleep(settings.GENERATION_JOB_HEARTBEAT_SECONDS)
+            try:
+                await self._beat()
+                # Реплику могли счесть упавшей (долгая пауза) и удалить из реестра
+                await self.redis.sadd(self.WORKERS_KEY, self.instance_id)
+                await self.recover_orphaned()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.warning(f"Generation job heartbeat failed: {e}")
+
+    async def pending(self) -> int:
+        try:
+            total = await self.redis.llen(self.QUEUE_KEY)
+            for raw_id in await self.redis.smembers(self.WORKERS_KEY):
+                instance_id = raw_id.decode() if isinstance(raw_id, bytes) else raw_id
+                total += await self.redis.llen(f"{self.PROCESSING_KEY_PREFIX}{instance_id}")
+            return total
+        except Exception:
+            return 0
+
+    async def _worker(self) -> None:
+        while True:
+            try:
+                raw = await self.redis.blmove(self.QUEUE_KEY, self.processing_key, 5, "RIGHT", "LEFT")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Generation job queue read failed: {e}")
+                await asyncio.sleep(5)
+                continue
+            if raw is None:
+                continue
+
+            job = GenerationJob.loads(raw)
+            retry = await self._run(job)
+            try:
+                if retry:
+                    await self.redis.lpush(self.QUEUE_KEY, retry.dumps())
+                await self.redis.lrem(self.processing_key, 1, raw)
+            except Exception as e:
+                logging.error(f"Failed to acknowledge generation job for user {job.telegram_id}: {e}")
+
+    async def _run_in_process(self, job: GenerationJob) -> None:
+        retry = await self._run(job)
+        while retry:
+            retry = await self._run(retry)
+
+    async def _run(self, job: GenerationJob) -> GenerationJob | None:
+        """Выполняет задачу. Возвращает задачу для повтора, если попытки еще остались."""
+        job.attempts += 1
+        try:
+            async with self.session_pool() as session:
+                result = await self.workout_service.create_and_schedule_weekly_workout(
+                    session, job.telegram_id
+                )
+        except Exception as e:
+            logging.error(
+                f"Generation job for user {job.telegram_id} failed (attempt {job.attempts}): {e}",
+                exc_info=True,
+            )
+            if job.attempts < settings.GENERATION_JOB_MAX_ATTEMPTS:
+                return job
+            result = None
+
+        if result:
+            self.completed += 1
+        else:
+            self.failed += 1
+        await self._finish(job, result)
+        return None
+
+    async def _finish(self, job: GenerationJob, result) -> None:
+        handler = self._handlers.get(job.kind)
+        try:
+            if handler:
+                await handler(self.bot, job, result)
+            else:
+                logging.error(f"No result handler for generation job kind '{job.kind}'.")
+        except Exception as e:
+            logging.error(f"Result handler for user {job.telegram_id} failed: {e}", exc_info=True)
+        finally:
+            try:
+                await self.redis.delete(f"{self.USER_KEY_PREFIX}{job.telegram_id}")
+            except Exception as e:
+                logging.warning(f"Failed to release generation job lock for user {job.telegram_id}: {e}")
+
+
+generation_jobs = GenerationJobQueue()
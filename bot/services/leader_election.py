@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import os
+import socket
+from time import monotonic
+from typing import Awaitable, Callable
+from uuid import uuid4
+
+from redis.asyncio import Redis
+
+from bot.config.settings import settings
+
+# Захватить свободную аренду. Номер срока выдается только победителю, атомарно с захватом
+_ACQUIRE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+local term = redis.call('INCR', KEYS[2])
+redis.call('SET', KEYS[1], ARGV[1] .. ':' .. term, 'PX', ARGV[2])
+return term
+"""
+
+# Продлить аренду, только если она все еще наша
+_RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Отдать аренду, только если она все еще наша
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+LeadershipCallback = Callable[[], Awaitable[None]]
+
+
+class LeaderElection:
+    """
+    Выбор лидера среди реплик бота для задач, которые должны выполняться в одном экземпляре
+    (планировщик, догоняющая генерация). Лидер держит аренду `leader:lease` (SET NX PX)
+    и продлевает ее каждые LEADER_RENEW_SECONDS; если реплика упала, аренда истекает
+    через LEADER_LEASE_SECONDS и ее забирает другая.
+
+    Каждый захват аренды получает номер срока (`leader:term`, растет только при победе)
+    и записывает его в значение ключа. Перед запуском задачи `holds_lease()` сверяет
+    значение в Redis, так что бывший лидер, «проснувшийся» после паузы, пропускает уже
+    сработавшие триггеры. Это не fencing: между проверкой и записями в БД остается окно,
+    поэтому задачи лидера должны быть идемпотентными.
+    """
+
+    LEASE_KEY = "leader:lease"
+    TERM_KEY = "leader:term"
+
+    def __init__(self):
+        self.redis: Redis | None = None
+        self.instance_id = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self.term: int | None = None
+        self.elections = 0
+        self._value: str | None = None
+        self._renewed_at = 0.0
+        self._on_elected: list[LeadershipCallback] = []
+        self._on_demoted: list[LeadershipCallback] = []
+        self._task: asyncio.Task | None = None
+
+    def setup(self, redis: Redis) -> None:
+        self.redis = redis
+
+    def on_elected(self, callback: LeadershipCallback) -> None:
+        self._on_elected.append(callback)
+
+    def on_demoted(self, callback: LeadershipCallback) -> None:
+        self._on_demoted.append(callback)
+
+    @property
+    def is_leader(self) -> bool:
+        """Локальная проверка: аренда наша и не могла истечь с момента последнего продления."""
+        if not settings.LEADER_ELECTION_ENABLED:
+            return True
+        return self._value is not None and monotonic() - self._renewed_at < settings.LEADER_LEASE_SECONDS
+
+    async def holds_lease(self) -> bool:
+        """Проверка по Redis перед выполнением задачи: аренда все еще наша (в том же сроке)."""
+        if not settings.LEADER_ELECTION_ENABLED:
+            return True
+        if not self.is_leader:
+            return False
+        try:
+            return (await self.redis.get(self.LEASE_KEY)) == self._value.encode()
+        except Exception as e:
+            logging.warning(f"Leader lease check failed: {e}")
+            return False
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Останавливает выборы и отдает аренду, чтобы другая реплика стала лидером сразу."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._value is not None:
+            try:
+                await self.redis.eval(_RELEASE_SCRIPT, 1, self.LEASE_KEY, self._value)
+            except Exception as e:
+                logging.warning(f"Failed to release leader lease: {e}")
+            await self._demote()
+
+    async def _run(self) -> None:
+        if not settings.LEADER_ELECTION_ENABLED:
+            # Одна реплика: она и есть лидер, аренда не нужна
+            await self._notify(self._on_elected)
+            return
+        while True:
+            try:
+                if self._value is None:
+                    await self._try_acquire()
+                else:
+                    await self._renew()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.warning(f"Leader election Redis call failed: {e}")
+
+            # Продлить не удалось до истечения аренды — другая реплика уже могла стать лидером
+            if self._value is not None and not self.is_leader:
+                logging.warning(f"Leader lease (term {self.term}) was not renewed in time, stepping down.")
+                await self._demote()
+            await asyncio.sleep(settings.LEADER_RENEW_SECONDS)
+
+    async def _try_acquire(self) -> None:
+        started = monotonic()
+        term = await self.redis.eval(
+            _ACQUIRE_SCRIPT, 2, self.LEASE_KEY, self.TERM_KEY,
+            self.instance_id, settings.LEADER_LEASE_SECONDS * 1000,
+        )
+        if not term:
+            return
+        self.term = int(term)
+        self._value = f"{self.instance_id}:{self.term}"
+        self._renewed_at = started
+        self.elections += 1
+        logging.info(f"Instance {self.instance_id} became leader (term {self.term}).")
+        await self._notify(self._on_elected)
+
+    async def _renew(self) -> None:
+        started = monotonic()
+        renewed = await self.redis.eval(
+            _RENEW_SCRIPT, 1, self.LEASE_KEY, self._value, settings.LEADER_LEASE_SECONDS * 1000
+        )
+        if renewed:
+            self._renewed_at = started
+        else:
+            logging.warning(f"Leader lease (term {self.term}) was taken over, stepping down.")
+            await self._demote()
+
+    async def _demote(self) -> None:
+        if self._value is None:
+            return
+        self._value = None
+        await self._notify(self._on_demoted)
+
+    @staticmethod
+    async def _notify(callbacks: list[LeadershipCallback]) -> None:
+        for callback in callbacks:
+            try:
+                await callback()
+            except Exception as e:
+                logging.error(f"Leadership callback failed: {e}", exc_info=True)
+
+
+leader_election = LeaderElection()
@@ -0,0 +1,276 @@
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from time import monotonic
+from typing import AsyncIterator
+
+from openai import APIConnectionError, APIStatusError, APITimeoutError, AsyncOpenAI, RateLimitError
+
+from bot.config.settings import settings
+
+# Назначения запросов к LLM: у каждого свой пул с адаптивным лимитом параллельности
+PURPOSE_CHAT = "chat"  # ответы AI-тренера пользователю
+PURPOSE_PLAN = "plan"  # генерация плана по действию пользователя (регистрация, оплата, перегенерация)
+PURPOSE_BATCH = "batch"  # фоновая генерация (еженедельная, предварительная, догоняющая)
+
+
+class LLMUnavailableError(Exception):
+    """LLM-прокси сейчас недоступен или перегружен; запрос не отправлялся."""
+
+
+def _is_transient(error: Exception) -> bool:
+    """Ошибки, при которых прокси считается деградировавшим (а не запрос — неправильным)."""
+    if isinstance(error, (APITimeoutError, APIConnectionError, RateLimitError, asyncio.TimeoutError)):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code >= 500
+
+
+class AdaptiveLimiter:
+    """
+    Пул с AIMD-лимитом параллельности: пока ответы приходят быстрее `target_latency`,
+    лимит растет примерно на 1 за «окно» из `limit` запросов; при ошибке или медленном
+    ответе лимит умножается на LLM_AIMD_DECREASE (не чаще раза в LLM_AIMD_COOLDOWN_SECONDS).
+    """
+
+    def __init__(self, name: str, min_limit: int, max_limit: int, target_latency: float, acquire_timeout: float | None):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(max(min_limit, max_limit // 2))
+        self.target_latency = target_latency
+        self.acquire_timeout = acquire_timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self.completed = 0
+        self.errors = 0
+        self.rejected = 0
+        self.latencies: deque[float] = deque(maxlen=200)
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self._condition:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(
+                    self._condition.wait_for(lambda: self.in_flight < int(self.limit)),
+                    timeout=self.acquire_timeout,
+                )
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise LLMUnavailableError(f"LLM pool '{self.name}' is saturated")
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+
+    async def release(self, latency: float | None, ok: bool) -> None:
+        async with self._condition:
+            self.in_flight -= 1
+            if ok and latency is not None:
+                self.completed += 1
+                self.latencies.append(latency)
+            elif not ok:
+                self.errors += 1
+
+            if ok and latency is not None and latency <= self.target_latency:
+                self.limit = min(self.max_limit, self.limit + 1 / max(self.limit, 1))
+            elif latency is not None or not ok:
+                now = monotonic()
+                if now - self._last_decrease >= settings.LLM_AIMD_COOLDOWN_SECONDS:
+                    self._last_decrease = now
+                    self.limit = max(self.min_limit, self.limit * settings.LLM_AIMD_DECREASE)
+            self._condition.notify_all()
+
+    def percentile(self, p: float) -> float | None:
+        if len(self.latencies) < 20:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, round(p / 100 * (len(ordered) - 1)))]
+
+    def snapshot(self) -> dict:
+        p50, p90 = self.percentile(50), self.percentile(90)
+        return {
+            "limit": round(self.limit, 1),
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "p50": p50,
+            "p90": p90,
+        }
+
+
+class CircuitBreaker:
+    """
+    Общий для всех пулов предохранитель: после LLM_BREAKER_FAILURE_THRESHOLD подряд
+    сбоев прокси он размыкается на LLM_BREAKER_OPEN_SECONDS и запросы сразу получают
+    LLMUnavailableError. Затем пропускается один пробный запрос (half-open).
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self):
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.short_circuited = 0
+        self._probe_in_flight = False
+
+    def before_call(self) -> None:
+        if self.state == self.OPEN:
+            if monotonic() - self.opened_at < settings.LLM_BREAKER_OPEN_SECONDS:
+                self.short_circuited += 1
+                raise LLMUnavailableError("LLM circuit breaker is open")
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            if self._probe_in_flight:
+                self.short_circuited += 1
+                raise LLMUnavailableError("LLM circuit breaker is half-open")
+            self._probe_in_flight = True
+
+    def on_success(self) -> None:
+        if self.state != self.CLOSED:
+            logging.info("LLM circuit breaker closed.")
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def on_failure(self) -> None:
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= settings.LLM_BREAKER_FAILURE_THRESHOLD:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+                logging.warning(
+                    f"LLM circuit breaker opened after {self.consecutive_failures} consecutive failures."
+                )
+            self.state = self.OPEN
+            self.opened_at = monotonic()
+
+    def on_neutral(self) -> None:
+        """Запрос завершился ошибкой самого запроса (4xx) — о здоровье прокси это ничего не говорит."""
+        self._probe_in_flight = False
+
+
+class LLMClient:
+    """
+    Обертка над AsyncOpenAI для запросов к LLM-прокси: отдельный пул на каждое
+    назначение (PURPOSE_*), общий предохранитель и хеджирование идемпотентных
+    запросов — если ответ не пришел за ~p90 задержки пула (или первая попытка упала),
+    запускается вторая попытка и берется тот ответ, что пришел раньше.
+    """
+
+    def __init__(self, client: AsyncOpenAI):
+        self.client = client
+        self.breaker = CircuitBreaker()
+        self.pools = {
+            PURPOSE_CHAT: AdaptiveLimiter(
+                PURPOSE_CHAT, 1, settings.LLM_CHAT_MAX_CONCURRENCY, settings.LLM_CHAT_TARGET_LATENCY, 15.0
+            ),
+            PURPOSE_PLAN: AdaptiveLimiter(
+                PURPOSE_PLAN, 1, settings.LLM_PLAN_MAX_CONCURRENCY, settings.LLM_PLAN_TARGET_LATENCY, 60.0
+            ),
+            PURPOSE_BATCH: AdaptiveLimiter(
+                PURPOSE_BATCH, 1, settings.LLM_BATCH_MAX_CONCURRENCY, settings.LLM_BATCH_TARGET_LATENCY, None
+            ),
+        }
+        self.hedges_started = 0
+        self.hedges_won = 0
+
+    @asynccontextmanager
+    async def _slot(self, purpose: str):
+        """Слот в пуле назначения с учетом предохранителя; фиксирует исход и задержку."""
+        pool = self.pools[purpose]
+        self.breaker.before_call()
+        try:
+            await pool.acquire()
+        except LLMUnavailableError:
+            self.breaker.on_neutral()
+            raise
+        started = monotonic()
+        try:
+            yield
+        except Exception as e:
+            if _is_transient(e):
+                self.breaker.on_failure()
+                await pool.release(None, ok=False)
+            else:
+                self.breaker.on_neutral()
+                await pool.release(None, ok=True)
+            raise
+        except BaseException:
+            # Отмена (например, проигравшая попытка хеджирования)
+            self.breaker.on_neutral()
+            await pool.release(None, ok=True)
+            raise
+        else:
+            self.breaker.on_success()
+            await pool.release(monotonic() - started, ok=True)
+
+    async def _attempt(self, purpose: str, kwargs: dict):
+        async with self._slot(purpose):
+            return await self.client.chat.completions.create(**kwargs)
+
+    def _hedge_delay(self, purpose: str) -> float:
+        p90 = self.pools[purpose].percentile(90)
+        default = settings.LLM_CHAT_TARGET_LATENCY if purpose == PURPOSE_CHAT else settings.LLM_PLAN_TARGET_LATENCY
+        return max(1.0, p90 if p90 is not None else default)
+
+    async def complete(self, purpose: str, idempotent: bool = True, **kwargs):
+        """chat.completions.create через пул `purpose`. Фоновые (batch) запросы не хеджируются."""
+        if not (idempotent and settings.LLM_HEDGING_ENABLED and purpose != PURPOSE_BATCH):
+            return await self._attempt(purpose, kwargs)
+
+        first = asyncio.create_task(self._attempt(purpose, kwargs))
+        done, _ = await asyncio.wait({first}, timeout=self._hedge_delay(purpose))
+        if done and not first.exception():
+            return first.result()
+        if done and not _is_transient(first.exception()):
+            return first.result()  # ошибка запроса — повтор не поможет
+
+        # Первая попытка медленная или упала по вине прокси — запускаем вторую
+        pool = self.pools[purpose]
+        if self.breaker.state != CircuitBreaker.CLOSED or pool.in_flight >= int(pool.limit):
+            return await first
+        self.hedges_started += 1
+        second = asyncio.create_task(self._attempt(purpose, kwargs))
+        pending = {second} if done else {first, second}
+        last_error: BaseException | None = first.exception() if done else None
+        try:
+            while pending:
+                done_now, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done_now:
+                    if task.exception() is None:
+                        if task is second:
+                            self.hedges_won += 1
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def stream(self, purpose: str, **kwargs) -> AsyncIterator:
+        """Потоковый chat.completions.create: слот пула занят до конца потока."""
+        async with self._slot(purpose):
+            stream = await self.client.chat.completions.create(stream=True, **kwargs)
+            async for chunk in stream:
+                yield chunk
+
+    def snapshot(self) -> dict:
+        return {
+            "breaker": {
+                "state": self.breaker.state,
+                "consecutive_failures": self.breaker.consecutive_failures,
+                "times_opened": self.breaker.times_opened,
+                "short_circuited": self.breaker.short_circuited,
+            },
+            "pools": {name: pool.snapshot() for name, pool in self.pools.items()},
+            "hedges_started": self.hedges_started,
+            "hedges_won": self.hedges_won,
+        }
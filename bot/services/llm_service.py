@@ -1,4 +1,8 @@
+import asyncio
 import json
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator
 from openai import AsyncOpenAI
 from dataclasses import dataclass
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -9,12 +13,21 @@ from bot.config.settings import settings
 from database.models import User, Exercise
 from bot.schemas.workout import LLMWorkoutPlan
 from bot.requests import subscription_requests, message_requests
+from bot.services.exercise_catalog import CatalogExercise
+from bot.services.plan_cache import plan_cache
+from bot.services.plan_repair import repair_workout_plan
+from bot.services.llm_client import LLMClient, PURPOSE_BATCH, PURPOSE_CHAT, PURPOSE_PLAN
 
 
 TRIAL_MESSAGE_LIMIT = 20
 SUBSCRIPTION_MESSAGE_LIMIT = 500
 
 
+# Помечает фоновые вызовы LLM (пакетная и предварительная генерация планов): они идут
+# через отдельный пул PURPOSE_BATCH и уступают интерактивным
+_background_call: ContextVar[bool] = ContextVar("llm_background_call", default=False)
+
+
 @dataclass
 class MessageLimitStatus:
     can_send: bool
@@ -197,11 +210,55 @@ MASTER_PROMPT = """
 """
 
 
+# Дополнение к MASTER_PROMPT для компактного формата списков упражнений
+COMPACT_EXERCISES_NOTE = """
+# ФОРМАТ СПИСКОВ УПРАЖНЕНИЙ
+Списки упражнений сжаты: `equipment_type` указан один раз для всего списка, упражнения
+сгруппированы по группам мышц в `by_muscle_group` и заданы парами [id, "название"].
+`banned_exercises` — это список id. В ответе для КАЖДОГО упражнения укажи `exercise_id`
+(id из списка) и точное `exercise_name`.
+"""
+
+# Дополнение к промпту для точечного переспроса одного дня плана
+DAY_REPAIR_PROMPT = """
+# ИСПРАВЛЕНИЕ ОДНОГО ДНЯ
+В твоем ответе день {day_number} содержал ошибки:
+{problems}
+
+Твой вариант этого дня:
+{day_json}
+
+Верни ИСКЛЮЧИТЕЛЬНО JSON-объект ОДНОГО дня в том же формате, что и элемент массива `workout_plan`
+(поля `day`, `focus`, `warm_up`, `exercises`, `cool_down`), используя только упражнения из входных данных.
+"""
+
+
 class LLMService:
     def __init__(self):
         self.client = AsyncOpenAI(
             api_key=settings.PROXY_API_KEY, base_url=settings.PROXY_API_URL
         )
+        self.llm_client = LLMClient(self.client)
+
+    @property
+    def interactive_in_flight(self) -> int:
+        """Число выполняющихся интерактивных (не фоновых) запросов к LLM."""
+        pools = self.llm_client.pools
+        return pools[PURPOSE_CHAT].in_flight + pools[PURPOSE_PLAN].in_flight
+
+    @contextmanager
+    def background(self):
+        """Помечает вызовы LLM внутри блока как фоновые (они не учитываются как интерактивные)."""
+        token = _background_call.set(True)
+        try:
+            yield
+        finally:
+            _background_call.reset(token)
+
+    async def wait_for_interactive_idle(self, max_in_flight: int, poll_interval: float = 0.5) -> None:
+        """Ждет, пока число интерактивных запросов к LLM не опустится до `max_in_flight`."""
+        while self.interactive_in_flight > max_in_flight:
+            await asyncio.sleep(poll_interval)
 
     async def get_message_limit_status(
         self, session: AsyncSession, user_id: int
@@ -234,46 +291,62 @@ class LLMService:
         user: User,
         effective_training_week: int,
         *,  # Делаем следующие аргументы только именованными
-        available_exercises: list[Exercise] | None = None,
+        available_exercises: list[Exercise | CatalogExercise] | None = None,
         banned_exercises: list[Exercise] | None = None,
         fixed_exercises: list[Exercise] | None = None,
+        use_cache: bool = True,
     ) -> LLMWorkoutPlan:
         """
         Генерирует НЕДЕЛЬНУЮ программу тренировок с помощью LLM.
         Работает в двух режимах:
         - Поиск новых упражнений: используются `available_exercises` и `banned_exercises`.
         - Применение периодизации: используется `fixed_exercises`.
+        В режиме периодизации результат кэшируется (см. plan_cache); `use_cache=False` обходит кэш.
         """
-        prompt_data = {
-            "user_profile": self._prepare_user_profile_for_prompt(user),
-            "training_context": {"current_training_week": effective_training_week},
-        }
-
-        if fixed_exercises:
-            # Режим "Применение периодизации"
-            prompt_data["fixed_exercises_for_the_week"] = self._prepare_exercises_for_prompt(
-                fixed_exercises
-            )
-        else:
-            # Режим "Поиск упражнений"
-            prompt_data["available_exercises"] = self._prepare_exercises_for_prompt(
-                available_exercises or []
-            )
-            if banned_exercises:
-                prompt_data["banned_exercises"] = self._prepare_exercises_for_prompt(
-                    banned_exercises
-                )
+        compact = settings.PROMPT_COMPACT_ENCODING
+        prompt_data = self.build_prompt_data(
+            user,
+            effective_training_week,
+            available_exercises=available_exercises,
+            banned_exercises=banned_exercises,
+            fixed_exercises=fixed_exercises,
+            compact=compact,
+        )
 
-        input_json_str = json.dumps(prompt_data, ensure_ascii=False, indent=2)
+        # Кэшируем только режим периодизации: в режиме поиска упражнений нужна вариативность
+        cache_key = None
+        if fixed_exercises and plan_cache.enabled:
+            if use_cache:
+                cache_key = plan_cache.make_key(prompt_data)
+                cached_plan = await plan_cache.get(cache_key)
+                if cached_plan:
+                    logging.info(f"Plan cache hit for user {user.telegram_id}")
+                    return cached_plan
+            else:
+                plan_cache.bypassed += 1
 
-        prompt = MASTER_PROMPT.format(input_json=input_json_str)
+        prompt = self.render_workout_prompt(prompt_data, compact=compact)
 
         response_json = await self._make_llm_call(prompt)
-        return LLMWorkoutPlan.model_validate(response_json)
+
+        async def reask_day(day_number: int, day: dict, problems: list[str]) -> dict:
+            return await self._regenerate_day(prompt, day_number, day, problems)
+
+        # Исправляем типичные дефекты ответа на месте; невалидные дни переспрашиваются по одному
+        plan = await repair_workout_plan(
+            response_json,
+            fixed_exercises or available_exercises or [],
+            workout_frequency=user.workout_frequency,
+            reask_day=reask_day,
+        )
+        if fixed_exercises and plan_cache.enabled:
+            await plan_cache.set(cache_key or plan_cache.make_key(prompt_data), plan)
+        return plan
 
     async def _make_llm_call(self, prompt: str) -> dict:
         """Отправляет запрос к LLM и возвращает JSON."""
-        chat_completion = await self.client.chat.completions.create(
+        chat_completion = await self.llm_client.complete(
+            PURPOSE_BATCH if _background_call.get() else PURPOSE_PLAN,
             model="gpt-4o-mini",
             messages=[{"role": "user", "content": prompt}],
             response_format={"type": "json_object"},
@@ -282,6 +355,21 @@ class LLMService:
         )
         return json.loads(chat_completion.choices[0].message.content)
 
+    async def _regenerate_day(
+        self, prompt: str, day_number: int, day: dict, problems: list[str]
+    ) -> dict:
+        """Переспрашивает у LLM только один день плана, в котором не удалось исправить ошибки."""
+        repair_prompt = prompt + DAY_REPAIR_PROMPT.format(
+            day_number=day_number,
+            problems="\n".join(f"- {problem}" for problem in problems),
+            day_json=json.dumps(day, ensure_ascii=False),
+        )
+        response_json = await self._make_llm_call(repair_prompt)
+        # Модель иногда заворачивает день в структуру полного плана
+        if isinstance(response_json.get("workout_plan"), list) and response_json["workout_plan"]:
+            return response_json["workout_plan"][0]
+        return response_json
+
     def _prepare_user_profile_for_prompt(self, user: User) -> dict:
         """Конвертирует данные пользователя в формат для промпта."""
         # 'intermediate' и 'advanced' для LLM сейчас считаются как 'advanced'
@@ -300,8 +388,72 @@ class LLMService:
             "session_duration": 60,
         }
 
-    def _prepare_exercises_for_prompt(self, exercises: list[Exercise]) -> list[dict]:
-        """Преобразует список упражнений в плоский список словарей для промпта."""
+    def build_prompt_data(
+        self,
+        user: User,
+        effective_training_week: int,
+        *,
+        available_exercises: list[Exercise | CatalogExercise] | None = None,
+        banned_exercises: list[Exercise] | None = None,
+        fixed_exercises: list[Exercise] | None = None,
+        compact: bool = False,
+    ) -> dict:
+        """Собирает входные данные для MASTER_PROMPT в обычном или компактном формате."""
+        encode = self._encode_exercises_compact if compact else self._prepare_exercises_for_prompt
+        prompt_data = {
+            "user_profile": self._prepare_user_profile_for_prompt(user),
+            "training_context": {"current_training_week": effective_training_week},
+        }
+
+        if fixed_exercises:
+            # Режим "Применение периодизации"
+            prompt_data["fixed_exercises_for_the_week"] = encode(fixed_exercises)
+        else:
+            # Режим "Поиск упражнений"
+            prompt_data["available_exercises"] = encode(available_exercises or [])
+            if banned_exercises:
+                if compact:
+                    # Запрещенные упражнения достаточно перечислить по id из списка доступных
+                    available_ids = {ex.id for ex in available_exercises or []}
+                    prompt_data["banned_exercises"] = sorted(
+                        ex.id for ex in banned_exercises if ex.id in available_ids
+                    )
+                else:
+                    prompt_data["banned_exercises"] = self._prepare_exercises_for_prompt(
+                        banned_exercises
+                    )
+        return prompt_data
+
+    def render_workout_prompt(self, prompt_data: dict, compact: bool = False) -> str:
+        """Подставляет входные данные в MASTER_PROMPT."""
+        if compact:
+            input_json_str = json.dumps(prompt_data, ensure_ascii=False, separators=(",", ":"))
+            return MASTER_PROMPT.format(input_json=input_json_str) + COMPACT_EXERCISES_NOTE
+        input_json_str = json.dumps(prompt_data, ensure_ascii=False, indent=2)
+        return MASTER_PROMPT.format(input_json=input_json_str)
+
+    def _encode_exercises_compact(self, exercises: list[Exercise | CatalogExercise]) -> dict:
+        """
+        Компактное представление списка упражнений: оборудование вынесено наверх,
+        упражнения сгруппированы по группам мышц и заданы парами [id, название].
+        """
+        equipment = {ex.equipment_type.value for ex in exercises}
+        groups: dict[str, list] = {}
+        for ex in sorted(exercises, key=lambda ex: ex.id):
+            group = ex.muscle_groups or "Другое"
+            if len(equipment) > 1:
+                # Смешанный список: оборудование остается в названии группы
+                group = f"{group} ({ex.equipment_type.value})"
+            groups.setdefault(group, []).append([ex.id, ex.name])
+        return {
+            "equipment_type": equipment.pop() if len(equipment) == 1 else None,
+            "by_muscle_group": groups,
+        }
+
+    def _prepare_exercises_for_prompt(
+        self, exercises: list[Exercise | CatalogExercise]
+    ) -> list[dict]:
+        """Преобразует список упражнений (из БД или каталога) в плоский список словарей для промпта."""
         return [
             {
                 "name": ex.name,
@@ -311,14 +463,37 @@ class LLMService:
             for ex in exercises
         ]
 
-    async def generate_ai_coach_response(self, question: str) -> str:
-        chat_completion = await self.client.chat.completions.create(
+    def _coach_messages(self, question: str, history: list[dict] | None) -> list[dict]:
+        return [
+            {"role": "system", "content": AI_COACH_PROMPT},
+            *(history or []),
+            {"role": "user", "content": question},
+        ]
+
+    async def generate_ai_coach_response(self, question: str, history: list[dict] | None = None) -> str:
+        chat_completion = await self.llm_client.complete(
+            PURPOSE_CHAT,
             model="gpt-4o-mini",
-            messages=[{"role": "system", "content": AI_COACH_PROMPT}, {"role": "user", "content": question}],
+            messages=self._coach_messages(question, history),
             temperature=0.2,
             timeout=30.0,
         )
         return chat_completion.choices[0].message.content.strip()
 
+    async def stream_ai_coach_response(
+        self, question: str, history: list[dict] | None = None
+    ) -> AsyncIterator[str]:
+        """Потоковый вариант generate_ai_coach_response: отдает фрагменты ответа по мере генерации."""
+        stream = self.llm_client.stream(
+            PURPOSE_CHAT,
+            model="gpt-4o-mini",
+            messages=self._coach_messages(question, history),
+            temperature=0.2,
+            timeout=30.0,
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
 
 llm_service = LLMService()
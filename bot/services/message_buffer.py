@@ -0,0 +1,187 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from time import monotonic
+
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from bot.config.settings import settings
+from bot.requests import message_requests
+
+
+@dataclass
+class MessageBufferStats:
+    enqueued: int = 0
+    flushed: int = 0
+    batches: int = 0
+    flush_errors: int = 0
+    dropped: int = 0
+    flush_seconds: float = 0.0
+    max_flush_seconds: float = 0.0
+    backpressure_waits: int = 0
+
+    @property
+    def avg_batch(self) -> float:
+        return self.flushed / self.batches if self.batches else 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.flushed / self.flush_seconds if self.flush_seconds else 0.0
+
+
+class MessageBuffer:
+    """
+    Отложенная запись сообщений пользователей (user_messages).
+    Сообщения копятся в ограниченной очереди и сбрасываются в БД пачками — по размеру
+    (MESSAGE_BUFFER_BATCH_SIZE) или по времени (MESSAGE_BUFFER_FLUSH_SECONDS).
+    Если очередь заполнена, `add` ждет освобождения места, сообщения не теряются.
+    Пока БД недоступна, запись пачки повторяется с растущей паузой, а заполненная очередь
+    притормаживает писателей. Если БД отвергает сами данные (IntegrityError, DataError),
+    пачка пишется по частям; строки, которые не записываются и по одной, логируются
+    и отбрасываются.
+    """
+
+    def __init__(self):
+        self.session_pool: async_sessionmaker | None = None
+        self.stats = MessageBufferStats()
+        self._queue: asyncio.Queue | None = None
+        self._flusher: asyncio.Task | None = None
+        self._flush_lock = asyncio.Lock()
+        # Пачка, которую фоновая задача уже забрала из очереди, но еще не записала
+        self._in_flight: list[dict] = []
+
+    def setup(self, session_pool: async_sessionmaker) -> None:
+        self.session_pool = session_pool
+
+    @property
+    def is_running(self) -> bool:
+        return self._flusher is not None
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=settings.MESSAGE_BUFFER_MAX_SIZE)
+        self._flusher = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Останавливает фоновую запись и сбрасывает в БД все, что осталось в очереди."""
+        if not self._flusher:
+            return
+        self._flusher.cancel()
+        await asyncio.gather(self._flusher, return_exceptions=True)
+        self._flusher = None
+        if self._in_flight:
+            rows, self._in_flight = self._in_flight, []
+            await self._write(rows)
+        while self._queue.qsize():
+            await self.flush()
+        logging.info(f"Message buffer drained: {self.stats.flushed} messages written in total.")
+
+    async def add(
+        self,
+        user_id: int,
+        message: str,
+        response: str | None = None,
+        created_at: datetime | None = None,
+    ) -> None:
+        """Ставит сообщение (и ответ тренера, если есть) в очередь на запись."""
+        row = {
+            "user_id": user_id,
+            "message": message,
+            "response": response,
+            "created_at": created_at or datetime.now(),
+        }
+        if not self.is_running:
+            async with self.session_pool() as session:
+                await message_requests.add_messages_bulk(session, [row])
+            return
+        if self._queue.full():
+            self.stats.backpressure_waits += 1
+        await self._queue.put(row)
+        self.stats.enqueued += 1
+
+    async def flush(self) -> None:
+        """Записывает в БД одну пачку из очереди."""
+        async with self._flush_lock:
+            rows = []
+            while self._queue.qsize() and len(rows) < settings.MESSAGE_BUFFER_BATCH_SIZE:
+                rows.append(self._queue.get_nowait())
+            if rows:
+                await self._write(rows)
+
+    async def _write(self, rows: list[dict]) -> None:
+        started = monotonic()
+        if await self._insert(rows):
+            written = len(rows)
+        else:
+            # В пачке есть строка, которую БД не примет никогда: делим пачку пополам
+            logging.error(f"User messages batch of {len(rows)} rows was rejected by the database, splitting it.")
+            written = await self._write_split(rows)
+
+        elapsed = monotonic() - started
+        self.stats.flushed += written
+        self.stats.batches += 1
+        self.stats.flush_seconds += elapsed
+        self.stats.max_flush_seconds = max(self.stats.max_flush_seconds, elapsed)
+
+    async def _write_split(self, rows: list[dict]) -> int:
+        """Пишет пачку половинами, пока не останутся отдельные сбойные строки. Возвращает число записанных."""
+        if len(rows) == 1:
+            row = rows[0]
+            self.stats.dropped += 1
+            logging.error(
+                f"Dropping user message of user {row['user_id']} created at {row['created_at']}: it cannot be written."
+            )
+            return 0
+        written = 0
+        middle = len(rows) // 2
+        for part in (rows[:middle], rows[middle:]):
+            written += len(part) if await self._insert(part) else await self._write_split(part)
+        return written
+
+    async def _insert(self, rows: list[dict]) -> bool:
+        """
+        Записывает строки, повторяя попытки, пока БД недоступна.
+        Возвращает False, если БД отвергла сами данные.
+        """
+        attempt = 0
+        while True:
+            try:
+                async with self.session_pool() as session:
+                    await message_requests.add_messages_bulk(session, rows)
+                return True
+            except (IntegrityError, DataError) as e:
+                self.stats.flush_errors += 1
+                logging.warning(f"Database rejected {len(rows)} user messages: {e}")
+                return False
+            except Exception as e:
+                # Не теряем пачку: повторяем с растущей паузой
+                attempt += 1
+                self.stats.flush_errors += 1
+                delay = min(30, 2 ** attempt)
+                logging.error(f"Failed to write {len(rows)} user messages (attempt {attempt}): {e}. Retrying in {delay}s.")
+                await asyncio.sleep(delay)
+
+    async def _run(self) -> None:
+        while True:
+            # Ждем первое сообщение, затем добираем пачку до размера или до истечения интервала
+            self._in_flight = [await self._queue.get()]
+            deadline = monotonic() + settings.MESSAGE_BUFFER_FLUSH_SECONDS
+            while len(self._in_flight) < settings.MESSAGE_BUFFER_BATCH_SIZE:
+                timeout = deadline - monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    self._in_flight.append(await asyncio.wait_for(self._queue.get(), timeout=timeout))
+                except asyncio.TimeoutError:
+                    break
+            async with self._flush_lock:
+                await self._write(self._in_flight)
+            self._in_flight = []
+
+
+message_buffer = MessageBuffer()
@@ -0,0 +1,162 @@
+import logging
+from datetime import datetime, timedelta
+
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from bot.requests import message_requests, subscription_requests
+from bot.services.message_buffer import message_buffer
+from bot.services.llm_service import (
+    llm_service,
+    MessageLimitStatus,
+    TRIAL_MESSAGE_LIMIT,
+    SUBSCRIPTION_MESSAGE_LIMIT,
+)
+from database.models import Subscription, SubscriptionStatusEnum
+
+
+# Поднимает счетчик до значения из БД, но никогда не опускает: INCR, сделанный между
+# подсчетом по БД и сверкой, не теряется, а сообщения, еще не записанные буферами
+# других реплик, не возвращают пользователю лимит
+_RAISE_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current and tonumber(current) < tonumber(ARGV[1]) then
+    redis.call('SET', KEYS[1], ARGV[1], 'KEEPTTL')
+    return 1
+end
+return 0
+"""
+
+
+class MessageQuota:
+    """
+    Счетчики сообщений AI-тренеру в Redis: один ключ на пользователя и расчетный период
+    (`msg_quota:<user_id>:trial` или `msg_quota:<user_id>:<начало периода>`).
+    Ключ засевается из user_messages при первом обращении, дальше проверка лимита —
+    это один атомарный INCR. Расхождения с БД исправляет периодическая сверка (reconcile).
+    """
+
+    KEY_PREFIX = "msg_quota:"
+
+    def __init__(self):
+        self.redis: Redis | None = None
+        self.hits = 0
+        self.seeded = 0
+        self.fallbacks = 0
+        self.reconciled = 0
+        self.repaired = 0
+        self.last_reconciled_at: datetime | None = None
+
+    def setup(self, redis: Redis) -> None:
+        self.redis = redis
+
+    def _period(self, subscription: Subscription) -> tuple[str, datetime | None, int, datetime]:
+        """Возвращает (идентификатор периода, начало периода, лимит, момент истечения ключа)."""
+        now = datetime.now()
+        if subscription.status == SubscriptionStatusEnum.trial:
+            # У триала нет границы периода: ключ живет скользящие 30 дней и засевается заново
+            return "trial", None, TRIAL_MESSAGE_LIMIT, now + timedelta(days=30)
+        # Платный период начинается с последнего обновления подписки (как и в подсчете по БД)
+        since = subscription.updated_at
+        expires_at = subscription.expires_at
+        if not expires_at or expires_at <= now:
+            expires_at = now + timedelta(days=31)
+        return str(int(since.timestamp())), since, SUBSCRIPTION_MESSAGE_LIMIT, expires_at
+
+    async def try_consume(self, session: AsyncSession, user_id: int) -> MessageLimitStatus:
+        """
+        Проверяет лимит и, если он не исчерпан, сразу засчитывает сообщение.
+        `remaining` — сколько сообщений оставалось до текущего (как в get_message_limit_status).
+        """
+        subscription = await subscription_requests.get_subscription_by_user_id(session, user_id)
+        if not subscription or subscription.status not in ["trial", "active"]:
+            return MessageLimitStatus(can_send=False, remaining=0, limit=0, is_trial=False)
+
+        period, since, limit, expires_at = self._period(subscription)
+        is_trial = period == "trial"
+        if self.redis is None:
+            return await self._fallback(session, user_id)
+
+        key = f"{self.KEY_PREFIX}{user_id}:{period}"
+        try:
+            if not await self.redis.exists(key):
+                used = await message_requests.count_user_messages(session, user_id, since=since)
+                # NX: если ключ параллельно засеял другой апдейт, его значение не затираем
+                await self.redis.set(key, used, nx=True, exat=int(expires_at.timestamp()))
+                self.seeded += 1
+            used_after = await self.redis.incr(key)
+            if is_trial:
+                await self.redis.expireat(key, int(expires_at.timestamp()))
+            if used_after > limit:
+                await self.redis.decr(key)
+                self.hits += 1
+                return MessageLimitStatus(can_send=False, remaining=0, limit=limit, is_trial=is_trial)
+        except Exception as e:
+            logging.warning(f"Message quota Redis error for user {user_id}: {e}. Falling back to DB count.")
+            return await self._fallback(session, user_id)
+
+        self.hits += 1
+        return MessageLimitStatus(can_send=True, remaining=limit - used_after + 1, limit=limit, is_trial=is_trial)
+
+    async def _fallback(self, session: AsyncSession, user_id: int) -> MessageLimitStatus:
+        self.fallbacks += 1
+        return await llm_service.get_message_limit_status(session, user_id)
+
+    async def reconcile(self, session_pool: async_sessionmaker, batch_size: int = 200) -> None:
+        """
+        Сверяет счетчики в Redis с таблицей user_messages: отстающий счетчик атомарно
+        поднимается до значения из БД, опережающий не трогается (см. _RAISE_SCRIPT).
+        Ключи обходятся через SCAN, подсчет по БД выполняется одним запросом на пачку ключей.
+        """
+        if self.redis is None:
+            return
+        logging.info("Running scheduled job: reconcile message quotas")
+        # Сначала дописываем буфер сообщений, иначе БД отстает от счетчиков
+        while message_buffer.pending:
+            await message_buffer.flush()
+        checked = repaired = 0
+        batch: list[tuple[str, int, datetime | None]] = []
+
+        async def process(batch):
+            nonlocal checked, repaired
+            async with session_pool() as session:
+                counts = await message_requests.count_messages_for_periods(
+                    session, [(user_id, since) for _, user_id, since in batch]
+                )
+            for (key, user_id, _), actual in zip(batch, counts):
+                if await self.redis.eval(_RAISE_SCRIPT, 1, key, actual):
+                    repaired += 1
+                    logging.info(f"Message quota for user {user_id} raised to the DB count {actual}.")
+            checked += len(batch)
+
+        async for raw_key in self.redis.scan_iter(match=f"{self.KEY_PREFIX}*", count=batch_size):
+            key = raw_key.decode() if isinstance(raw_key, bytes) else raw_key
+            try:
+                user_id_str, period = key[len(self.KEY_PREFIX):].split(":", 1)
+                since = None if period == "trial" else datetime.fromtimestamp(int(period))
+                batch.append((key, int(user_id_str), since))
+            except ValueError:
+                logging.warning(f"Skipping malformed message quota key {key}")
+                continue
+            if len(batch) >= batch_size:
+                await process(batch)
+                batch = []
+        if batch:
+            await process(batch)
+
+        self.reconciled += checked
+        self.repaired += repaired
+        self.last_reconciled_at = datetime.now()
+        logging.info(f"Message quota reconciliation finished: checked={checked}, repaired={repaired}.")
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "seeded": self.seeded,
+            "fallbacks": self.fallbacks,
+            "reconciled": self.reconciled,
+            "repaired": self.repaired,
+        }
+
+
+message_quota = MessageQuota()
@@ -0,0 +1,140 @@
+import logging
+from dataclasses import dataclass
+
+from bot.schemas.workout import ExercisePlan, LLMWorkoutPlan, PlanSummary, WorkoutDayPlan
+from bot.services.plan_repair import DEFAULT_COOL_DOWN, DEFAULT_WARM_UP
+from database.models import EquipmentTypeEnum, GoalEnum, User, Workout
+
+# Таблицы периодизации из правила №1 MASTER_PROMPT: неделя -> (подходы, повторения, цель недели)
+LINEAR_TABLE = {
+    1: (3, "15", "Адаптационная неделя по линейной программе"),
+    2: (3, "12", "Неделя мышечной выносливости по линейной программе"),
+    3: (4, "10", "Неделя гипертрофии по линейной программе"),
+    4: (4, "8", "Неделя гипертрофии и силы по линейной программе"),
+    5: (5, "6", "Силовая неделя по линейной программе"),
+    6: (2, "15", "Разгрузочная неделя по линейной программе"),
+}
+UNDULATING_TABLE = {
+    1: (3, "6-8", "Силовая неделя по волновой программе"),
+    2: (3, "10-12", "Неделя гипертрофии по волновой программе"),
+    3: (3, "15", "Неделя выносливости по волновой программе"),
+}
+
+# Правило №2: для собственного веса повторения всегда "до отказа", 3-4 подхода
+BODYWEIGHT_REPS = "До отказа"
+BODYWEIGHT_SETS = (3, 4)
+# Недели, с которых новичку с собственным весом нужны более сложные вариации упражнений.
+# Подобрать их может только LLM, поэтому такие недели локально не генерируются.
+BODYWEIGHT_BEGINNER_PROGRESSION_WEEKS = {3, 5}
+
+
+@dataclass
+class PeriodizationStats:
+    local_plans: int = 0
+    llm_fallbacks: int = 0
+
+
+periodization_stats = PeriodizationStats()
+
+
+def _is_beginner(user: User) -> bool:
+    # Как и в промпте, 'intermediate' считается 'advanced'
+    return user.fitness_level.value == "beginner"
+
+
+def split_type_for(user: User) -> str:
+    """Сплит по правилам №2 и №3 MASTER_PROMPT."""
+    if user.equipment_type == EquipmentTypeEnum.bodyweight:
+        return "Full Body"
+    if user.workout_frequency == 5:
+        return "Body Part Split"
+    if user.workout_frequency == 3 and not _is_beginner(user) and user.goal == GoalEnum.mass_gain:
+        return "Push/Pull/Legs"
+    return "Full Body"
+
+
+def _day_focus(workout: Workout, split_type: str) -> str:
+    if split_type == "Full Body":
+        return "Full Body"
+    groups = []
+    for we in sorted(workout.workout_exercises, key=lambda we: we.order):
+        group = we.exercise.muscle_groups if we.exercise else None
+        if group and group not in groups:
+            groups.append(group)
+    return ", ".join(groups[:3]) or split_type
+
+
+def can_build_locally(user: User, effective_week: int) -> bool:
+    """Можно ли получить план недели без LLM (только середина цикла с теми же упражнениями)."""
+    if effective_week <= 1:
+        return False
+    if user.equipment_type == EquipmentTypeEnum.bodyweight and _is_beginner(user):
+        return effective_week not in BODYWEIGHT_BEGINNER_PROGRESSION_WEEKS
+    return True
+
+
+def build_local_plan(
+    user: User, effective_week: int, last_workouts: list[Workout]
+) -> LLMWorkoutPlan | None:
+    """
+    Строит план недели середины цикла без LLM: дни и упражнения прошлой недели
+    (`last_workouts` — с загруженными workout_exercises и exercise) сохраняются как есть,
+    подходы и повторения берутся из таблиц периодизации MASTER_PROMPT.
+    Возвращает None, если по прошлой неделе план построить нельзя — тогда нужен LLM.
+    """
+    if not can_build_locally(user, effective_week):
+        return None
+    if not last_workouts or len(last_workouts) < (user.workout_frequency or 1):
+        return None
+    if any(not workout.workout_exercises for workout in last_workouts):
+        return None
+
+    beginner = _is_beginner(user)
+    table = LINEAR_TABLE if beginner else UNDULATING_TABLE
+    if effective_week not in table:
+        logging.warning(f"No periodization row for week {effective_week} (beginner={beginner}).")
+        return None
+    sets, reps, primary_goal = table[effective_week]
+    bodyweight = user.equipment_type == EquipmentTypeEnum.bodyweight
+    split_type = split_type_for(user)
+
+    days = []
+    ordered_workouts = sorted(last_workouts, key=lambda w: w.planned_date)[: user.workout_frequency or 1]
+    for day_number, workout in enumerate(ordered_workouts, start=1):
+        exercises = []
+        for order, we in enumerate(sorted(workout.workout_exercises, key=lambda we: we.order), start=1):
+            if we.exercise is None:
+                return None
+            if bodyweight:
+                low, high = BODYWEIGHT_SETS
+                exercise_sets = min(max(we.sets or low, low), high)
+                exercise_reps = BODYWEIGHT_REPS
+            else:
+                exercise_sets, exercise_reps = sets, reps
+            exercises.append(
+                ExercisePlan(
+                    order=order,
+                    exercise_name=we.exercise.name,
+                    sets=exercise_sets,
+                    reps=exercise_reps,
+                    exercise_id=we.exercise.id,
+                )
+            )
+        days.append(
+            WorkoutDayPlan(
+                day=day_number,
+                focus=_day_focus(workout, split_type),
+                warm_up=workout.warm_up or DEFAULT_WARM_UP,
+                exercises=exercises,
+                cool_down=workout.cool_down or DEFAULT_COOL_DOWN,
+            )
+        )
+
+    return LLMWorkoutPlan(
+        plan_summary=PlanSummary(
+            periodization_type="Линейная" if beginner else "Волновая",
+            split_type=split_type,
+            primary_goal=primary_goal,
+        ),
+        workout_plan=days,
+    )
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+
+from redis.asyncio import Redis
+
+from bot.config.settings import settings
+from bot.schemas.workout import LLMWorkoutPlan
+
+
+class PlanCache:
+    """
+    Кэш сгенерированных LLM планов: локальный LRU + Redis с TTL.
+    Ключ — хэш канонического `prompt_data`, где возраст, рост и вес округлены до корзин,
+    поэтому пользователи с похожим профилем и одинаковыми упражнениями получают один ключ.
+    """
+
+    KEY_PREFIX = "plan_cache:"
+
+    def __init__(self, local_size: int, ttl_seconds: int):
+        self.redis: Redis | None = None
+        self.local_size = local_size
+        self.ttl_seconds = ttl_seconds
+        self._local: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self.hits_local = 0
+        self.hits_redis = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    def setup(self, redis: Redis) -> None:
+        self.redis = redis
+
+    @property
+    def enabled(self) -> bool:
+        return settings.PLAN_CACHE_ENABLED
+
+    def make_key(self, prompt_data: dict) -> str:
+        """Строит ключ кэша по каноническому представлению входных данных промпта."""
+        data = json.loads(json.dumps(prompt_data, ensure_ascii=False))
+        profile = data.get("user_profile", {})
+        buckets = {
+            "age": settings.PLAN_CACHE_AGE_BUCKET,
+            "height": settings.PLAN_CACHE_HEIGHT_BUCKET,
+            "current_weight": settings.PLAN_CACHE_WEIGHT_BUCKET,
+        }
+        for field, bucket in buckets.items():
+            if profile.get(field) is not None and bucket > 0:
+                profile[field] = int(profile[field] // bucket * bucket)
+
+        # Порядок упражнений не влияет на план — сортируем списки для стабильного ключа
+        for field, value in data.items():
+            if isinstance(value, list):
+                data[field] = sorted(value, key=lambda item: json.dumps(item, sort_keys=True, ensure_ascii=False))
+
+        canonical = json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    async def get(self, key: str) -> LLMWorkoutPlan | None:
+        now = time.time()
+        entry = self._local.get(key)
+        if entry and entry[0] > now:
+            self._local.move_to_end(key)
+            self.hits_local += 1
+            return LLMWorkoutPlan.model_validate_json(entry[1])
+        if entry:
+            del self._local[key]
+
+        if self.redis is not None:
+            try:
+                raw = await self.redis.get(self.KEY_PREFIX + key)
+            except Exception as e:
+                logging.warning(f"Plan cache Redis read failed: {e}")
+                raw = None
+            if raw:
+                payload = raw.decode() if isinstance(raw, bytes) else raw
+                self._remember(key, payload, now)
+                self.hits_redis += 1
+                return LLMWorkoutPlan.model_validate_json(payload)
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, plan: LLMWorkoutPlan) -> None:
+        payload = plan.model_dump_json()
+        self._remember(key, payload, time.time())
+        if self.redis is not None:
+            try:
+                await self.redis.set(self.KEY_PREFIX + key, payload, ex=self.ttl_seconds)
+            except Exception as e:
+                logging.warning(f"Plan cache Redis write failed: {e}")
+
+    def _remember(self, key: str, payload: str, now: float) -> None:
+        self._local[key] = (now + self.ttl_seconds, payload)
+        self._local.move_to_end(key)
+        while len(self._local) > self.local_size:
+            self._local.popitem(last=False)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits_local": self.hits_local,
+            "hits_redis": self.hits_redis,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "local_size": len(self._local),
+        }
+
+
+plan_cache = PlanCache(
+    local_size=settings.PLAN_CACHE_LOCAL_SIZE,
+    ttl_seconds=settings.PLAN_CACHE_TTL_SECONDS,
+)
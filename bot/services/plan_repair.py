@@ -0,0 +1,240 @@
+import difflib
+import logging
+import re
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+from pydantic import ValidationError
+
+from bot.schemas.workout import LLMWorkoutPlan, PlanSummary, WorkoutDayPlan
+from bot.services.exercise_catalog import normalize_exercise_name
+
+# Значения по умолчанию для пропущенных текстовых полей дня (совпадают с правилами MASTER_PROMPT)
+DEFAULT_WARM_UP = "5 минут легкого кардио и 5 минут динамической растяжки."
+DEFAULT_COOL_DOWN = "5 минут статической растяжки."
+DEFAULT_FOCUS = "Тренировка"
+
+# Насколько похожим должно быть название, чтобы считать его опечаткой упражнения из каталога
+FUZZY_CUTOFF = 0.85
+
+
+class PlanRepairError(Exception):
+    """План не удалось исправить локально и точечным переспросом — нужна полная повторная генерация."""
+
+
+@dataclass
+class PlanRepairStats:
+    checked: int = 0
+    clean: int = 0  # прошли строгую проверку без исправлений
+    repaired: int = 0  # исправлены локально и/или переспросом дня — полная перегенерация не понадобилась
+    failed: int = 0  # ушли на полную повторную генерацию
+    names_fuzzy_matched: int = 0
+    names_resolved_by_id: int = 0
+    reps_coerced: int = 0
+    orders_renumbered: int = 0
+    days_trimmed: int = 0
+    days_reasked: int = 0
+
+
+plan_repair_stats = PlanRepairStats()
+
+
+class _NameResolver:
+    def __init__(self, exercises):
+        self.by_name = {ex.name: ex.name for ex in exercises}
+        self.by_id = {ex.id: ex.name for ex in exercises}
+        self.by_normalized = {normalize_exercise_name(ex.name): ex.name for ex in exercises}
+
+    def resolve(self, name: str | None, exercise_id: int | None) -> str | None:
+        if exercise_id in self.by_id:
+            if self.by_id[exercise_id] != name:
+                plan_repair_stats.names_resolved_by_id += 1
+            return self.by_id[exercise_id]
+        if not isinstance(name, str) or not name:
+            return None
+        if name in self.by_name:
+            return name
+        normalized = normalize_exercise_name(name)
+        if normalized in self.by_normalized:
+            return self.by_normalized[normalized]
+        matches = difflib.get_close_matches(normalized, self.by_normalized.keys(), n=1, cutoff=FUZZY_CUTOFF)
+        if matches:
+            plan_repair_stats.names_fuzzy_matched += 1
+            logging.info(f"Plan repair: '{name}' matched to '{self.by_normalized[matches[0]]}'.")
+            return self.by_normalized[matches[0]]
+        return None
+
+
+def _coerce_int(value) -> int | None:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value)
+    if isinstance(value, str):
+        match = re.search(r"\d+", value)
+        if match:
+            return int(match.group())
+    return None
+
+
+def _coerce_reps(value) -> int | str | None:
+    """Приводит повторения к виду "12", "8-10" или "До отказа"."""
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, float):
+        return int(value)
+    if not isinstance(value, str) or not value.strip():
+        return None
+    text = value.strip()
+    if "отказ" in text.lower():
+        return "До отказа"
+    numbers = re.findall(r"\d+", text)
+    if len(numbers) >= 2:
+        return f"{numbers[0]}-{numbers[1]}"
+    if numbers:
+        return numbers[0]
+    return text
+
+
+def _repair_day(day: dict, day_number: int, resolver: _NameResolver) -> tuple[dict, list[str]]:
+    """Исправляет один день плана. Возвращает (исправленный день, список неустранимых проблем)."""
+    problems = []
+    if not isinstance(day, dict):
+        return {}, ["день не является JSON-объектом"]
+
+    exercises = day.get("exercises")
+    if not isinstance(exercises, list) or not exercises:
+        return day, ["в дне нет списка упражнений"]
+
+    repaired_exercises = []
+    for index, exercise in enumerate(exercises, start=1):
+        if not isinstance(exercise, dict):
+            problems.append(f"упражнение #{index} не является JSON-объектом")
+            continue
+        exercise = dict(exercise)
+        name = resolver.resolve(exercise.get("exercise_name"), _coerce_int(exercise.get("exercise_id")))
+        if name is None:
+            problems.append(f"упражнения '{exercise.get('exercise_name')}' нет в списке доступных")
+            continue
+        exercise["exercise_name"] = name
+
+        sets = _coerce_int(exercise.get("sets"))
+        if sets is None:
+            problems.append(f"у упражнения '{name}' не указано число подходов")
+            continue
+        exercise["sets"] = sets
+
+        reps = _coerce_reps(exercise.get("reps"))
+        if reps is None:
+            problems.append(f"у упражнения '{name}' не указаны повторения")
+            continue
+        if reps != exercise.get("reps"):
+            plan_repair_stats.reps_coerced += 1
+        exercise["reps"] = reps
+        repaired_exercises.append(exercise)
+
+    # Порядок выполнения — просто 1..N в порядке следования
+    for order, exercise in enumerate(repaired_exercises, start=1):
+        if exercise.get("order") != order:
+            plan_repair_stats.orders_renumbered += 1
+        exercise["order"] = order
+
+    repaired = {
+        **day,
+        "day": day_number,
+        "focus": day.get("focus") or DEFAULT_FOCUS,
+        "warm_up": day.get("warm_up") or DEFAULT_WARM_UP,
+        "cool_down": day.get("cool_down") or DEFAULT_COOL_DOWN,
+        "exercises": repaired_exercises,
+    }
+    if not problems:
+        try:
+            WorkoutDayPlan.model_validate(repaired)
+        except ValidationError as e:
+            problems.append(f"неверная структура дня: {e.error_count()} ошибок")
+    return repaired, problems
+
+
+def _is_strictly_valid(response_json: dict, resolver: _NameResolver) -> bool:
+    """Прошел бы ответ проверку без исправлений (валидация схемы и точные названия)."""
+    try:
+        plan = LLMWorkoutPlan.model_validate(response_json)
+    except ValidationError:
+        return False
+    if any(exercise.exercise_id is not None for day in plan.workout_plan for exercise in day.exercises):
+        # Компактный формат: названия все равно берутся по id
+        return all(
+            exercise.exercise_id in resolver.by_id
+            for day in plan.workout_plan
+            for exercise in day.exercises
+        )
+    return all(
+        exercise.exercise_name in resolver.by_name
+        for day in plan.workout_plan
+        for exercise in day.exercises
+    )
+
+
+async def repair_workout_plan(
+    response_json: dict,
+    exercises: list,
+    workout_frequency: int | None,
+    reask_day: Callable[[int, dict, list[str]], Awaitable[dict]] | None = None,
+) -> LLMWorkoutPlan:
+    """
+    Проверяет и по возможности исправляет ответ LLM перед сохранением:
+    сопоставляет названия с каталогом (по id, без учета регистра/«ё» и нечетко),
+    приводит sets/reps, перенумеровывает order и day, обрезает лишние дни.
+    Дни, которые не удалось исправить локально, по одному переспрашиваются у LLM
+    через `reask_day`. Если и это не помогло — PlanRepairError.
+    """
+    plan_repair_stats.checked += 1
+    resolver = _NameResolver(exercises)
+    strictly_valid = _is_strictly_valid(response_json, resolver)
+
+    if not isinstance(response_json, dict):
+        plan_repair_stats.failed += 1
+        raise PlanRepairError("response is not a JSON object")
+    try:
+        summary = PlanSummary.model_validate(response_json.get("plan_summary"))
+    except ValidationError:
+        plan_repair_stats.failed += 1
+        raise PlanRepairError("plan_summary is missing or invalid")
+
+    days = response_json.get("workout_plan")
+    if not isinstance(days, list) or not days:
+        plan_repair_stats.failed += 1
+        raise PlanRepairError("workout_plan is missing or empty")
+
+    if workout_frequency and len(days) > workout_frequency:
+        plan_repair_stats.days_trimmed += len(days) - workout_frequency
+        days = days[:workout_frequency]
+
+    repaired_days = []
+    for day_number, day in enumerate(days, start=1):
+        repaired, problems = _repair_day(day, day_number, resolver)
+        if problems and reask_day is not None:
+            logging.info(f"Plan repair: re-asking LLM for day {day_number}: {'; '.join(problems)}")
+            plan_repair_stats.days_reasked += 1
+            try:
+                new_day = await reask_day(day_number, day, problems)
+            except Exception as e:
+                logging.error(f"Plan repair: re-ask for day {day_number} failed: {e}")
+            else:
+                repaired, problems = _repair_day(new_day, day_number, resolver)
+        if problems:
+            plan_repair_stats.failed += 1
+            raise PlanRepairError(f"day {day_number}: {'; '.join(problems)}")
+        repaired_days.append(repaired)
+
+    plan = LLMWorkoutPlan(
+        plan_summary=summary,
+        workout_plan=[WorkoutDayPlan.model_validate(day) for day in repaired_days],
+    )
+    if strictly_valid:
+        plan_repair_stats.clean += 1
+    else:
+        plan_repair_stats.repaired += 1
+    return plan
@@ -0,0 +1,69 @@
+import logging
+from datetime import datetime, timedelta
+
+from redis.asyncio import Redis
+
+from bot.config.settings import settings
+
+
+class PregenerationQueue:
+    """
+    Очередь предварительной генерации планов на следующую неделю.
+    Redis ZSET `pregen:queue`: элемент — users.id, score — момент, когда план пора строить
+    (через PREGENERATION_LEAD_HOURS после отправки последней тренировки недели).
+    Так генерация размазывается по неделе, а воскресной задаче остаются только отставшие.
+    """
+
+    KEY = "pregen:queue"
+
+    def __init__(self):
+        self.redis: Redis | None = None
+        self.scheduled = 0
+        self.generated = 0
+        self.skipped = 0
+        self.failed = 0
+
+    def setup(self, redis: Redis) -> None:
+        self.redis = redis
+
+    @property
+    def enabled(self) -> bool:
+        return settings.PREGENERATION_ENABLED and self.redis is not None
+
+    async def schedule(self, user_id: int, due_at: datetime | None = None) -> None:
+        """Ставит пользователя в очередь; повторная постановка не сдвигает уже назначенное время."""
+        if not self.enabled:
+            return
+        due_at = due_at or datetime.now() + timedelta(hours=settings.PREGENERATION_LEAD_HOURS)
+        try:
+            if await self.redis.zadd(self.KEY, {str(user_id): due_at.timestamp()}, nx=True):
+                self.scheduled += 1
+        except Exception as e:
+            logging.warning(f"Pregeneration queue Redis write failed: {e}")
+
+    async def pop_due(self, limit: int) -> list[int]:
+        """
+        Забирает из очереди до `limit` пользователей, чье время подошло.
+        Элемент достается тому процессу, чей ZREM его удалил, поэтому дублей нет.
+        """
+        if not self.enabled:
+            return []
+        members = await self.redis.zrangebyscore(
+            self.KEY, "-inf", datetime.now().timestamp(), start=0, num=limit
+        )
+        claimed = []
+        for member in members:
+            if await self.redis.zrem(self.KEY, member):
+                claimed.append(int(member))
+        return claimed
+
+    async def size(self) -> int:
+        if self.redis is None:
+            return 0
+        try:
+            return await self.redis.zcard(self.KEY)
+        except Exception:
+            return 0
+
+
+pregeneration_queue = PregenerationQueue()
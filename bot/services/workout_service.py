@@ -1,10 +1,15 @@
 import asyncio
 import logging
+from dataclasses import dataclass, field
 from datetime import date, datetime, timedelta, time
+from time import monotonic
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable
 
 from aiogram import Bot
+from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
+from bot.config.settings import settings
 from bot.requests import user_requests, exercise_requests, schedule_requests, workout_requests
 from bot.requests.workout_requests import (
     save_weekly_plan,
@@ -17,10 +22,18 @@ from bot.requests.workout_requests import (
     has_planned_workouts_for_upcoming_week,
 )
 from bot.services.llm_service import llm_service
+from bot.services.exercise_catalog import exercise_catalog
+from bot.services.pregeneration import pregeneration_queue
+from bot.services.periodization import build_local_plan, can_build_locally, periodization_stats
 from bot.schemas.workout import PlanSummary
-from bot.utils.workout_utils import calculate_effective_training_week
-from bot.services.subscription_service import subscription_service
-from bot.utils.bot_messages import safe_send_message, check_user_available
+from bot.utils.workout_utils import (
+    calculate_effective_training_week,
+    generation_week_start,
+    week_start_of,
+)
+from bot.utils.bot_messages import check_user_available, needs_reachability_probe
+from bot.utils.message_dispatcher import message_dispatcher, PRIORITY_LOW, PRIORITY_SERVICE
+from database.models import User
 from zoneinfo import ZoneInfo
 
 
@@ -30,11 +43,17 @@ class WorkoutService:
         self.session_pool = session_pool
 
     async def create_and_schedule_weekly_workout(
-        self, session: AsyncSession, telegram_id: int
+        self,
+        session: AsyncSession,
+        telegram_id: int,
+        use_cache: bool = True,
+        next_week_only: bool = False,
     ) -> tuple[PlanSummary, datetime | None] | None:
         """
         Главный метод: генерирует, сохраняет и планирует недельный план тренировок.
         Возвращает (plan_summary, datetime следующей тренировки) или None.
+        `use_cache=False` заставляет заново обратиться к LLM, минуя кэш планов.
+        `next_week_only=True` (предварительная генерация) ставит тренировки только на следующую неделю.
         """
         user = await user_requests.get_user_by_telegram_id(session, telegram_id)
         if not user:
@@ -71,7 +90,9 @@ class WorkoutService:
             if not force_new_cycle and last_week_workouts:
                 # Сортируем, чтобы взять последнюю тренировку недели
                 last_week_workouts.sort(key=lambda w: w.planned_date, reverse=True)
-                first_exercise = await exercise_requests.get_first_exercise_from_workout(session, last_week_workouts[0].id)
+                await exercise_catalog.ensure_loaded(session)
+                first_exercise_id = await exercise_requests.get_first_exercise_id_from_workout(session, last_week_workouts[0].id)
+                first_exercise = exercise_catalog.get(first_exercise_id) if first_exercise_id else None
                 if first_exercise and first_exercise.equipment_type != user.equipment_type:
                     force_new_cycle = True
                     reason_message = "вы сменили оборудование"
@@ -107,9 +128,8 @@ class WorkoutService:
             try:
                 if effective_week == 1:
                     # Начало нового цикла: ищем новые упражнения
-                    all_exercises = await exercise_requests.get_exercises_by_equipment(
-                        session, user.equipment_type
-                    )
+                    await exercise_catalog.ensure_loaded(session)
+                    all_exercises = exercise_catalog.by_equipment(user.equipment_type)
                     banned_exercises = await get_exercises_from_last_workouts(
                         session, user.id, user.workout_frequency or 1
                     )
@@ -135,11 +155,23 @@ class WorkoutService:
                         logging.warning(f"User {user.id} changed equipment from {fixed_exercises[0].equipment_type.value} to {user.equipment_type.value}. Forcing regeneration.")
 
                     if settings_are_valid:
-                         plan = await llm_service.generate_workout_plan(
-                            user=user,
-                            effective_training_week=effective_week,
-                            fixed_exercises=fixed_exercises
-                        )
+                        if settings.LOCAL_PERIODIZATION_ENABLED and can_build_locally(user, effective_week):
+                            # Периодизация по таблицам — без обращения к LLM
+                            last_workouts = await workout_requests.get_last_workouts_with_exercises(
+                                session, user.id, user.workout_frequency or 1
+                            )
+                            plan = build_local_plan(user, effective_week, last_workouts)
+                            if plan:
+                                periodization_stats.local_plans += 1
+                            else:
+                                periodization_stats.llm_fallbacks += 1
+                        if not plan:
+                            plan = await llm_service.generate_workout_plan(
+                                user=user,
+                                effective_training_week=effective_week,
+                                fixed_exercises=fixed_exercises,
+                                use_cache=use_cache,
+                            )
                     else:
                         # Запускаем логику первой недели, так как настройки изменились
                         logging.info(f"Regenerating plan for user {user.id} due to settings change.")
@@ -147,16 +179,15 @@ class WorkoutService:
                         await user_requests.increment_user_training_week(session, user.id, week_to_set=1)
                         effective_week = 1 # Устанавливаем для LLM первую неделю
                         
-                        all_exercises = await exercise_requests.get_exercises_by_equipment(
-                            session, user.equipment_type
-                        )
+                        await exercise_catalog.ensure_loaded(session)
+                        all_exercises = exercise_catalog.by_equipment(user.equipment_type)
                         plan = await llm_service.generate_workout_plan(
                             user=user,
                             effective_training_week=effective_week,
                             available_exercises=all_exercises
                         )
 
-                logging.info(f"LLM generated plan for user {user.telegram_id}: {plan.model_dump_json(indent=2)}")
+                logging.info(f"Generated plan for user {user.telegram_id}: {plan.model_dump_json(indent=2)}")
                 break  # Успешная генерация, выходим из цикла
             except Exception as e:
                 logging.error(f"LLM workout generation failed on attempt {attempt + 1}: {e}")
@@ -168,7 +199,9 @@ class WorkoutService:
             return None
 
         # 3. Определение дат тренировок
-        workout_dates = await self._calculate_workout_datetimes(session, user.id, len(plan.workout_plan))
+        workout_dates = await self._calculate_workout_datetimes(
+            session, user.id, len(plan.workout_plan), next_week_only=next_week_only
+        )
         if not workout_dates:
             return None # Если не удалось рассчитать даты, выходим
 
@@ -181,50 +214,37 @@ class WorkoutService:
             plan.workout_plan = plan.workout_plan[:len(workout_dates)]
 
         # 4. Сохранение плана и дат в БД
-        workouts = await save_weekly_plan(session, user.id, plan, workout_dates)
+        workouts, unresolved_names = await save_weekly_plan(
+            session, user.id, plan, workout_dates,
+            exercise_ids_by_name=exercise_catalog.ids_by_name() if exercise_catalog.is_loaded else None,
+        )
+        if unresolved_names:
+            logging.warning(
+                f"LLM returned exercises missing from the catalog for user {user.telegram_id}: "
+                f"{', '.join(unresolved_names)}"
+            )
         if not workouts:
             return None # Если не удалось сохранить, выходим
 
-        # 5. Инкремент недели пользователя
-        await user_requests.increment_user_training_week(session, user.id, week_to_set=next_week)
+        # 5. Инкремент недели пользователя и водяного знака генерации
+        await user_requests.increment_user_training_week(
+            session, user.id, week_to_set=next_week,
+            generated_week=week_start_of(max(w.planned_date for w in workouts)),
+        )
         
-        # 6. Планирование уведомлений
-        from bot.scheduler import scheduler, send_workout_notification
-        logging.info(f"Начинаю планирование {len(workouts)} тренировок для пользователя {user.telegram_id}")
-        for workout in workouts:
-            run_datetime = workout.planned_date
-            # Не планируем задачи в прошлом
-            if run_datetime > datetime.now():
-                try:
-                    scheduler.add_job(
-                        send_workout_notification,
-                        trigger="date",
-                        run_date=run_datetime,
-                        args=[self.bot, user.telegram_id, workout.id, self.session_pool],
-                        id=f"workout_{workout.id}",
-                        replace_existing=True,
-                    )
-                    logging.info(
-                        f"Успешно запланирована тренировка #{workout.id} на {run_datetime} "
-                        f"для пользователя {user.telegram_id}"
-                    )
-                except Exception as e:
-                    logging.error(
-                        f"Ошибка планирования тренировки #{workout.id} для пользователя {user.telegram_id}: {e}",
-                        exc_info=True
-                    )
-            else:
-                logging.warning(
-                    f"Пропуск планирования тренировки #{workout.id} для пользователя {user.telegram_id}, "
-                    f"так как ее время ({run_datetime}) уже в прошлом."
-                )
+        # 6. Уведомления отдельно планировать не нужно: сохраненные тренировки
+        # попадут в очередь уведомлений (process_due_notifications) в свое время.
+        logging.info(
+            f"Сохранено {len(workouts)} тренировок для пользователя {user.telegram_id}, "
+            f"уведомления будут отправлены из очереди."
+        )
 
         # 7. Возвращаем summary и дату ближайшей тренировки
         next_workout_date = workouts[0].planned_date if workouts else None
         return plan.plan_summary, next_workout_date
 
     async def _calculate_workout_datetimes(
-        self, session: AsyncSession, user_id: int, num_workouts: int
+        self, session: AsyncSession, user_id: int, num_workouts: int, next_week_only: bool = False
     ) -> list[datetime]:
         """
         Вычисляет даты тренировок со следующей логикой:
@@ -232,9 +252,14 @@ class WorkoutService:
            с недели, следующей за последней запланированной тренировкой.
         2. Если будущих тренировок нет (первая генерация), система пытается запланировать на текущую неделю.
            Если не получается, планирует на следующую.
+        При `next_week_only` текущая неделя считается уже прошедшей.
         """
         latest_future_date = await get_latest_future_planned_date(session, user_id)
         now = datetime.now()
+        if next_week_only:
+            # Отсчитываем от последней секунды текущего воскресенья
+            next_monday = now.date() + timedelta(days=7 - now.weekday())
+            now = datetime.combine(next_monday, time.min) - timedelta(seconds=1)
 
         # --- ЛОГИКА РЕГЕНЕРАЦИИ (когда есть будущий план) ---
         if latest_future_date:
@@ -311,176 +336,328 @@ class WorkoutService:
             return workout_datetimes[:num_workouts]
 
 
-async def scheduled_weekly_workout_generation(
-    bot: Bot, session_pool: async_sessionmaker, workout_service: WorkoutService
-):
-    """
-    Запускает еженедельную генерацию тренировок для всех пользователей, которым нужны тренировки.
-    """
-    logging.info("Starting scheduled weekly workout generation for all users.")
-    async with session_pool() as session:
-        users = await user_requests.get_users_for_workout_generation(session)
+@dataclass
+class GenerationRunSummary:
+    """Итоги пакетного запуска генерации (еженедельного или догоняющего)."""
+    generated: int = 0
+    skipped: int = 0
+    failed: int = 0
+    durations: list[float] = field(default_factory=list)
+
+    def percentile(self, p: float) -> float:
+        """Возвращает p-й перцентиль длительности обработки пользователя (в секундах)."""
+        if not self.durations:
+            return 0.0
+        ordered = sorted(self.durations)
+        index = min(len(ordered) - 1, max(0, round(p / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def log(self, label: str, total_seconds: float) -> None:
         logging.info(
-            f"Found {len(users)} users for weekly generation."
+            f"{label} finished in {total_seconds:.1f}s: "
+            f"generated={self.generated}, skipped={self.skipped}, failed={self.failed}, "
+            f"p50={self.percentile(50):.1f}s, p90={self.percentile(90):.1f}s, "
+            f"p99={self.percentile(99):.1f}s, max={self.percentile(100):.1f}s"
         )
 
-        for user in users:
-            # Открываем новую сессию для каждого пользователя для изоляции
-            async with session_pool() as user_session:
-                try:
-                    # ПРОВЕРКА: Если у пользователя уже есть план на неделю, пропускаем
-                    if await workout_requests.has_planned_workouts_for_upcoming_week(
-                        user_session, user.id
-                    ):
-                        logging.info(
-                            f"User {user.telegram_id} already has a planned workout for the upcoming week. Skipping generation."
-                        )
-                        continue
 
-                    # Проверяем, не заблокировал ли пользователь бота (ПЕРЕД генерацией)
-                    if not await check_user_available(bot, user_session, user.telegram_id):
-                        logging.info(
-                            f"User {user.telegram_id} blocked the bot. Skipping workout generation."
-                        )
-                        continue
+async def iter_generation_candidates(
+    session_pool: async_sessionmaker,
+    page_size: int | None = None,
+    **filters,
+) -> AsyncIterator[User]:
+    """
+    Отдает кандидатов на генерацию постранично (keyset-пагинация по users.id).
+    Каждая страница читается отдельной короткой сессией, поэтому соединение
+    не удерживается на все время многочасовой генерации.
+    """
+    page_size = page_size or settings.GENERATION_PAGE_SIZE
+    after_user_id = 0
+    while True:
+        async with session_pool() as session:
+            page = await user_requests.get_users_for_workout_generation(
+                session, after_user_id=after_user_id, limit=page_size, **filters
+            )
+        for user in page:
+            yield user
+        if len(page) < page_size:
+            return
+        after_user_id = page[-1].id
 
-                    can_receive = await subscription_service.can_receive_workout(
-                        user_session, user
-                    )
-                    if not can_receive:
-                        logging.info(
-                            f"User {user.telegram_id} cannot receive workout due to subscription status. Skipping."
-                        )
-                        continue
 
-                    logging.info(
-                        f"Generating weekly workout for user_id: {user.id} (telegram_id: {user.telegram_id})"
-                    )
+async def run_generation_pool(
+    users: Iterable | AsyncIterable,
+    process_user: Callable[[object], Awaitable[str]],
+    label: str,
+    concurrency: int | None = None,
+    user_timeout: float | None = None,
+) -> GenerationRunSummary:
+    """
+    Обрабатывает пользователей пулом воркеров с ограниченной параллельностью.
+    Пользователи берутся из очереди в исходном порядке, каждый обрабатывается
+    целиком одним воркером. `users` может быть списком или асинхронным итератором
+    (тогда следующие страницы подгружаются по мере освобождения воркеров).
+    `process_user` возвращает "generated", "skipped" или "failed".
+    """
+    concurrency = max(1, concurrency or settings.WEEKLY_GENERATION_CONCURRENCY)
+    user_timeout = user_timeout or settings.WEEKLY_GENERATION_USER_TIMEOUT
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    summary = GenerationRunSummary()
+    run_started = monotonic()
+
+    async def producer():
+        try:
+            if isinstance(users, AsyncIterable):
+                async for user in users:
+                    await queue.put(user)
+            else:
+                for user in users:
+                    await queue.put(user)
+        finally:
+            # По одному маркеру остановки на каждого воркера
+            for _ in range(concurrency):
+                await queue.put(None)
+
+    async def worker():
+        while True:
+            user = await queue.get()
+            if user is None:
+                return
+            started = monotonic()
+            try:
+                outcome = await asyncio.wait_for(process_user(user), timeout=user_timeout)
+            except asyncio.TimeoutError:
+                logging.error(f"{label}: user {user.telegram_id} timed out after {user_timeout}s.")
+                outcome = "failed"
+            except Exception as e:
+                logging.error(f"{label}: error for user {user.telegram_id}: {e}", exc_info=True)
+                outcome = "failed"
+
+            if outcome == "generated":
+                summary.generated += 1
+                summary.durations.append(monotonic() - started)
+            elif outcome == "skipped":
+                summary.skipped += 1
+            else:
+                summary.failed += 1
+                summary.durations.append(monotonic() - started)
+
+    await asyncio.gather(producer(), *(worker() for _ in range(concurrency)))
+    summary.log(label, monotonic() - run_started)
+    return summary
+
+
+async def _generate_and_notify(
+    bot: Bot,
+    session_pool: async_sessionmaker,
+    workout_service: WorkoutService,
+    user: User,
+    next_week_only: bool = False,
+    notice: str | None = None,
+) -> str:
+    """
+    Генерирует план одному кандидату и сообщает об этом (`notice` заменяет стандартный текст).
+    Возвращает "generated", "skipped" или "failed".
+    """
+    # Открываем новую сессию для каждого пользователя для изоляции
+    async with session_pool() as user_session:
+        # Заблокировавших бота отсекает SQL-запрос; в Telegram проверяем только
+        # тех, о чьей доступности давно нет свежих данных
+        if needs_reachability_probe(user) and not await check_user_available(
+            bot, user_session, user.telegram_id
+        ):
+            logging.info(
+                f"User {user.telegram_id} blocked the bot. Skipping workout generation."
+            )
+            return "skipped"
 
-                    result = await workout_service.create_and_schedule_weekly_workout(
-                        user_session, user.telegram_id
-                    )
+        logging.info(
+            f"Generating weekly workout for user_id: {user.id} (telegram_id: {user.telegram_id})"
+        )
 
-                    if result:
-                        # Получаем самую ближайшую тренировку из БД, а не из результата
-                        next_workout = await workout_requests.get_next_workout_for_user(
-                            user_session, user.id
-                        )
-                        next_date_str = (
-                            next_workout.planned_date.strftime("%d.%m.%Y")
-                            if next_workout
-                            else "на следующей неделе"
-                        )
-                        await safe_send_message(
-                            bot,
-                            user_session,
-                            user.telegram_id,
-                            f"✅ Ваша новая тренировка на неделю сгенерирована!\n\n"
-                            f"Ближайшая тренировка ждет вас {next_date_str}.",
-                        )
-                        logging.info(
-                            f"Successfully generated and notified user {user.telegram_id}."
-                        )
-                    else:
-                        logging.warning(
-                            f"Failed to generate workout for user {user.telegram_id}, result was None."
-                        )
+        result = await workout_service.create_and_schedule_weekly_workout(
+            user_session, user.telegram_id, next_week_only=next_week_only
+        )
 
-                except Exception as e:
-                    logging.error(
-                        f"Error generating weekly workout for user {user.telegram_id}: {e}",
-                        exc_info=True,
-                    )
+        if not result:
+            logging.warning(
+                f"Failed to generate workout for user {user.telegram_id}, result was None."
+            )
+            return "failed"
 
-    logging.info("Finished scheduled weekly workout generation.")
+        _, next_workout_date = result
+        next_date_str = (
+            next_workout_date.strftime("%d.%m.%Y")
+            if next_workout_date
+            else "на следующей неделе"
+        )
+        message_dispatcher.enqueue(
+            user.telegram_id,
+            notice or (
+                f"✅ Ваша новая тренировка на неделю сгенерирована!\n\n"
+                f"Ближайшая тренировка ждет вас {next_date_str}."
+            ),
+            priority=PRIORITY_LOW if next_week_only else PRIORITY_SERVICE,
+        )
+        logging.info(
+            f"Successfully generated and notified user {user.telegram_id}."
+        )
+        return "generated"
 
 
-async def check_and_generate_missed_workouts(
+async def scheduled_weekly_workout_generation(
     bot: Bot, session_pool: async_sessionmaker, workout_service: WorkoutService
 ):
     """
-    Проверяет пользователей, которые могли пропустить еженедельную генерацию, и запускает ее.
+    Запускает еженедельную генерацию тренировок для всех пользователей, которым нужны тренировки.
+    Кандидаты (подписка, отсутствие плана на неделю, доступность) отбираются одним
+    SQL-запросом на страницу; пользователи обрабатываются пулом воркеров
+    (WEEKLY_GENERATION_CONCURRENCY), каждый — в собственной сессии и с собственным таймаутом.
+    Большинство планов к этому моменту уже построено предварительной генерацией
+    (scheduled_pregeneration), поэтому здесь обрабатываются только отставшие.
     """
-    logging.info("Checking for users with missed weekly workouts...")
-    async with session_pool() as session:
-        users = await user_requests.get_users_for_workout_generation(session)
-        # Фильтруем только пользователя с ID=3
-        if not users:
-            logging.info(
-                "No users found for workout generation. Skipping missed workout check."
-            )
-            return
+    logging.info(
+        "Starting scheduled weekly workout generation for all users "
+        f"(concurrency={settings.WEEKLY_GENERATION_CONCURRENCY})."
+    )
 
-        now = datetime.now()
-        last_sunday = now - timedelta(days=(now.weekday() + 1) % 7)
-        last_sunday_22_00_utc = datetime(
-            last_sunday.year,
-            last_sunday.month,
-            last_sunday.day,
-            22,
-            0,
-            0,
-            tzinfo=ZoneInfo("Europe/Moscow"),
-        ).astimezone(tz=None)
-
-        logging.info(f"Checking against last generation time: {last_sunday_22_00_utc}")
+    async def process_user(user) -> str:
+        with llm_service.background():
+            return await _generate_and_notify(bot, session_pool, workout_service, user)
+
+    await run_generation_pool(
+        iter_generation_candidates(session_pool, without_planned_workouts=True),
+        process_user,
+        label="Weekly workout generation",
+    )
+
+
+async def scheduled_pregeneration(
+    bot: Bot, session_pool: async_sessionmaker, workout_service: WorkoutService
+):
+    """
+    Строит планы на следующую неделю для пользователей из очереди предварительной генерации.
+    Работает небольшим пулом (PREGENERATION_CONCURRENCY) и перед каждым пользователем
+    ждет, пока схлынут интерактивные запросы к LLM. Кандидаты проверяются тем же
+    запросом, что и в воскресной генерации, поэтому уже получившие план пропускаются.
+    Неудачные попытки не повторяются: таких пользователей подберет воскресная задача.
+    """
+    if not pregeneration_queue.enabled:
+        return
 
+    async def yield_to_interactive(users: list[User]) -> AsyncIterator[User]:
         for user in users:
-            async with session_pool() as user_session:
-                try:
-                    last_workout_date = await workout_requests.get_last_workout_date(
-                        user_session, user.id
-                    )
+            await llm_service.wait_for_interactive_idle(settings.PREGENERATION_MAX_INTERACTIVE_LLM)
+            yield user
 
-                    if (
-                        last_workout_date is None
-                        or last_workout_date.replace(tzinfo=None) < last_sunday_22_00_utc.replace(tzinfo=None)
-                    ):
-                        # Проверяем, не заблокировал ли пользователь бота (ПЕРЕД генерацией)
-                        if not await check_user_available(bot, user_session, user.telegram_id):
-                            logging.info(
-                                f"User {user.telegram_id} blocked the bot. Skipping missed workout generation."
-                            )
-                            continue
+    async def process_user(user) -> str:
+        with llm_service.background():
+            return await _generate_and_notify(
+                bot, session_pool, workout_service, user, next_week_only=True
+            )
 
-                        can_receive = await subscription_service.can_receive_workout(
-                            user_session, user
-                        )
-                        if not can_receive:
-                            logging.info(
-                                f"User {user.telegram_id} cannot receive workout due to subscription status. Skipping."
-                            )
-                            continue
+    batch_size = settings.PREGENERATION_BATCH_SIZE
+    while True:
+        user_ids = await pregeneration_queue.pop_due(batch_size)
+        if not user_ids:
+            return
+        async with session_pool() as session:
+            users = await user_requests.get_users_for_workout_generation(
+                session, limit=len(user_ids), without_planned_workouts=True, user_ids=user_ids
+            )
+        pregeneration_queue.skipped += len(user_ids) - len(users)
 
-                        logging.info(
-                            f"User {user.telegram_id} missed workout generation. Last one was at {last_workout_date}. Generating now."
-                        )
+        summary = await run_generation_pool(
+            yield_to_interactive(users),
+            process_user,
+            label="Workout pregeneration",
+            concurrency=settings.PREGENERATION_CONCURRENCY,
+        )
+        pregeneration_queue.generated += summary.generated
+        pregeneration_queue.skipped += summary.skipped
+        pregeneration_queue.failed += summary.failed
 
-                        result = (
-                            await workout_service.create_and_schedule_weekly_workout(
-                                user_session, user.telegram_id
-                            )
-                        )
-                        if result:
-                            await safe_send_message(
-                                bot,
-                                user_session,
-                                user.telegram_id,
-                                "ℹ️ Мы заметили, что ваша тренировка на этой неделе не была создана. "
-                                "Мы все исправили, новый план уже готов!",
-                            )
-                            logging.info(
-                                f"Successfully generated missed workout for user {user.telegram_id}."
-                            )
-                        else:
-                            logging.warning(
-                                f"Failed to generate missed workout for user {user.telegram_id}, result was None."
-                            )
+        if len(user_ids) < batch_size:
+            return
 
-                except Exception as e:
-                    logging.error(
-                        f"Error in missed workout check for user {user.telegram_id}: {e}",
-                        exc_info=True,
-                    )
+
+async def check_and_generate_missed_workouts(
+    bot: Bot,
+    session_pool: async_sessionmaker,
+    workout_service: WorkoutService,
+    redis: Redis | None = None,
+):
+    """
+    Догоняющая генерация для пользователей, пропустивших еженедельную генерацию.
+    Пропустившие — кандидаты без тренировок на целевой неделе, чей водяной знак
+    (users.last_generated_week) отстает от нее; они выбираются постранично одним
+    индексированным запросом и обрабатываются пулом воркеров (MISSED_GENERATION_CONCURRENCY).
+    После каждой страницы в Redis сохраняется users.id, до которого все пользователи
+    получили план или пропущены намеренно, поэтому рестарт продолжает генерацию с этого
+    места, а пользователи с ошибкой генерации будут обработаны снова.
+    """
+    week = generation_week_start(datetime.now(ZoneInfo("Europe/Moscow")).replace(tzinfo=None))
+    checkpoint_key = f"catchup:{week.isoformat()}"
+    after_user_id = 0
+    if redis is not None:
+        try:
+            after_user_id = int(await redis.get(checkpoint_key) or 0)
+        except Exception as e:
+            logging.warning(f"Failed to read missed generation checkpoint: {e}")
+    logging.info(
+        f"Checking for users with missed weekly workouts (week of {week}, after user {after_user_id})..."
+    )
+
+    outcomes: dict[int, str] = {}
+
+    async def process_user(user) -> str:
+        with llm_service.background():
+            outcome = await _generate_and_notify(
+                bot, session_pool, workout_service, user,
+                notice="ℹ️ Мы заметили, что ваша тренировка на этой неделе не была создана. "
+                       "Мы все исправили, новый план уже готов!",
+            )
+        outcomes[user.id] = outcome
+        return outcome
+
+    checkpoint = saved_checkpoint = after_user_id
+    checkpoint_blocked = False
+    page_size = settings.GENERATION_PAGE_SIZE
+    while True:
+        async with session_pool() as session:
+            page = await user_requests.get_users_for_workout_generation(
+                session,
+                after_user_id=after_user_id,
+                limit=page_size,
+                without_planned_workouts=False,
+                generated_before=week,
+                without_workouts_in_week=week,
+            )
+        if not page:
+            break
+
+        await run_generation_pool(
+            page,
+            process_user,
+            label="Missed workout generation",
+            concurrency=settings.MISSED_GENERATION_CONCURRENCY,
+        )
+        after_user_id = page[-1].id
+        # Контрольная точка не заходит за первого пользователя с ошибкой (тайм-аут тоже ошибка)
+        if not checkpoint_blocked:
+            for user in page:
+                if outcomes.get(user.id, "failed") == "failed":
+                    checkpoint_blocked = True
+                    break
+                checkpoint = user.id
+        if redis is not None and checkpoint > saved_checkpoint:
+            try:
+                await redis.set(checkpoint_key, checkpoint, ex=timedelta(days=8))
+                saved_checkpoint = checkpoint
+            except Exception as e:
+                logging.warning(f"Failed to save missed generation checkpoint: {e}")
+        if len(page) < page_size:
+            break
 
     logging.info("Finished checking for missed workouts.")
@@ -0,0 +1,153 @@
+import asyncio
+import json
+import logging
+from dataclasses import dataclass
+
+from aiogram import Bot, Dispatcher
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+
+from bot.config.settings import settings
+
+STREAM_PREFIX = "updates:"
+CONSUMER_GROUP = "bot-workers"
+
+# Поля апдейта, в которых есть чат или пользователь (в порядке проверки)
+_CHAT_FIELDS = ("message", "edited_message", "channel_post", "my_chat_member", "chat_member", "chat_join_request")
+_USER_FIELDS = ("callback_query", "inline_query", "pre_checkout_query", "shipping_query", "poll_answer")
+
+
+def chat_id_of(update: dict) -> int | None:
+    """Чат (или пользователь), к которому относится апдейт Telegram."""
+    for field in _CHAT_FIELDS:
+        if field in update:
+            return update[field].get("chat", {}).get("id")
+    for field in _USER_FIELDS:
+        if field in update:
+            payload = update[field]
+            message = payload.get("message")
+            if message and message.get("chat"):
+                return message["chat"]["id"]
+            user = payload.get("from") or payload.get("user")
+            return user.get("id") if user else None
+    return None
+
+
+def partition_for(update: dict, partitions: int | None = None) -> int:
+    """Партиция по чату: все апдейты одного чата попадают в один поток и идут по порядку."""
+    partitions = partitions or settings.UPDATE_STREAM_PARTITIONS
+    key = chat_id_of(update)
+    if key is None:
+        key = update.get("update_id", 0)
+    return abs(key) % partitions
+
+
+async def publish_update(redis: Redis, update: dict) -> int:
+    """Кладет апдейт в поток своей партиции. Возвращает номер партиции."""
+    partition = partition_for(update)
+    await redis.xadd(
+        f"{STREAM_PREFIX}{partition}",
+        {"update": json.dumps(update, ensure_ascii=False)},
+        maxlen=settings.UPDATE_STREAM_MAXLEN,
+        approximate=True,
+    )
+    return partition
+
+
+@dataclass
+class UpdateStreamStats:
+    processed: int = 0
+    failed: int = 0
+    recovered: int = 0
+
+
+class UpdateStreamConsumer:
+    """
+    Воркер webhook-режима: читает свои партиции `updates:<p>` (p % worker_count == worker_index)
+    и передает апдейты в Dispatcher. Каждая партиция обрабатывается строго последовательно,
+    поэтому порядок апдейтов одного чата сохраняется, а разные партиции идут параллельно.
+    Имя консьюмера в группе — имя партиции, поэтому после рестарта (или смены числа воркеров)
+    новый владелец партиции сначала дообрабатывает ее неподтвержденные апдейты.
+    """
+
+    def __init__(self, redis: Redis, dp: Dispatcher, bot: Bot, worker_index: int, worker_count: int):
+        self.redis = redis
+        self.dp = dp
+        self.bot = bot
+        self.partitions = [
+            p for p in range(settings.UPDATE_STREAM_PARTITIONS) if p % max(worker_count, 1) == worker_index
+        ]
+        self.stats = UpdateStreamStats()
+
+    async def run(self) -> None:
+        logging.info(f"Update stream worker started for partitions {self.partitions}.")
+        await asyncio.gather(*(self._consume(partition) for partition in self.partitions))
+
+    async def _ensure_group(self, stream: str) -> None:
+        try:
+            await self.redis.xgroup_create(stream, CONSUMER_GROUP, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def _consume(self, partition: int) -> None:
+        stream = f"{STREAM_PREFIX}{partition}"
+        consumer = f"partition-{partition}"
+        await self._ensure_group(stream)
+
+        # Сначала — апдейты, взятые до рестарта, но не подтвержденные
+        last_id = "0"
+        # Обработанные апдейты, которые не удалось подтвердить: повторяем XACK перед чтением
+        unacked: list = []
+        while True:
+            if unacked and not await self._ack(stream, unacked):
+                await asyncio.sleep(1)
+                continue
+            unacked = []
+            try:
+                response = await self.redis.xreadgroup(
+                    CONSUMER_GROUP, consumer, {stream: last_id}, count=50,
+                    block=None if last_id == "0" else 5000,
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Update stream {stream} read failed: {e}")
+                await asyncio.sleep(1)
+                continue
+
+            entries = response[0][1] if response else []
+            if last_id == "0":
+                if not entries:
+                    last_id = ">"
+                    continue
+                self.stats.recovered += len(entries)
+
+            for entry_id, fields in entries:
+                await self._process(stream, entry_id, fields)
+                if not await self._ack(stream, [entry_id]):
+                    unacked.append(entry_id)
+
+    async def _process(self, stream: str, entry_id, fields: dict) -> None:
+        raw = fields.get(b"update") or fields.get("update")
+        try:
+            await self.dp.feed_raw_update(self.bot, json.loads(raw))
+            self.stats.processed += 1
+        except Exception as e:
+            # Апдейт, уронивший хэндлер, не должен блокировать партицию
+            self.stats.failed += 1
+            logging.error(f"Failed to process update {entry_id} from {stream}: {e}", exc_info=True)
+
+    async def _ack(self, stream: str, entry_ids: list) -> bool:
+        """
+        Подтверждает апдейты. Ошибка Redis не роняет воркер: апдейты остаются в pending
+        (после рестарта они будут перечитаны с id "0"), а подтверждение повторяется.
+        """
+        try:
+            await self.redis.xack(stream, CONSUMER_GROUP, *entry_ids)
+            return True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Failed to acknowledge {len(entry_ids)} updates in {stream}: {e}")
+            return False
@@ -2,11 +2,72 @@
 Утилиты для безопасной отправки сообщений ботом с обработкой ошибок.
 """
 import logging
+from datetime import datetime, timedelta
 from aiogram import Bot
 from aiogram.exceptions import TelegramForbiddenError
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
+from bot.config.settings import settings
 from bot.requests import user_requests, subscription_requests
+from database.models import User
+
+
+class DeliveryLog:
+    """
+    Чаты с успешной доставкой, которые еще не записаны в users.last_delivered_at.
+    Отправка только отмечает чат в памяти; в БД доставки пишутся пачкой из
+    диспетчера сообщений (MessageDispatcher.flush_delivered), без транзакции вызывающего.
+    """
+
+    def __init__(self):
+        self._pending: set[int] = set()
+
+    def record(self, chat_id: int) -> None:
+        self._pending.add(chat_id)
+
+    async def flush(self, session_pool: async_sessionmaker) -> None:
+        """Записывает накопленные доставки в БД одним запросом."""
+        if not self._pending:
+            return
+        telegram_ids, self._pending = list(self._pending), set()
+        try:
+            async with session_pool() as session:
+                await user_requests.mark_users_delivered(session, telegram_ids)
+        except Exception as e:
+            logging.error(f"Failed to record deliveries for {len(telegram_ids)} users: {e}", exc_info=True)
+
+
+delivery_log = DeliveryLog()
+
+
+async def mark_user_blocked(session: AsyncSession, chat_id: int) -> None:
+    """
+    Обрабатывает блокировку бота пользователем: запоминает blocked_at
+    и устанавливает статус подписки в trial_expired.
+    """
+    logging.warning(f"User {chat_id} blocked the bot. Setting subscription status to trial_expired.")
+    try:
+        await user_requests.set_user_blocked(session, chat_id, blocked=True)
+        user = await user_requests.get_user_by_telegram_id(session, chat_id)
+        if user:
+            subscription = await subscription_requests.get_subscription_by_user_id(session, user.id)
+            if subscription:
+                await subscription_requests.update_subscription_status(session, subscription.id, "trial_expired")
+                logging.info(f"Subscription status updated to trial_expired for user {user.id}")
+    except Exception as db_error:
+        logging.error(f"Failed to update subscription status for user {chat_id}: {db_error}", exc_info=True)
+
+
+def needs_reachability_probe(user: User, now: datetime | None = None) -> bool:
+    """
+    Нужно ли проверять доступность пользователя через Telegram.
+    Проверка нужна, только если последняя известная доставка (или блокировка) старше
+    REACHABILITY_STALE_HOURS — в остальных случаях достаточно состояния из БД.
+    """
+    stale_before = (now or datetime.now()) - timedelta(hours=settings.REACHABILITY_STALE_HOURS)
+    if user.blocked_at is not None:
+        return user.blocked_at < stale_before
+    return user.last_delivered_at is None or user.last_delivered_at < stale_before
 
 
 async def check_user_available(
@@ -25,18 +86,10 @@ async def check_user_available(
     try:
         # Используем send_chat_action для легкой проверки - это не отправляет сообщение пользователю
         await bot.send_chat_action(chat_id=chat_id, action="typing")
+        delivery_log.record(chat_id)
         return True
     except TelegramForbiddenError:
-        logging.warning(f"User {chat_id} blocked the bot. Setting subscription status to trial_expired.")
-        try:
-            user = await user_requests.get_user_by_telegram_id(session, chat_id)
-            if user:
-                subscription = await subscription_requests.get_subscription_by_user_id(session, user.id)
-                if subscription:
-                    await subscription_requests.update_subscription_status(session, subscription.id, "trial_expired")
-                    logging.info(f"Subscription status updated to trial_expired for user {user.id}")
-        except Exception as db_error:
-            logging.error(f"Failed to update subscription status for user {chat_id}: {db_error}", exc_info=True)
+        await mark_user_blocked(session, chat_id)
         return False
     except Exception as e:
         logging.error(f"Error when checking user availability for {chat_id}: {e}", exc_info=True)
@@ -57,17 +110,8 @@ async def safe_send_message(
     """
     try:
         await bot.send_message(chat_id=chat_id, text=text, **kwargs)
+        delivery_log.record(chat_id)
     except TelegramForbiddenError:
-        logging.warning(f"User {chat_id} blocked the bot. Setting subscription status to trial_expired.")
-        try:
-            user = await user_requests.get_user_by_telegram_id(session, chat_id)
-            if user:
-                subscription = await subscription_requests.get_subscription_by_user_id(session, user.id)
-                if subscription:
-                    await subscription_requests.update_subscription_status(session, subscription.id, "trial_expired")
-                    logging.info(f"Subscription status updated to trial_expired for user {user.id}")
-        except Exception as db_error:
-            logging.error(f"Failed to update subscription status for user {chat_id}: {db_error}", exc_info=True)
+        await mark_user_blocked(session, chat_id)
     except Exception as e:
         logging.error(f"Error when sending message to {chat_id}: {e}", exc_info=True)
-
@@ -0,0 +1,63 @@
+import re
+
+# Теги, которые Telegram поддерживает в parse_mode="HTML"
+TELEGRAM_HTML_TAGS = {"b", "strong", "i", "em", "u", "ins", "s", "strike", "del", "code", "pre", "a", "tg-spoiler", "blockquote"}
+
+_TAG_RE = re.compile(r"<(/?)([a-zA-Z][\w-]*)[^<>]*>")
+
+
+def close_open_html_tags(text: str) -> str:
+    """
+    Делает валидным частичный HTML (например, недописанный ответ LLM при стриминге):
+    отрезает оборванный в конце тег или HTML-сущность и закрывает незакрытые теги.
+    """
+    # Оборванный тег в конце: "<b", "</i", "<a href="
+    last_open = text.rfind("<")
+    if last_open > text.rfind(">"):
+        text = text[:last_open]
+    # Оборванная сущность в конце: "&amp" без ";"
+    last_amp = text.rfind("&")
+    if last_amp != -1 and ";" not in text[last_amp:] and len(text) - last_amp <= 10:
+        text = text[:last_amp]
+
+    return text + "".join(f"</{tag}>" for tag in reversed(_unclosed_tags(text)))
+
+
+def _unclosed_tags(text: str) -> list[str]:
+    """Возвращает стек незакрытых поддерживаемых тегов."""
+    stack: list[str] = []
+    for match in _TAG_RE.finditer(text):
+        closing, tag = match.group(1), match.group(2).lower()
+        if tag not in TELEGRAM_HTML_TAGS:
+            continue
+        if not closing:
+            stack.append(tag)
+        elif tag in stack:
+            # Закрываем до ближайшего открытого тега с тем же именем
+            while stack and stack.pop() != tag:
+                pass
+    return stack
+
+
+def split_html_message(text: str, limit: int = 4096) -> list[str]:
+    """
+    Делит длинный ответ на части не длиннее `limit` по границам абзацев/строк,
+    закрывая теги в конце каждой части.
+    """
+    parts = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit - 64)
+        if cut <= 0:
+            cut = limit - 64
+        # Не режем посреди тега
+        tag_start = text.rfind("<", 0, cut)
+        if tag_start > text.rfind(">", 0, cut):
+            cut = tag_start
+        head = close_open_html_tags(text[:cut])
+        parts.append(head)
+        # Переоткрываем в следующей части простые теги, оставшиеся открытыми (ссылки — нет)
+        reopen = "".join(f"<{tag}>" for tag in _unclosed_tags(text[:cut]) if tag != "a")
+        text = reopen + text[cut:].lstrip("\n")
+    if text:
+        parts.append(text)
+    return parts
@@ -0,0 +1,276 @@
+"""
+Диспетчер массовой отправки сообщений с учетом лимитов Telegram.
+"""
+import asyncio
+import itertools
+import logging
+from dataclasses import dataclass, field
+from time import monotonic
+from typing import Any
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from bot.config.settings import settings
+from bot.utils.bot_messages import delivery_log, mark_user_blocked
+
+# Приоритеты: чем меньше число, тем раньше отправка
+PRIORITY_WORKOUT = 0  # уведомления о тренировках
+PRIORITY_SERVICE = 1  # служебные сообщения (план сгенерирован и т.п.)
+PRIORITY_LOW = 2  # уведомления об истечении подписки, рассылки
+
+
+class TokenBucket:
+    """Простой token bucket: `rate` токенов в секунду, не больше `capacity` в запасе."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = monotonic()
+
+    def take(self) -> float:
+        """Забирает токен, если он есть (возвращает 0), иначе возвращает время ожидания."""
+        now = monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+@dataclass
+class DispatcherStats:
+    sent: int = 0
+    failed: int = 0
+    blocked: int = 0
+    retried: int = 0
+    total_latency: float = 0.0
+    max_latency: float = 0.0
+
+    @property
+    def avg_latency(self) -> float:
+        return self.total_latency / self.sent if self.sent else 0.0
+
+
+@dataclass
+class _SendTask:
+    chat_id: int
+    text: str
+    kwargs: dict[str, Any]
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=monotonic)
+    attempts: int = 0
+
+
+class MessageDispatcher:
+    """
+    Очередь исходящих сообщений с приоритетами и ограничением скорости
+    (глобальный и поканальный token bucket). Автоматически ждет при RetryAfter
+    и обрабатывает блокировку бота так же, как safe_send_message.
+
+    Глобальный лимит и пауза RetryAfter касаются всех сообщений, поэтому воркер ждет их,
+    не выпуская задачу. Откладывается (call_later) только сообщение, упершееся в лимит
+    своего чата, чтобы не задерживать остальные чаты.
+    """
+
+    def __init__(self):
+        self.bot: Bot | None = None
+        self.session_pool: async_sessionmaker | None = None
+        self.stats = DispatcherStats()
+        self._queue: asyncio.PriorityQueue | None = None
+        self._workers: list[asyncio.Task] = []
+        self._counter = itertools.count()
+        self._global_bucket = TokenBucket(settings.DISPATCHER_GLOBAL_RATE, settings.DISPATCHER_GLOBAL_RATE)
+        self._chat_buckets: dict[int, TokenBucket] = {}
+        self._paused_until = 0.0
+        # Отложенные сообщения: seq -> (таймер возврата в очередь, задача)
+        self._delayed: dict[int, tuple[asyncio.TimerHandle, _SendTask]] = {}
+        # Сообщения, которые воркеры держат в ожидании глобального лимита
+        self._waiting = 0
+        self._flusher: asyncio.Task | None = None
+        self._direct_sends: set[asyncio.Task] = set()
+
+    def setup(self, bot: Bot, session_pool: async_sessionmaker) -> None:
+        self.bot = bot
+        self.session_pool = session_pool
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self._workers)
+
+    @property
+    def queue_size(self) -> int:
+        """Количество сообщений, ожидающих отправки (включая отложенные из-за лимитов)."""
+        return (self._queue.qsize() if self._queue else 0) + len(self._delayed) + self._waiting
+
+    def start(self) -> None:
+        self._queue = asyncio.PriorityQueue()
+        self._workers = [
+            asyncio.create_task(self._worker()) for _ in range(settings.DISPATCHER_WORKERS)
+        ]
+        self._flusher = asyncio.create_task(self._flush_delivered_periodically())
+        logging.info(f"Message dispatcher started with {len(self._workers)} workers.")
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """
+        Дожидается отправки очереди (не дольше timeout) и останавливает воркеров.
+        Неотправленные сообщения (в очереди и отложенные) завершаются с результатом False.
+        """
+        if not self._workers:
+            return
+        deadline = monotonic() + timeout
+        while self.queue_size and monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if self.queue_size:
+            logging.warning(f"Message dispatcher stopped with {self.queue_size} unsent messages.")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+        unsent = []
+        for handle, task in self._delayed.values():
+            handle.cancel()
+            unsent.append(task)
+        self._delayed.clear()
+        while not self._queue.empty():
+            unsent.append(self._queue.get_nowait()[2])
+        for task in unsent:
+            if not task.future.done():
+                task.future.set_result(False)
+
+        self._flusher.cancel()
+        await asyncio.gather(self._flusher, return_exceptions=True)
+        self._flusher = None
+        await self.flush_delivered()
+
+    async def flush_delivered(self) -> None:
+        """Записывает успешные доставки (свои и safe_send_message) в БД одним запросом."""
+        await delivery_log.flush(self.session_pool)
+
+    async def _flush_delivered_periodically(self, interval: float = 30.0) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush_delivered()
+
+    def enqueue(self, chat_id: int, text: str, priority: int = PRIORITY_SERVICE, **kwargs) -> asyncio.Future:
+        """Ставит сообщение в очередь и сразу возвращает future с результатом (True — доставлено)."""
+        future = asyncio.get_running_loop().create_future()
+        task = _SendTask(chat_id=chat_id, text=text, kwargs=kwargs, future=future)
+        if not self.is_running:
+            # Диспетчер не запущен (например, в скриптах) — отправляем напрямую
+            send = asyncio.create_task(self._deliver(task))
+            self._direct_sends.add(send)
+            send.add_done_callback(self._direct_sends.discard)
+        else:
+            self._queue.put_nowait((priority, next(self._counter), task))
+        return future
+
+    async def send(self, chat_id: int, text: str, priority: int = PRIORITY_SERVICE, **kwargs) -> bool:
+        """Ставит сообщение в очередь и ждет, пока оно будет отправлено."""
+        return await self.enqueue(chat_id, text, priority, **kwargs)
+
+    async def _worker(self) -> None:
+        while True:
+            priority, seq, task = await self._queue.get()
+            try:
+                delay = self._chat_delay(task.chat_id)
+                if delay > 0:
+                    # Чат упирается в свой лимит — откладываем, не блокируя остальные чаты
+                    self._requeue_later(delay, priority, seq, task)
+                    continue
+                await self._wait_global_limit()
+                await self._deliver(task, priority, seq)
+            except asyncio.CancelledError:
+                if not task.future.done():
+                    task.future.set_result(False)
+                raise
+            except Exception as e:
+                logging.error(f"Dispatcher failed to process message for {task.chat_id}: {e}", exc_info=True)
+                if not task.future.done():
+                    task.future.set_result(False)
+            finally:
+                self._queue.task_done()
+
+    def _chat_delay(self, chat_id: int) -> float:
+        """Забирает токен чата (возвращает 0) или возвращает, сколько чату ждать."""
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(settings.DISPATCHER_CHAT_RATE, settings.DISPATCHER_CHAT_BURST)
+            self._chat_buckets[chat_id] = bucket
+            if len(self._chat_buckets) > 10000:
+                self._drop_idle_buckets(monotonic())
+        return bucket.take()
+
+    def _global_delay(self) -> float:
+        """Забирает глобальный токен (возвращает 0) или возвращает время ожидания паузы/лимита."""
+        now = monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        return self._global_bucket.take()
+
+    async def _wait_global_limit(self) -> None:
+        """Ждет глобальный токен, не отпуская задачу: очередь в это время не перебирается."""
+        delay = self._global_delay()
+        if delay <= 0:
+            return
+        self._waiting += 1
+        try:
+            while delay > 0:
+                await asyncio.sleep(delay)
+                delay = self._global_delay()
+        finally:
+            self._waiting -= 1
+
+    def _drop_idle_buckets(self, now: float) -> None:
+        for chat_id, bucket in list(self._chat_buckets.items()):
+            if now - bucket.updated_at > 60:
+                del self._chat_buckets[chat_id]
+
+    def _requeue_later(self, delay: float, priority: int, seq: int, task: _SendTask) -> None:
+        handle = asyncio.get_running_loop().call_later(delay, self._put_delayed, (priority, seq, task))
+        self._delayed[seq] = (handle, task)
+
+    def _put_delayed(self, item: tuple) -> None:
+        self._delayed.pop(item[1], None)
+        self._queue.put_nowait(item)
+
+    async def _deliver(self, task: _SendTask, priority: int = PRIORITY_SERVICE, seq: int = 0) -> None:
+        task.attempts += 1
+        try:
+            await self.bot.send_message(chat_id=task.chat_id, text=task.text, **task.kwargs)
+        except TelegramRetryAfter as e:
+            self.stats.retried += 1
+            if task.attempts <= settings.DISPATCHER_MAX_RETRIES and self.is_running:
+                # Telegram просит подождать — приостанавливаем всю отправку на это время
+                self._paused_until = max(self._paused_until, monotonic() + e.retry_after)
+                logging.warning(f"Telegram RetryAfter {e.retry_after}s for chat {task.chat_id}.")
+                self._requeue_later(e.retry_after, priority, seq, task)
+                return
+            self.stats.failed += 1
+            task.future.set_result(False)
+            return
+        except TelegramForbiddenError:
+            self.stats.blocked += 1
+            async with self.session_pool() as session:
+                await mark_user_blocked(session, task.chat_id)
+            task.future.set_result(False)
+            return
+        except Exception as e:
+            self.stats.failed += 1
+            logging.error(f"Error when sending message to {task.chat_id}: {e}", exc_info=True)
+            task.future.set_result(False)
+            return
+
+        latency = monotonic() - task.enqueued_at
+        self.stats.sent += 1
+        self.stats.total_latency += latency
+        self.stats.max_latency = max(self.stats.max_latency, latency)
+        delivery_log.record(task.chat_id)
+        task.future.set_result(True)
+
+
+message_dispatcher = MessageDispatcher()
@@ -1,3 +1,15 @@
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+# Даты тренировок (planned_date) хранятся как наивное московское время
+MOSCOW_TZ = ZoneInfo("Europe/Moscow")
+
+
+def moscow_now() -> datetime:
+    """Текущее московское время без tzinfo — в той же шкале, что и planned_date."""
+    return datetime.now(MOSCOW_TZ).replace(tzinfo=None)
+
+
 def calculate_effective_training_week(
     current_week: int, fitness_level: str
 ) -> int:
@@ -12,3 +24,18 @@ def calculate_effective_training_week(
         # Цикл 3 недели (1-3)
         return ((current_week - 1) % 3) + 1
 
+
+
+def generation_week_start(now: datetime) -> date:
+    """
+    Понедельник недели, на которую к моменту `now` уже должен быть построен план.
+    Еженедельная генерация запускается в воскресенье в 22:00, поэтому с этого
+    момента целевой становится следующая неделя.
+    """
+    shifted = now + timedelta(hours=2)
+    return shifted.date() - timedelta(days=shifted.weekday())
+
+
+def week_start_of(moment: datetime) -> date:
+    """Понедельник недели, в которую попадает `moment`."""
+    return moment.date() - timedelta(days=moment.weekday())
@@ -0,0 +1,99 @@
+"""
+Прием апдейтов Telegram в webhook-режиме.
+
+Легкий aiohttp-сервер без БД и Dispatcher: проверяет секрет, кладет апдейт в Redis stream
+своей партиции (по chat id) и сразу отвечает Telegram. Обрабатывают апдейты процессы
+бота в режиме BOT_MODE=webhook (см. bot/update_stream.py).
+
+Запуск:
+    python -m bot.webhook
+"""
+import asyncio
+import logging
+from time import monotonic
+
+from aiohttp import web
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from redis.asyncio import Redis
+
+from bot.config.settings import settings
+from bot.update_stream import publish_update
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def create_bot() -> Bot:
+    """Bot с учетом TELEGRAM_API_URL (настоящий Bot API или локальная заглушка)."""
+    session = None
+    if settings.TELEGRAM_API_URL:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(settings.TELEGRAM_API_URL))
+    return Bot(token=settings.BOT_TOKEN, session=session, default_parse_mode="HTML")
+
+
+async def handle_update(request: web.Request) -> web.Response:
+    if settings.WEBHOOK_SECRET and request.headers.get(SECRET_HEADER) != settings.WEBHOOK_SECRET:
+        return web.Response(status=401)
+    try:
+        update = await request.json()
+    except ValueError:
+        return web.Response(status=400)
+
+    started = monotonic()
+    try:
+        await publish_update(request.app["redis"], update)
+    except Exception as e:
+        # 5xx — Telegram повторит доставку апдейта позже
+        logger.error(f"Failed to enqueue update {update.get('update_id')}: {e}")
+        return web.Response(status=503)
+    request.app["stats"]["accepted"] += 1
+    request.app["stats"]["enqueue_seconds"] += monotonic() - started
+    return web.Response()
+
+
+async def handle_health(request: web.Request) -> web.Response:
+    stats = request.app["stats"]
+    accepted = stats["accepted"]
+    avg_ms = stats["enqueue_seconds"] / accepted * 1000 if accepted else 0.0
+    return web.json_response({"accepted": accepted, "avg_enqueue_ms": round(avg_ms, 2)})
+
+
+def create_app(redis: Redis) -> web.Application:
+    app = web.Application()
+    app["redis"] = redis
+    app["stats"] = {"accepted": 0, "enqueue_seconds": 0.0}
+    app.router.add_post(settings.WEBHOOK_PATH, handle_update)
+    app.router.add_get("/health", handle_health)
+    return app
+
+
+async def main():
+    redis = Redis.from_url(settings.REDIS_URL)
+    app = create_app(redis)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, settings.WEBHOOK_HOST, settings.WEBHOOK_PORT)
+    await site.start()
+    logger.info(f"Webhook ingress listening on {settings.WEBHOOK_HOST}:{settings.WEBHOOK_PORT}{settings.WEBHOOK_PATH}")
+
+    bot = create_bot()
+    try:
+        if settings.WEBHOOK_URL:
+            await bot.set_webhook(settings.WEBHOOK_URL, secret_token=settings.WEBHOOK_SECRET)
+            logger.info(f"Webhook registered: {settings.WEBHOOK_URL}")
+        await asyncio.Event().wait()
+    finally:
+        await bot.session.close()
+        await runner.cleanup()
+        await redis.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
+    )
+    asyncio.run(main())
@@ -9,7 +9,12 @@ from bot.config.settings import settings
 from database.models import Base
 
 
-engine = create_async_engine(settings.DATABASE_URL, echo=False)
+engine = create_async_engine(
+    settings.DATABASE_URL,
+    echo=False,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+)
 async_session_maker = async_sessionmaker(
     engine, 
     expire_on_commit=False, 
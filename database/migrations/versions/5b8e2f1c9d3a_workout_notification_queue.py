@@ -0,0 +1,44 @@
+"""workout notification queue
+
+Revision ID: 5b8e2f1c9d3a
+Revises: 18cf02b9f446
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b8e2f1c9d3a'
+down_revision: Union[str, None] = '18cf02b9f446'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('workouts', sa.Column('notification_sent_at', sa.DateTime(), nullable=True))
+    op.add_column('workouts', sa.Column('notification_claimed_until', sa.DateTime(), nullable=True))
+
+    # Уже прошедшие тренировки считаем уведомленными, чтобы очередь не разослала их заново.
+    # planned_date хранится в московском времени, поэтому и "сейчас" берем по Москве.
+    op.execute(
+        "UPDATE workouts SET notification_sent_at = planned_date "
+        "WHERE planned_date <= (now() AT TIME ZONE 'Europe/Moscow')"
+    )
+
+    # Частичный индекс под выборку очереди: только ожидающие уведомления тренировки
+    op.create_index(
+        'ix_workouts_notification_due',
+        'workouts',
+        ['planned_date'],
+        postgresql_where=sa.text("status = 'planned' AND notification_sent_at IS NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_workouts_notification_due', table_name='workouts')
+    op.drop_column('workouts', 'notification_claimed_until')
+    op.drop_column('workouts', 'notification_sent_at')
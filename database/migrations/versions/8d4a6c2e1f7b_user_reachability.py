@@ -0,0 +1,28 @@
+"""user reachability
+
+Revision ID: 8d4a6c2e1f7b
+Revises: 5b8e2f1c9d3a
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d4a6c2e1f7b'
+down_revision: Union[str, None] = '5b8e2f1c9d3a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('blocked_at', sa.DateTime(), nullable=True))
+    op.add_column('users', sa.Column('last_delivered_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'last_delivered_at')
+    op.drop_column('users', 'blocked_at')
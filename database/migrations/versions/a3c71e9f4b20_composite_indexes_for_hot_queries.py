@@ -0,0 +1,35 @@
+"""composite indexes for hot queries
+
+Revision ID: a3c71e9f4b20
+Revises: 8d4a6c2e1f7b
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c71e9f4b20'
+down_revision: Union[str, None] = '8d4a6c2e1f7b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_workouts_user_id_planned_date', 'workouts', ['user_id', 'planned_date'])
+    op.create_index(
+        'ix_workouts_user_id_status_planned_date', 'workouts', ['user_id', 'status', 'planned_date']
+    )
+    op.create_index('ix_user_messages_user_id_created_at', 'user_messages', ['user_id', 'created_at'])
+    op.create_index('ix_subscriptions_status_expires_at', 'subscriptions', ['status', 'expires_at'])
+    op.create_index('ix_workout_exercises_workout_id_order', 'workout_exercises', ['workout_id', 'order'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_workout_exercises_workout_id_order', table_name='workout_exercises')
+    op.drop_index('ix_subscriptions_status_expires_at', table_name='subscriptions')
+    op.drop_index('ix_user_messages_user_id_created_at', table_name='user_messages')
+    op.drop_index('ix_workouts_user_id_status_planned_date', table_name='workouts')
+    op.drop_index('ix_workouts_user_id_planned_date', table_name='workouts')
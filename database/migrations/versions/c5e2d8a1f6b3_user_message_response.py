@@ -0,0 +1,26 @@
+"""user message response
+
+Revision ID: c5e2d8a1f6b3
+Revises: a3c71e9f4b20
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e2d8a1f6b3'
+down_revision: Union[str, None] = 'a3c71e9f4b20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('user_messages', sa.Column('response', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('user_messages', 'response')
@@ -0,0 +1,41 @@
+"""user generation watermark
+
+Revision ID: e7b4c1d9a2f5
+Revises: c5e2d8a1f6b3
+Create Date: 2026-10-17 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b4c1d9a2f5'
+down_revision: Union[str, None] = 'c5e2d8a1f6b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('last_generated_week', sa.Date(), nullable=True))
+    # Водяной знак для существующих пользователей — неделя их последней запланированной тренировки
+    op.execute(
+        """
+        UPDATE users
+        SET last_generated_week = latest.week_start
+        FROM (
+            SELECT user_id, date_trunc('week', max(planned_date))::date AS week_start
+            FROM workouts
+            GROUP BY user_id
+        ) AS latest
+        WHERE latest.user_id = users.id
+        """
+    )
+    op.create_index('ix_users_last_generated_week', 'users', ['last_generated_week'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_users_last_generated_week', table_name='users')
+    op.drop_column('users', 'last_generated_week')
@@ -4,17 +4,20 @@ from sqlalchemy import (
     Integer,
     String,
     DateTime,
+    Date,
     ForeignKey,
     Enum,
     Float,
     Time,
     Text,
     func,
+    text,
     BigInteger,
+    Index,
 )
 from sqlalchemy.orm import declarative_base, Mapped, mapped_column, relationship
 from typing import List
-from datetime import datetime, time
+from datetime import date, datetime, time
 import enum
 
 
@@ -84,6 +87,9 @@ class SubscriptionStatusEnum(str, enum.Enum):
 
 class User(Base, TimestampMixin):
     __tablename__ = "users"
+    __table_args__ = (
+        Index("ix_users_last_generated_week", "last_generated_week"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     telegram_id: Mapped[int] = mapped_column(BigInteger, unique=True, nullable=False)
@@ -106,6 +112,11 @@ class User(Base, TimestampMixin):
         Enum(TrainerStyleEnum), nullable=True
     )
     score: Mapped[int] = mapped_column(Integer, default=0, nullable=False, server_default="0")
+    # Доступность пользователя по результатам реальных отправок и my_chat_member
+    blocked_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    last_delivered_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    # Понедельник последней недели, на которую успешно сгенерирован план (водяной знак генерации)
+    last_generated_week: Mapped[date | None] = mapped_column(Date, nullable=True)
 
     workouts: Mapped[List["Workout"]] = relationship(
         "Workout", back_populates="user", cascade="all, delete-orphan"
@@ -124,10 +135,15 @@ class User(Base, TimestampMixin):
 
 class UserMessage(Base, TimestampMixin):
     __tablename__ = "user_messages"
+    __table_args__ = (
+        Index("ix_user_messages_user_id_created_at", "user_id", "created_at"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     message: Mapped[str] = mapped_column(Text, nullable=False)
+    # Ответ AI-тренера на это сообщение (нужен для контекста диалога)
+    response: Mapped[str | None] = mapped_column(Text, nullable=True)
 
     user: Mapped["User"] = relationship("User", back_populates="messages")
 
@@ -153,6 +169,15 @@ class Exercise(Base):
 
 class Workout(Base, TimestampMixin):
     __tablename__ = "workouts"
+    __table_args__ = (
+        Index("ix_workouts_user_id_planned_date", "user_id", "planned_date"),
+        Index("ix_workouts_user_id_status_planned_date", "user_id", "status", "planned_date"),
+        Index(
+            "ix_workouts_notification_due",
+            "planned_date",
+            postgresql_where=text("status = 'planned' AND notification_sent_at IS NULL"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
@@ -164,6 +189,9 @@ class Workout(Base, TimestampMixin):
     )
     warm_up: Mapped[str | None] = mapped_column(String, nullable=True)
     cool_down: Mapped[str | None] = mapped_column(String, nullable=True)
+    # Очередь уведомлений: когда уведомление отправлено и до какого момента оно захвачено воркером
+    notification_sent_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    notification_claimed_until: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
 
     user: Mapped["User"] = relationship("User", back_populates="workouts")
     workout_exercises: Mapped[list["WorkoutExercise"]] = relationship(
@@ -173,6 +201,9 @@ class Workout(Base, TimestampMixin):
 
 class WorkoutExercise(Base):
     __tablename__ = "workout_exercises"
+    __table_args__ = (
+        Index("ix_workout_exercises_workout_id_order", "workout_id", "order"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     workout_id: Mapped[int] = mapped_column(ForeignKey("workouts.id", ondelete="CASCADE"), nullable=False)
@@ -202,6 +233,9 @@ class WorkoutSchedule(Base):
 
 class Subscription(Base):
     __tablename__ = "subscriptions"
+    __table_args__ = (
+        Index("ix_subscriptions_status_expires_at", "status", "expires_at"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), unique=True)
@@ -0,0 +1,83 @@
+"""
+Бенчмарк контекста диалога AI-тренера.
+
+Для синтетических историй разной длины сравнивает размер промпта (оценка токенов)
+и время сборки контекста: вся история целиком против бюджета токенов со сжатием
+старых реплик. БД, Redis и LLM не нужны.
+
+Пример:
+    python scripts/benchmark_coach_context.py --lengths 0 5 10 25 50 100 200
+"""
+import argparse
+import random
+import sys
+from pathlib import Path
+from time import perf_counter
+
+# Добавляем корневую папку проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from bot.config.settings import settings
+from bot.services.coach_context import build_history_messages, compact_context, estimate_tokens
+from bot.services.llm_service import AI_COACH_PROMPT
+
+QUESTIONS = [
+    "Сколько подходов делать на жим лежа, если цель — набор массы?",
+    "У меня болит колено после приседаний. Что делать? Продолжать тренировки?",
+    "Можно ли заменить становую тягу чем-то для дома, без штанги?",
+    "Сколько белка нужно в день при весе 80 кг?",
+    "Как правильно дышать во время подтягиваний?",
+]
+ANSWER = (
+    "<b>Коротко:</b> ориентируйтесь на 3–4 рабочих подхода по 8–12 повторений. "
+    "<i>Важно:</i> следите за техникой и не работайте до отказа в каждом подходе. "
+    "• Разминка 5–10 минут\n• Постепенное увеличение веса\n• Отдых 90–120 секунд между подходами. "
+) * 3
+
+
+def prompt_tokens(history: list[dict], question: str) -> int:
+    return estimate_tokens(AI_COACH_PROMPT) + estimate_tokens(question) + sum(
+        estimate_tokens(message["content"]) for message in history
+    )
+
+
+def run(length: int, repeats: int) -> tuple[int, int, float]:
+    rng = random.Random(length)
+    turns = [[rng.choice(QUESTIONS), ANSWER] for _ in range(length)]
+    question = rng.choice(QUESTIONS)
+
+    full = build_history_messages({"summary": [], "turns": turns})
+
+    # Как в рабочем режиме: каждая новая реплика добавляется и контекст сжимается
+    started = perf_counter()
+    for _ in range(repeats):
+        context = {"summary": [], "turns": []}
+        for turn in turns:
+            context["turns"].append(turn)
+            context = compact_context(
+                context,
+                token_budget=settings.COACH_CONTEXT_TOKEN_BUDGET,
+                summary_budget=settings.COACH_CONTEXT_SUMMARY_TOKENS,
+            )
+        budgeted = build_history_messages(context)
+    per_build_ms = (perf_counter() - started) / repeats / max(1, length) * 1000
+
+    return prompt_tokens(full, question), prompt_tokens(budgeted, question), per_build_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lengths", type=int, nargs="+", default=[0, 5, 10, 25, 50, 100, 200])
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"Бюджет истории: {settings.COACH_CONTEXT_TOKEN_BUDGET} токенов, summary: {settings.COACH_CONTEXT_SUMMARY_TOKENS}\n")
+    print(f"{'реплик':>8} | {'вся история, ток.':>18} | {'с бюджетом, ток.':>17} | {'сборка, мс':>10}")
+    print("-" * 64)
+    for length in args.lengths:
+        full, budgeted, build_ms = run(length, args.repeats)
+        print(f"{length:>8} | {full:>18} | {budgeted:>17} | {build_ms:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
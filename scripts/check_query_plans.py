@@ -0,0 +1,133 @@
+"""
+Проверка планов выполнения основных запросов из bot/requests.
+
+Запускает запросы на чтение против локальной (заполненной) базы, перехватывает
+сгенерированный SQL и выполняет для него EXPLAIN (FORMAT JSON). Если в плане есть
+Seq Scan по таблице, в которой не меньше --min-rows строк, скрипт завершается с кодом 1.
+
+Пример:
+    python scripts/check_query_plans.py --min-rows 1000
+"""
+import argparse
+import asyncio
+import json
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Добавляем корневую папку проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import event, select, text
+
+from database.connection import engine, async_session_maker
+from database.models import User, Workout
+from bot.requests import (
+    message_requests,
+    subscription_requests,
+    user_requests,
+    workout_requests,
+)
+from bot.utils.workout_utils import generation_week_start
+
+
+def build_checks(user_id: int, workout_id: int) -> dict:
+    """Запросы для проверки: название -> функция, принимающая сессию."""
+    now = datetime.now()
+    return {
+        "get_next_workout_for_user": lambda s: workout_requests.get_next_workout_for_user(s, user_id),
+        "get_latest_planned_date": lambda s: workout_requests.get_latest_planned_date(s, user_id),
+        "get_last_workout_date": lambda s: workout_requests.get_last_workout_date(s, user_id),
+        "get_latest_future_planned_date": lambda s: workout_requests.get_latest_future_planned_date(s, user_id),
+        "has_planned_workouts_for_upcoming_week": lambda s: workout_requests.has_planned_workouts_for_upcoming_week(s, user_id),
+        "get_workouts_for_period": lambda s: workout_requests.get_workouts_for_period(
+            s, user_id, (now - timedelta(days=7)).date(), now.date()
+        ),
+        "get_latest_workout_for_user": lambda s: workout_requests.get_latest_workout_for_user(s, user_id),
+        "get_workout_with_exercises": lambda s: workout_requests.get_workout_with_exercises(s, workout_id),
+        "get_exercises_from_last_workouts": lambda s: workout_requests.get_exercises_from_last_workouts(s, user_id, 3),
+        "count_user_messages": lambda s: message_requests.count_user_messages(s, user_id, now - timedelta(days=30)),
+        "get_subscription_by_user_id": lambda s: subscription_requests.get_subscription_by_user_id(s, user_id),
+        "get_users_for_workout_generation": lambda s: user_requests.get_users_for_workout_generation(s),
+        "get_users_for_workout_generation (missed)": lambda s: user_requests.get_users_for_workout_generation(
+            s, without_planned_workouts=False, generated_before=generation_week_start(now)
+        ),
+    }
+
+
+def find_seq_scans(plan: dict) -> list[str]:
+    """Возвращает имена таблиц, которые читаются последовательным сканированием."""
+    tables = []
+    if plan.get("Node Type") == "Seq Scan":
+        tables.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        tables.extend(find_seq_scans(child))
+    return tables
+
+
+async def main(min_rows: int) -> int:
+    captured: list[tuple[str, object]] = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+
+    async with async_session_maker() as session:
+        user_id = (await session.execute(select(User.id).limit(1))).scalar()
+        workout_id = (await session.execute(select(Workout.id).limit(1))).scalar()
+        if user_id is None or workout_id is None:
+            print("❌ База пуста: заполните ее тестовыми пользователями и тренировками.")
+            return 1
+
+        table_rows = {
+            name: int(rows)
+            for name, rows in await session.execute(
+                text("SELECT relname, reltuples FROM pg_class WHERE relkind = 'r'")
+            )
+        }
+
+        failures = 0
+        for name, run_query in build_checks(user_id, workout_id).items():
+            captured.clear()
+            event.listen(engine.sync_engine, "before_cursor_execute", capture)
+            try:
+                await run_query(session)
+            finally:
+                event.remove(engine.sync_engine, "before_cursor_execute", capture)
+
+            for statement, parameters in captured:
+                connection = await session.connection()
+                rows = await connection.exec_driver_sql(
+                    f"EXPLAIN (FORMAT JSON) {statement}", parameters
+                )
+                plan = rows.scalar()
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                big_scans = [
+                    table
+                    for table in find_seq_scans(plan[0]["Plan"])
+                    if table_rows.get(table, 0) >= min_rows
+                ]
+                if big_scans:
+                    failures += 1
+                    print(f"❌ {name}: Seq Scan по {', '.join(sorted(set(big_scans)))}")
+                else:
+                    print(f"✅ {name}")
+
+    await engine.dispose()
+    if failures:
+        print(f"\nЗапросов с последовательным сканированием больших таблиц: {failures}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--min-rows",
+        type=int,
+        default=1000,
+        help="Seq Scan допустим для таблиц меньше этого размера (по pg_class.reltuples)",
+    )
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.min_rows)))
@@ -0,0 +1,150 @@
+"""
+Сравнение планов середины цикла: локальная периодизация против LLM.
+
+Для выборки пользователей в середине цикла строит план следующей недели обоими
+способами (ничего не сохраняя) и показывает расхождения: упражнения, подходы и
+повторения, сплит и тип периодизации, а также время построения.
+Внимание: для каждого пользователя выполняется реальный запрос к LLM (без кэша).
+
+Пример:
+    python scripts/compare_periodization.py --limit 10 --verbose
+"""
+import argparse
+import asyncio
+import sys
+from collections import Counter
+from pathlib import Path
+from time import perf_counter
+
+# Добавляем корневую папку проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import func, select
+
+from database.connection import async_session_maker
+from database.models import User
+from bot.requests import workout_requests
+from bot.schemas.workout import LLMWorkoutPlan
+from bot.services.llm_service import llm_service
+from bot.services.periodization import build_local_plan
+from bot.utils.workout_utils import calculate_effective_training_week
+
+
+def exercise_table(plan: LLMWorkoutPlan) -> dict[str, tuple[int, str]]:
+    """Название упражнения -> (подходы, повторения) по всей неделе."""
+    return {
+        exercise.exercise_name: (exercise.sets, str(exercise.reps))
+        for day in plan.workout_plan
+        for exercise in day.exercises
+    }
+
+
+def diff_plans(local: LLMWorkoutPlan, llm: LLMWorkoutPlan) -> dict:
+    local_table, llm_table = exercise_table(local), exercise_table(llm)
+    common = local_table.keys() & llm_table.keys()
+    return {
+        "only_local": sorted(local_table.keys() - llm_table.keys()),
+        "only_llm": sorted(llm_table.keys() - local_table.keys()),
+        "common": len(common),
+        "sets_reps_mismatch": sorted(
+            f"{name}: {local_table[name]} vs {llm_table[name]}"
+            for name in common
+            if local_table[name] != llm_table[name]
+        ),
+        "days": (len(local.workout_plan), len(llm.workout_plan)),
+        "periodization_match": local.plan_summary.periodization_type.lower()
+        in llm.plan_summary.periodization_type.lower(),
+        "split_match": local.plan_summary.split_type.lower() == llm.plan_summary.split_type.lower(),
+    }
+
+
+async def main(limit: int, verbose: bool):
+    async with async_session_maker() as session:
+        users = (
+            await session.scalars(
+                select(User)
+                .where(User.current_training_week > 0, User.workout_frequency.is_not(None))
+                .order_by(func.random())
+                .limit(limit * 3)
+            )
+        ).all()
+
+        totals = Counter()
+        local_times, llm_times = [], []
+        for user in users:
+            if totals["compared"] >= limit:
+                break
+            effective_week = calculate_effective_training_week(
+                user.current_training_week + 1, user.fitness_level.value
+            )
+            last_workouts = await workout_requests.get_last_workouts_with_exercises(
+                session, user.id, user.workout_frequency
+            )
+
+            started = perf_counter()
+            local_plan = build_local_plan(user, effective_week, last_workouts)
+            local_times.append(perf_counter() - started)
+            if local_plan is None:
+                totals["skipped"] += 1
+                continue
+
+            fixed_exercises = list({
+                we.exercise.id: we.exercise for workout in last_workouts for we in workout.workout_exercises
+            }.values())
+            started = perf_counter()
+            try:
+                llm_plan = await llm_service.generate_workout_plan(
+                    user, effective_week, fixed_exercises=fixed_exercises, use_cache=False
+                )
+            except Exception as e:
+                print(f"Пользователь {user.id}: ошибка LLM: {e}")
+                totals["llm_errors"] += 1
+                continue
+            llm_times.append(perf_counter() - started)
+
+            diff = diff_plans(local_plan, llm_plan)
+            totals["compared"] += 1
+            totals["exercises_common"] += diff["common"]
+            totals["exercises_only_local"] += len(diff["only_local"])
+            totals["exercises_only_llm"] += len(diff["only_llm"])
+            totals["sets_reps_mismatch"] += len(diff["sets_reps_mismatch"])
+            totals["periodization_match"] += diff["periodization_match"]
+            totals["split_match"] += diff["split_match"]
+            totals["days_match"] += diff["days"][0] == diff["days"][1]
+
+            print(
+                f"Пользователь {user.id} ({user.fitness_level.value}, {user.equipment_type.value}, "
+                f"неделя {effective_week}): общих упражнений {diff['common']}, "
+                f"только локально {len(diff['only_local'])}, только LLM {len(diff['only_llm'])}, "
+                f"расхождений подходов/повторений {len(diff['sets_reps_mismatch'])}"
+            )
+            if verbose:
+                for line in diff["only_local"]:
+                    print(f"    - только локально: {line}")
+                for line in diff["only_llm"]:
+                    print(f"    + только LLM: {line}")
+                for line in diff["sets_reps_mismatch"]:
+                    print(f"    ~ {line}")
+
+    compared = totals["compared"]
+    print("\n--- Итого ---")
+    print(f"Сравнено планов: {compared}, пропущено (нужен LLM): {totals['skipped']}, ошибок LLM: {totals['llm_errors']}")
+    if not compared:
+        return
+    common = totals["exercises_common"]
+    print(f"Совпадение упражнений: {common} общих, {totals['exercises_only_local']} только локально, {totals['exercises_only_llm']} только LLM")
+    if common:
+        print(f"Совпадение подходов/повторений: {(common - totals['sets_reps_mismatch']) / common:.0%}")
+    print(f"Совпадение типа периодизации: {totals['periodization_match']}/{compared}, сплита: {totals['split_match']}/{compared}, числа дней: {totals['days_match']}/{compared}")
+    print(
+        f"Среднее время: локально {sum(local_times) / len(local_times) * 1000:.2f} мс, "
+        f"LLM {sum(llm_times) / len(llm_times):.1f} с"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сравнение локальной периодизации и LLM")
+    parser.add_argument("--limit", type=int, default=10, help="Сколько пользователей сравнить")
+    parser.add_argument("--verbose", action="store_true", help="Показывать все расхождения")
+    args = parser.parse_args()
+    asyncio.run(main(args.limit, args.verbose))
@@ -0,0 +1,160 @@
+"""
+Локальная заглушка Telegram Bot API и генератор нагрузки для webhook-режима.
+
+Режим `api` поднимает сервер, который отвечает на методы бота (`/bot<token>/<method>`)
+минимальными валидными объектами и считает вызовы. Боту нужно указать
+TELEGRAM_API_URL=http://127.0.0.1:8081.
+
+Режим `load` шлет в ingress (bot/webhook.py) синтетические сообщения от `--chats`
+пользователей и печатает пропускную способность приема.
+
+Пример:
+    python scripts/fake_telegram_api.py api --port 8081
+    python -m bot.webhook
+    BOT_MODE=webhook UPDATE_WORKER_COUNT=2 UPDATE_WORKER_INDEX=0 python -m bot.main
+    BOT_MODE=webhook UPDATE_WORKER_COUNT=2 UPDATE_WORKER_INDEX=1 python -m bot.main
+    python scripts/fake_telegram_api.py load --chats 500 --messages 10
+"""
+import argparse
+import asyncio
+import json
+import sys
+from collections import Counter
+from pathlib import Path
+from time import monotonic, time
+
+from aiohttp import ClientSession, web
+
+# Добавляем корневую папку проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from bot.config.settings import settings
+from bot.webhook import SECRET_HEADER
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot"}
+
+
+def make_message(message_id: int, chat_id: int, text: str = "") -> dict:
+    return {
+        "message_id": message_id,
+        "date": int(time()),
+        "chat": {"id": chat_id, "type": "private"},
+        "from": BOT_USER,
+        "text": text,
+    }
+
+
+async def read_params(request: web.Request) -> dict:
+    if request.content_type == "application/json":
+        return await request.json()
+    return dict(await request.post())
+
+
+async def handle_method(request: web.Request) -> web.Response:
+    method = request.match_info["method"]
+    calls: Counter = request.app["calls"]
+    calls[method] += 1
+    params = await read_params(request)
+
+    if method == "getMe":
+        result = BOT_USER
+    elif method in ("sendMessage", "editMessageText", "sendPhoto", "sendVideo"):
+        result = make_message(sum(calls.values()), int(params.get("chat_id", 0)), str(params.get("text", "")))
+    else:
+        result = True
+    return web.json_response({"ok": True, "result": result})
+
+
+async def handle_stats(request: web.Request) -> web.Response:
+    return web.json_response(dict(request.app["calls"]))
+
+
+async def run_api(host: str, port: int) -> None:
+    app = web.Application()
+    app["calls"] = Counter()
+    app.router.add_post("/bot{token}/{method}", handle_method)
+    app.router.add_get("/stats", handle_stats)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"Заглушка Bot API: http://{host}:{port} (счетчики вызовов — /stats)")
+
+    previous = 0
+    try:
+        while True:
+            await asyncio.sleep(5)
+            total = sum(app["calls"].values())
+            print(f"Вызовов: {total} (+{(total - previous) / 5:.1f}/с) {dict(app['calls'])}")
+            previous = total
+    finally:
+        await runner.cleanup()
+
+
+def make_update(update_id: int, chat_id: int, text: str) -> dict:
+    user = {"id": chat_id, "is_bot": False, "first_name": f"Load{chat_id}"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": user,
+            "text": text,
+        },
+    }
+
+
+async def run_load(url: str, chats: int, messages: int, concurrency: int, text: str) -> None:
+    headers = {"Content-Type": "application/json"}
+    if settings.WEBHOOK_SECRET:
+        headers[SECRET_HEADER] = settings.WEBHOOK_SECRET
+
+    # Сообщения одного чата отправляются по порядку, разные чаты — параллельно
+    semaphore = asyncio.Semaphore(concurrency)
+    statuses: Counter = Counter()
+    base_chat_id = 10_000_000
+
+    async def chat_sender(session: ClientSession, chat_index: int) -> None:
+        chat_id = base_chat_id + chat_index
+        for n in range(messages):
+            update = make_update(chat_index * messages + n + 1, chat_id, text)
+            async with semaphore:
+                async with session.post(url, data=json.dumps(update), headers=headers) as response:
+                    statuses[response.status] += 1
+
+    started = monotonic()
+    async with ClientSession() as session:
+        await asyncio.gather(*(chat_sender(session, i) for i in range(chats)))
+    elapsed = monotonic() - started
+
+    total = chats * messages
+    print(f"Отправлено апдейтов: {total} за {elapsed:.2f} с ({total / elapsed:.0f}/с)")
+    print(f"Ответы ingress: {dict(statuses)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Заглушка Bot API и нагрузка на webhook-ingress")
+    subparsers = parser.add_subparsers(dest="mode", required=True)
+
+    api = subparsers.add_parser("api", help="Поднять заглушку Telegram Bot API")
+    api.add_argument("--host", default="127.0.0.1")
+    api.add_argument("--port", type=int, default=8081)
+
+    load = subparsers.add_parser("load", help="Отправить синтетические апдейты в ingress")
+    load.add_argument(
+        "--url", default=f"http://{settings.WEBHOOK_HOST}:{settings.WEBHOOK_PORT}{settings.WEBHOOK_PATH}"
+    )
+    load.add_argument("--chats", type=int, default=100, help="Число разных чатов")
+    load.add_argument("--messages", type=int, default=10, help="Сообщений на чат")
+    load.add_argument("--concurrency", type=int, default=50, help="Одновременных HTTP-запросов")
+    load.add_argument("--text", default="/start")
+
+    args = parser.parse_args()
+    if args.mode == "api":
+        asyncio.run(run_api(args.host, args.port))
+    else:
+        asyncio.run(run_load(args.url, args.chats, args.messages, args.concurrency, args.text))
+
+
+if __name__ == "__main__":
+    main()
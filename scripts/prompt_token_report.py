@@ -0,0 +1,114 @@
+"""
+Отчет о размере промпта генерации недельного плана: обычный формат списков
+упражнений против компактного (PROMPT_COMPACT_ENCODING).
+
+Упражнения берутся из combined_exercises.json, поэтому БД и LLM не нужны.
+Если установлен tiktoken, токены считаются им (o200k_base, как у gpt-4o-mini),
+иначе — локальной оценкой.
+
+Пример:
+    python scripts/prompt_token_report.py
+"""
+import json
+import sys
+from itertools import product
+from pathlib import Path
+from types import SimpleNamespace
+
+# Добавляем корневую папку проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from bot.services.coach_context import estimate_tokens
+from bot.services.llm_service import llm_service
+from database.models import EquipmentTypeEnum, FitnessLevelEnum, GenderEnum, GoalEnum
+
+try:
+    import tiktoken
+
+    _encoding = tiktoken.get_encoding("o200k_base")
+
+    def count_tokens(text: str) -> int:
+        return len(_encoding.encode(text))
+
+    TOKENIZER = "tiktoken o200k_base"
+except ImportError:
+    count_tokens = estimate_tokens
+    TOKENIZER = "локальная оценка (~3 символа на токен)"
+
+
+def load_exercises() -> dict[EquipmentTypeEnum, list[SimpleNamespace]]:
+    """Загружает упражнения из combined_exercises.json с последовательными id, как после сидинга."""
+    json_path = Path(__file__).resolve().parents[1] / "combined_exercises.json"
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    exercises: dict[EquipmentTypeEnum, list[SimpleNamespace]] = {}
+    next_id = 1
+    for muscle_group, equipment_types in data.items():
+        for equipment_type_str, items in equipment_types.items():
+            equipment_type = (
+                EquipmentTypeEnum.bodyweight
+                if equipment_type_str == "Свой вес"
+                else EquipmentTypeEnum.gym
+            )
+            for item in items:
+                exercises.setdefault(equipment_type, []).append(
+                    SimpleNamespace(
+                        id=next_id,
+                        name=item["name"],
+                        muscle_groups=muscle_group,
+                        equipment_type=equipment_type,
+                    )
+                )
+                next_id += 1
+    return exercises
+
+
+def main():
+    exercises = load_exercises()
+    print(f"Токенизатор: {TOKENIZER}\n")
+    header = f"{'оборуд.':>10} | {'уровень':>12} | {'частота':>7} | {'неделя':>6} | {'режим':>7} | {'было':>7} | {'стало':>7} | {'экономия':>8}"
+    print(header)
+    print("-" * len(header))
+
+    total_old = total_new = 0
+    for equipment, level, frequency, week in product(
+        EquipmentTypeEnum, (FitnessLevelEnum.beginner, FitnessLevelEnum.advanced), (2, 3, 5), (1, 2, 3)
+    ):
+        user = SimpleNamespace(
+            gender=GenderEnum.male,
+            age=30,
+            height=180,
+            current_weight=80.0,
+            goal=GoalEnum.mass_gain,
+            fitness_level=level,
+            workout_frequency=frequency,
+            equipment_type=equipment,
+        )
+        available = exercises.get(equipment, [])
+        # Первая неделя — поиск упражнений по всему каталогу, остальные — фиксированный список
+        if week == 1:
+            mode = "поиск"
+            kwargs = {"available_exercises": available, "banned_exercises": available[:frequency * 5]}
+        else:
+            mode = "фикс."
+            kwargs = {"fixed_exercises": available[:frequency * 5]}
+
+        sizes = []
+        for compact in (False, True):
+            prompt_data = llm_service.build_prompt_data(user, week, compact=compact, **kwargs)
+            sizes.append(count_tokens(llm_service.render_workout_prompt(prompt_data, compact=compact)))
+        old, new = sizes
+        total_old += old
+        total_new += new
+        print(
+            f"{equipment.value:>10} | {level.value:>12} | {frequency:>7} | {week:>6} | {mode:>7} | "
+            f"{old:>7} | {new:>7} | {(old - new) / old:>7.0%}"
+        )
+
+    print("-" * len(header))
+    print(f"Итого: {total_old} -> {total_new} токенов ({(total_old - total_new) / total_old:.0%} экономии)")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ import asyncio
 import json
 import os
 import sys
+from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
 # Добавляем корневую директорию проекта в sys.path
@@ -10,6 +11,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from bot.config.settings import settings
 from bot.requests.exercise_requests import clear_exercises, add_exercises_bulk
 from bot.schemas.exercise import ExerciseCreate
+from bot.services.exercise_catalog import exercise_catalog
 
 
 async def main():
@@ -73,6 +75,15 @@ async def main():
             f"{len(exercises_to_create)} упражнениями."
         )
 
+        # Оповещаем запущенные процессы бота, чтобы они перезагрузили каталог
+        await exercise_catalog.load(session)
+        redis = Redis.from_url(settings.REDIS_URL)
+        try:
+            await exercise_catalog.publish_changed(redis)
+            print(f"✅ Каталог упражнений обновлен (версия {exercise_catalog.version}).")
+        finally:
+            await redis.aclose()
+
 
 if __name__ == "__main__":
     # Запускаем скрипт, только если база данных была обновлена
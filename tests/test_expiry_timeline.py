@@ -0,0 +1,90 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from bot.config.settings import settings
+from bot.services.expiry_timeline import ExpiryTimeline
+
+BASE = datetime(2026, 11, 1, 12, 0)
+
+
+def make_timeline(redis, session_pool, expiries: dict[int, datetime], on_due=None) -> ExpiryTimeline:
+    """Таймер поверх словаря {subscription_id: expires_at} вместо таблицы subscriptions."""
+
+    async def load_next(session, size):
+        return sorted(expiries.items(), key=lambda item: item[1])[:size]
+
+    async def noop():
+        pass
+
+    timeline = ExpiryTimeline()
+    timeline.setup(redis, session_pool, load_next, on_due or noop)
+    return timeline
+
+
+async def test_reload_keeps_nearest_window(redis, session_pool, monkeypatch):
+    monkeypatch.setattr(settings, "EXPIRY_TIMELINE_SIZE", 2)
+    timeline = make_timeline(redis, session_pool, {
+        1: BASE + timedelta(days=3), 2: BASE + timedelta(days=1), 3: BASE + timedelta(days=2),
+    })
+
+    await timeline.reload()
+
+    assert len(timeline) == 2
+    assert timeline.next_expiry == BASE + timedelta(days=1)
+    assert timeline._horizon == BASE + timedelta(days=2)
+
+
+async def test_renewal_replaces_entry_lazily(redis, session_pool):
+    timeline = make_timeline(redis, session_pool, {1: BASE, 2: BASE + timedelta(days=1)})
+    await timeline.reload()
+
+    # Подписку 1 продлили: старый элемент кучи остается, но считается устаревшим
+    await timeline.track(1, BASE + timedelta(days=5))
+
+    assert timeline.next_expiry == BASE + timedelta(days=1)
+    assert len(timeline) == 2
+
+    await timeline.track(2, None)
+    assert timeline.next_expiry == BASE + timedelta(days=5)
+    assert timeline._heap == [(BASE + timedelta(days=5), 1)]
+
+
+async def test_expiry_beyond_horizon_leaves_the_window(redis, session_pool, monkeypatch):
+    monkeypatch.setattr(settings, "EXPIRY_TIMELINE_SIZE", 2)
+    timeline = make_timeline(redis, session_pool, {1: BASE, 2: BASE + timedelta(days=1)})
+    await timeline.reload()
+
+    await timeline.track(1, BASE + timedelta(days=30))
+
+    assert len(timeline) == 1
+    assert timeline.next_expiry == BASE + timedelta(days=1)
+
+
+async def test_timer_fires_for_due_subscription_and_hears_other_replicas(redis, session_pool):
+    fired = asyncio.Event()
+    timeline = make_timeline(
+        redis, session_pool, {1: datetime.now() + timedelta(days=1)}, on_due=_set(fired)
+    )
+    timeline.start()
+    try:
+        for _ in range(100):
+            if timeline._loaded:
+                break
+            await asyncio.sleep(0.01)
+
+        # Подписку сократили на другой реплике: ее таймер ничего не загружал, только публикует
+        other = make_timeline(redis, session_pool, {})
+        await asyncio.sleep(0.05)
+        await other.track(1, datetime.now() - timedelta(seconds=1))
+
+        await asyncio.wait_for(fired.wait(), timeout=5)
+        assert timeline.fired == 1
+        assert len(timeline) == 0
+    finally:
+        await timeline.stop()
+
+
+def _set(event: asyncio.Event):
+    async def on_due():
+        event.set()
+    return on_due
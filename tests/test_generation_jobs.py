@@ -0,0 +1,70 @@
+import pytest
+
+from bot.config.settings import settings
+from bot.services.generation_jobs import GenerationJob, GenerationJobQueue
+
+
+@pytest.fixture(autouse=True)
+def no_workers(monkeypatch):
+    # Воркеры не нужны: проверяется только распределение задач между репликами
+    monkeypatch.setattr(settings, "GENERATION_JOB_WORKERS", 0)
+
+
+def make_queue(redis, instance_id: str) -> GenerationJobQueue:
+    queue = GenerationJobQueue()
+    queue.setup(redis, bot=None, session_pool=None, workout_service=None)
+    queue.instance_id = instance_id
+    return queue
+
+
+async def take_job(queue: GenerationJobQueue, telegram_id: int) -> None:
+    """Кладет задачу в processing-список реплики, как это делает ее воркер."""
+    await queue.redis.lpush(queue.processing_key, GenerationJob(telegram_id, "payment").dumps())
+
+
+async def test_start_leaves_jobs_of_live_replica(redis):
+    first = make_queue(redis, "first")
+    await first.start()
+    await take_job(first, 1)
+
+    second = make_queue(redis, "second")
+    await second.start()
+    try:
+        assert second.recovered == 0
+        assert await redis.llen(first.processing_key) == 1
+        assert await redis.llen(GenerationJobQueue.QUEUE_KEY) == 0
+    finally:
+        await second.stop()
+
+
+async def test_jobs_of_dead_replica_are_recovered_once(redis):
+    crashed = make_queue(redis, "crashed")
+    await crashed.start()
+    await take_job(crashed, 1)
+    await take_job(crashed, 2)
+    crashed._heartbeat.cancel()
+    # Пульс истек, реплика не успела ничего прибрать
+    await redis.delete(f"{GenerationJobQueue.ALIVE_KEY_PREFIX}crashed")
+
+    survivor, other = make_queue(redis, "survivor"), make_queue(redis, "other")
+    await survivor.start()
+    await other.start()
+    try:
+        assert survivor.recovered + other.recovered == 2
+        assert await redis.llen(GenerationJobQueue.QUEUE_KEY) == 2
+        assert await redis.smembers(GenerationJobQueue.WORKERS_KEY) == {b"survivor", b"other"}
+    finally:
+        await survivor.stop()
+        await other.stop()
+
+
+async def test_stop_returns_own_unfinished_jobs(redis):
+    queue = make_queue(redis, "first")
+    await queue.start()
+    await take_job(queue, 1)
+
+    await queue.stop()
+
+    assert await redis.llen(GenerationJobQueue.QUEUE_KEY) == 1
+    assert await redis.llen(queue.processing_key) == 0
+    assert await redis.smembers(GenerationJobQueue.WORKERS_KEY) == set()
@@ -0,0 +1,57 @@
+import pytest
+
+from bot.config.settings import settings
+from bot.services.leader_election import LeaderElection
+
+
+@pytest.fixture
+def replicas(redis, monkeypatch):
+    monkeypatch.setattr(settings, "LEADER_ELECTION_ENABLED", True)
+    first, second = LeaderElection(), LeaderElection()
+    first.setup(redis)
+    second.setup(redis)
+    return first, second
+
+
+async def test_term_grows_only_when_lease_is_won(replicas, redis):
+    first, second = replicas
+
+    await first._try_acquire()
+    for _ in range(5):
+        await second._try_acquire()
+
+    assert first.is_leader and first.term == 1
+    assert not second.is_leader and second.term is None
+    assert int(await redis.get(LeaderElection.TERM_KEY)) == 1
+
+
+async def test_stale_leader_fails_lease_check_after_takeover(replicas, redis):
+    first, second = replicas
+    elected = []
+
+    async def on_elected():
+        elected.append(second.term)
+
+    second.on_elected(on_elected)
+    await first._try_acquire()
+
+    # Аренда истекла, пока первый лидер стоял на паузе
+    await redis.delete(LeaderElection.LEASE_KEY)
+    await second._try_acquire()
+
+    assert second.term == 2 and elected == [2]
+    assert await second.holds_lease()
+    assert not await first.holds_lease()
+
+    await first._renew()
+    assert not first.is_leader
+
+
+async def test_stop_releases_lease_for_immediate_failover(replicas, redis):
+    first, second = replicas
+    await first._try_acquire()
+
+    await first.stop()
+    await second._try_acquire()
+
+    assert second.is_leader and second.term == 2
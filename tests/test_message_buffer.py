@@ -0,0 +1,101 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError
+
+from bot.services import message_buffer as buffer_module
+from bot.services.message_buffer import MessageBuffer
+from database.models import UserMessage
+
+
+@pytest.fixture
+def buffer(session_pool, monkeypatch):
+    sleeps = []
+    real_sleep = asyncio.sleep
+
+    async def no_sleep(delay):
+        sleeps.append(delay)
+        await real_sleep(0)
+
+    monkeypatch.setattr(buffer_module.asyncio, "sleep", no_sleep)
+    buffer = MessageBuffer()
+    buffer.setup(session_pool)
+    buffer.sleeps = sleeps
+    return buffer
+
+
+def make_rows(messages: list[str | None]) -> list[dict]:
+    return [
+        {"user_id": 1, "message": message, "response": None, "created_at": datetime(2026, 1, 1)}
+        for message in messages
+    ]
+
+
+async def stored_messages(session_pool) -> list[str]:
+    async with session_pool() as session:
+        result = await session.execute(select(UserMessage.message).order_by(UserMessage.id))
+        return list(result.scalars())
+
+
+async def test_transient_error_is_retried(buffer, session_pool, monkeypatch):
+    original = buffer_module.message_requests.add_messages_bulk
+    failures = iter([True, True])
+
+    async def flaky_bulk(session, rows):
+        if next(failures, False):
+            raise ConnectionError("database is restarting")
+        await original(session, rows)
+
+    monkeypatch.setattr(buffer_module.message_requests, "add_messages_bulk", flaky_bulk)
+
+    await buffer._write(make_rows(["a", "b"]))
+
+    assert await stored_messages(session_pool) == ["a", "b"]
+    assert buffer.sleeps == [2, 4]
+    assert buffer.stats.flushed == 2
+    assert buffer.stats.dropped == 0
+
+
+async def test_outage_is_retried_without_dropping_rows(buffer, session_pool, monkeypatch):
+    async def unavailable_bulk(session, rows):
+        raise OperationalError("INSERT", {}, ConnectionRefusedError("connection refused"))
+
+    monkeypatch.setattr(buffer_module.message_requests, "add_messages_bulk", unavailable_bulk)
+
+    write = asyncio.create_task(buffer._write(make_rows(["a", "b", "c"])))
+    while buffer.stats.flush_errors < 20:
+        await asyncio.sleep(0)
+
+    assert not write.done()
+    assert buffer.stats.dropped == 0
+    assert max(buffer.sleeps) == 30
+    write.cancel()
+    await asyncio.gather(write, return_exceptions=True)
+
+
+async def test_poison_row_is_dropped(buffer, session_pool):
+    # message NOT NULL: эту строку БД не примет ни с какой попытки
+    rows = make_rows(["a", "b", None, "c", "d"])
+
+    await buffer._write(rows)
+
+    assert await stored_messages(session_pool) == ["a", "b", "c", "d"]
+    assert buffer.sleeps == []
+    assert buffer.stats.flushed == 4
+    assert buffer.stats.dropped == 1
+
+
+async def test_flush_moves_on_after_poison_batch(buffer, session_pool):
+    buffer.start()
+    try:
+        await buffer.add(1, None)
+        await buffer.add(1, "next")
+    finally:
+        await buffer.stop()
+
+    async with session_pool() as session:
+        count = await session.scalar(select(func.count(UserMessage.id)))
+    assert count == 1
+    assert buffer.stats.dropped == 1
@@ -0,0 +1,134 @@
+import asyncio
+
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from bot.config.settings import settings
+from bot.utils import message_dispatcher as dispatcher_module
+from bot.utils.message_dispatcher import MessageDispatcher, TokenBucket
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeBot:
+    """Записывает отправленные сообщения; `errors` — исключения для первых вызовов."""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.sent: list[tuple[int, str]] = []
+        self.sent_at: list[float] = []
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append((chat_id, text))
+        self.sent_at.append(asyncio.get_running_loop().time())
+
+
+def retry_after(seconds: float) -> TelegramRetryAfter:
+    return TelegramRetryAfter(SendMessage(chat_id=1, text="x"), "Too Many Requests", seconds)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(dispatcher_module, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+async def dispatcher(monkeypatch):
+    monkeypatch.setattr(settings, "DISPATCHER_WORKERS", 1)
+    dispatcher = MessageDispatcher()
+    yield dispatcher
+    await dispatcher.stop(timeout=0)
+
+
+def test_token_bucket_allows_burst_then_asks_to_wait(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+
+    assert [bucket.take() for _ in range(3)] == [0, 0, 0]
+    assert bucket.take() == pytest.approx(0.5)
+
+    clock.now += 0.5
+    assert bucket.take() == 0
+
+
+def test_chat_limits_are_separate(clock, monkeypatch):
+    monkeypatch.setattr(settings, "DISPATCHER_CHAT_RATE", 1.0)
+    monkeypatch.setattr(settings, "DISPATCHER_CHAT_BURST", 1)
+    dispatcher = MessageDispatcher()
+
+    assert dispatcher._chat_delay(1) == 0
+    assert dispatcher._chat_delay(1) == pytest.approx(1.0)
+    assert dispatcher._chat_delay(2) == 0
+
+
+async def test_global_limit_is_awaited_without_requeueing(dispatcher, session_pool, monkeypatch):
+    monkeypatch.setattr(settings, "DISPATCHER_WORKERS", 2)
+    bot = FakeBot()
+    dispatcher.setup(bot, session_pool)
+    dispatcher._global_bucket = TokenBucket(rate=50, capacity=1)
+    requeued = []
+    monkeypatch.setattr(dispatcher, "_requeue_later", lambda *args: requeued.append(args))
+    dispatcher.start()
+
+    futures = [dispatcher.enqueue(chat_id, "hi") for chat_id in range(10)]
+    assert await asyncio.wait_for(asyncio.gather(*futures), timeout=2) == [True] * 10
+
+    assert requeued == []
+    # Глобальный лимит соблюден: 10 сообщений при 50/с и запасе в 1 токен
+    assert bot.sent_at[-1] - bot.sent_at[0] >= 9 / 50 * 0.9
+
+
+async def test_retry_after_pauses_sending_and_retries(dispatcher, session_pool):
+    bot = FakeBot(errors=[retry_after(0.05)])
+    dispatcher.setup(bot, session_pool)
+    dispatcher.start()
+
+    started = asyncio.get_running_loop().time()
+    first = dispatcher.enqueue(1, "first")
+    second = dispatcher.enqueue(2, "second")
+    assert await asyncio.wait_for(asyncio.gather(first, second), timeout=2) == [True, True]
+
+    # Пауза касается всех чатов: второе сообщение тоже ушло только после нее
+    assert sorted(bot.sent) == [(1, "first"), (2, "second")]
+    assert min(bot.sent_at) - started >= 0.05 * 0.9
+    assert dispatcher.stats.retried == 1
+    assert dispatcher.stats.sent == 2
+
+
+async def test_retry_after_gives_up_after_max_retries(dispatcher, session_pool, monkeypatch):
+    monkeypatch.setattr(settings, "DISPATCHER_MAX_RETRIES", 2)
+    bot = FakeBot(errors=[retry_after(0.01) for _ in range(3)])
+    dispatcher.setup(bot, session_pool)
+    dispatcher.start()
+
+    assert await asyncio.wait_for(dispatcher.enqueue(1, "hello"), timeout=2) is False
+    assert dispatcher.stats.retried == 3
+    assert dispatcher.stats.failed == 1
+    assert bot.sent == []
+
+
+async def test_stop_fails_deferred_messages(dispatcher, session_pool, monkeypatch):
+    monkeypatch.setattr(settings, "DISPATCHER_CHAT_RATE", 0.1)
+    monkeypatch.setattr(settings, "DISPATCHER_CHAT_BURST", 1)
+    dispatcher.setup(FakeBot(), session_pool)
+    dispatcher.start()
+
+    first = dispatcher.enqueue(1, "first")
+    deferred = dispatcher.enqueue(1, "second")
+    assert await asyncio.wait_for(first, timeout=2) is True
+    await asyncio.sleep(0.01)
+
+    await dispatcher.stop(timeout=0)
+
+    assert deferred.done() and deferred.result() is False
+    assert dispatcher.queue_size == 0
@@ -0,0 +1,71 @@
+import pytest
+
+from bot.services import message_quota as quota_module
+from bot.services.message_quota import MessageQuota
+
+
+@pytest.fixture
+def quota(redis):
+    quota = MessageQuota()
+    quota.setup(redis)
+    return quota
+
+
+def db_counts(monkeypatch, counts: dict[int, int], before_return=None):
+    """Подменяет подсчет по user_messages: {user_id: количество}."""
+
+    async def count_messages_for_periods(session, periods):
+        if before_return is not None:
+            await before_return()
+        return [counts[user_id] for user_id, _ in periods]
+
+    monkeypatch.setattr(quota_module.message_requests, "count_messages_for_periods", count_messages_for_periods)
+
+
+async def test_reconcile_raises_lagging_counter_and_keeps_ttl(quota, redis, session_pool, monkeypatch):
+    await redis.set("msg_quota:1:trial", 2, ex=3600)
+    db_counts(monkeypatch, {1: 5})
+
+    await quota.reconcile(session_pool)
+
+    assert int(await redis.get("msg_quota:1:trial")) == 5
+    assert await redis.ttl("msg_quota:1:trial") > 0
+    assert quota.repaired == 1
+
+
+async def test_reconcile_never_lowers_counter(quota, redis, session_pool, monkeypatch):
+    # Счетчик впереди БД: сообщения еще в буферах других реплик
+    await redis.set("msg_quota:1:trial", 7)
+    db_counts(monkeypatch, {1: 4})
+
+    await quota.reconcile(session_pool)
+
+    assert int(await redis.get("msg_quota:1:trial")) == 7
+    assert quota.repaired == 0
+
+
+async def test_reconcile_keeps_incr_made_after_db_count(quota, redis, session_pool, monkeypatch):
+    await redis.set("msg_quota:1:trial", 3)
+
+    async def concurrent_message():
+        # Сообщение засчитано уже после того, как БД была посчитана
+        await redis.incr("msg_quota:1:trial")
+
+    db_counts(monkeypatch, {1: 3}, before_return=concurrent_message)
+
+    await quota.reconcile(session_pool)
+
+    assert int(await redis.get("msg_quota:1:trial")) == 4
+
+
+async def test_reconcile_does_not_recreate_expired_key(quota, redis, session_pool, monkeypatch):
+    await redis.set("msg_quota:1:trial", 1)
+
+    async def key_expired():
+        await redis.delete("msg_quota:1:trial")
+
+    db_counts(monkeypatch, {1: 3}, before_return=key_expired)
+
+    await quota.reconcile(session_pool)
+
+    assert await redis.exists("msg_quota:1:trial") == 0
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from bot.config.settings import settings
+from bot.services import workout_service as workout_service_module
+from bot.services.workout_service import check_and_generate_missed_workouts
+from bot.utils.workout_utils import generation_week_start, moscow_now
+from database.models import Subscription, SubscriptionStatusEnum, User, Workout, WorkoutStatusEnum
+
+WEEK = generation_week_start(moscow_now())
+CHECKPOINT_KEY = f"catchup:{WEEK.isoformat()}"
+
+
+async def add_users(session_pool, count: int, planned_this_week: set[int] = frozenset()) -> list[int]:
+    """Пользователи telegram_id 1..count с активной подпиской; некоторым план на неделю уже построен."""
+    async with session_pool() as session:
+        users = [User(telegram_id=n, workout_frequency=3) for n in range(1, count + 1)]
+        session.add_all(users)
+        await session.flush()
+        for user in users:
+            session.add(Subscription(user_id=user.id, status=SubscriptionStatusEnum.active))
+            if user.telegram_id in planned_this_week:
+                session.add(Workout(
+                    user_id=user.id,
+                    planned_date=datetime.combine(WEEK, datetime.min.time()) + timedelta(days=2, hours=9),
+                    status=WorkoutStatusEnum.completed,
+                ))
+        await session.commit()
+        return [user.id for user in users]
+
+
+@pytest.fixture
+def generation(monkeypatch):
+    """Подменяет генерацию: возвращает заданный исход по telegram_id и запоминает порядок вызовов."""
+    monkeypatch.setattr(settings, "GENERATION_PAGE_SIZE", 2)
+    calls, outcomes = [], {}
+
+    async def generate_and_notify(bot, session_pool, workout_service, user, **kwargs):
+        calls.append(user.telegram_id)
+        return outcomes.get(user.telegram_id, "generated")
+
+    monkeypatch.setattr(workout_service_module, "_generate_and_notify", generate_and_notify)
+    return calls, outcomes
+
+
+async def test_only_users_without_plans_for_target_week(session_pool, redis, generation):
+    calls, _ = generation
+    await add_users(session_pool, 4, planned_this_week={2})
+
+    await check_and_generate_missed_workouts(None, session_pool, None, redis)
+
+    assert sorted(calls) == [1, 3, 4]
+
+
+async def test_checkpoint_stops_before_first_failure(session_pool, redis, generation):
+    calls, outcomes = generation
+    user_ids = await add_users(session_pool, 5)
+    outcomes.update({2: "skipped", 3: "failed"})
+
+    await check_and_generate_missed_workouts(None, session_pool, None, redis)
+
+    assert sorted(calls) == [1, 2, 3, 4, 5]
+    assert int(await redis.get(CHECKPOINT_KEY)) == user_ids[1]
+
+    # Рестарт продолжает с пользователя, на котором генерация упала
+    calls.clear()
+    outcomes.clear()
+    await check_and_generate_missed_workouts(None, session_pool, None, redis)
+
+    assert sorted(calls) == [3, 4, 5]
+    assert int(await redis.get(CHECKPOINT_KEY)) == user_ids[4]
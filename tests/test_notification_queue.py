@@ -0,0 +1,142 @@
+import asyncio
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from zoneinfo import ZoneInfo
+
+from apscheduler.schedulers.base import STATE_PAUSED, STATE_RUNNING
+
+from bot import scheduler
+from bot.config.settings import settings
+from database.models import User, Workout, WorkoutStatusEnum
+from bot.requests.workout_requests import (
+    claim_due_workout_notifications,
+    extend_workout_notification_claims,
+    mark_workout_notified,
+)
+from bot.utils.workout_utils import moscow_now
+
+LEASE = timedelta(minutes=5)
+MAX_LATENESS = timedelta(hours=12)
+NOW = datetime(2026, 10, 19, 9, 0)
+
+
+async def add_workouts(session_pool, *planned_dates: datetime) -> list[int]:
+    async with session_pool() as session:
+        user = User(telegram_id=1001)
+        session.add(user)
+        await session.flush()
+        workouts = [
+            Workout(user_id=user.id, planned_date=planned, status=WorkoutStatusEnum.planned)
+            for planned in planned_dates
+        ]
+        session.add_all(workouts)
+        await session.commit()
+        return [w.id for w in workouts]
+
+
+async def claim(session_pool, now: datetime, batch_size: int = 10):
+    async with session_pool() as session:
+        return await claim_due_workout_notifications(session, batch_size, LEASE, MAX_LATENESS, now=now)
+
+
+async def test_claims_only_due_workouts_within_lateness(session_pool):
+    due, future, too_late = await add_workouts(
+        session_pool, NOW - timedelta(minutes=1), NOW + timedelta(hours=1), NOW - timedelta(hours=13)
+    )
+
+    claimed = await claim(session_pool, NOW)
+
+    assert claimed == [(due, 1001)]
+
+
+async def test_claimed_workout_is_not_claimed_again_until_lease_expires(session_pool):
+    [workout_id] = await add_workouts(session_pool, NOW)
+
+    assert await claim(session_pool, NOW) == [(workout_id, 1001)]
+    assert await claim(session_pool, NOW + LEASE - timedelta(seconds=1)) == []
+    assert await claim(session_pool, NOW + LEASE + timedelta(seconds=1)) == [(workout_id, 1001)]
+
+
+async def test_extended_claim_survives_the_original_lease(session_pool):
+    [workout_id] = await add_workouts(session_pool, NOW)
+    await claim(session_pool, NOW)
+
+    async with session_pool() as session:
+        extended = await extend_workout_notification_claims(
+            session, [workout_id], LEASE, now=NOW + timedelta(minutes=4)
+        )
+
+    assert extended == 1
+    assert await claim(session_pool, NOW + LEASE + timedelta(seconds=1)) == []
+
+
+async def test_notified_workout_is_never_claimed_again(session_pool):
+    [workout_id] = await add_workouts(session_pool, moscow_now() - timedelta(minutes=1))
+    await claim(session_pool, moscow_now())
+
+    async with session_pool() as session:
+        await mark_workout_notified(session, workout_id)
+        assert await extend_workout_notification_claims(session, [workout_id], LEASE) == 0
+
+    assert await claim(session_pool, moscow_now() + LEASE * 2) == []
+
+
+async def test_claim_uses_moscow_time_on_a_utc_host(session_pool):
+    # 09:00 по Москве = 06:00 UTC; хост в UTC не должен считать тренировку будущей
+    [workout_id] = await add_workouts(session_pool, datetime(2026, 10, 19, 9, 0))
+    with patch("bot.requests.workout_requests.moscow_now", return_value=datetime(2026, 10, 19, 9, 0, 30)):
+        async with session_pool() as session:
+            claimed = await claim_due_workout_notifications(session, 10, LEASE, MAX_LATENESS)
+
+    assert claimed == [(workout_id, 1001)]
+
+
+def test_moscow_now_is_naive_moscow_wall_clock():
+    expected = datetime.now(ZoneInfo("Europe/Moscow")).replace(tzinfo=None)
+    actual = moscow_now()
+
+    assert actual.tzinfo is None
+    assert abs(actual - expected) < timedelta(seconds=5)
+
+
+async def test_batch_is_sent_concurrently_and_claims_are_kept_while_sending(session_pool, monkeypatch):
+    monkeypatch.setattr(settings, "NOTIFICATION_LEASE_SECONDS", 0.3)
+    monkeypatch.setattr(settings, "NOTIFICATION_SEND_CONCURRENCY", 5)
+    workout_ids = await add_workouts(session_pool, *[moscow_now() - timedelta(minutes=1)] * 5)
+
+    in_flight = 0
+    max_in_flight = 0
+    reclaimed_during_send = []
+
+    async def fake_send(bot, telegram_id, workout_id, pool):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.5)  # дольше аренды
+        reclaimed_during_send.append(await claim(pool, moscow_now()))
+        async with pool() as session:
+            await mark_workout_notified(session, workout_id)
+        in_flight -= 1
+
+    monkeypatch.setattr(scheduler, "send_workout_notification", fake_send)
+
+    await scheduler.process_due_notifications(bot=None, session_pool=session_pool)
+
+    assert max_in_flight == len(workout_ids)
+    assert reclaimed_during_send == [[]] * len(workout_ids)
+    assert await claim(session_pool, moscow_now() + timedelta(hours=1)) == []
+
+
+async def test_notification_polling_runs_without_leadership(session_pool, redis):
+    scheduler.setup_scheduler(None, session_pool, None, redis)
+    try:
+        job = scheduler.replica_scheduler.get_job("process_due_notifications")
+        assert job.func is scheduler.process_due_notifications
+        assert job.next_run_time is not None
+        # Задачи лидера стоят на паузе, пока реплика не избрана
+        assert scheduler.scheduler.get_job("process_due_notifications") is None
+        assert scheduler.scheduler.state == STATE_PAUSED
+        assert scheduler.replica_scheduler.state == STATE_RUNNING
+    finally:
+        scheduler.replica_scheduler.shutdown(wait=False)
+        scheduler.scheduler.shutdown(wait=False)
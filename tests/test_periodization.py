@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from bot.services.periodization import build_local_plan, can_build_locally
+from database.models import EquipmentTypeEnum, FitnessLevelEnum, GoalEnum
+
+MONDAY = datetime(2026, 10, 12, 9, 0)
+
+
+def make_user(level=FitnessLevelEnum.beginner, equipment=EquipmentTypeEnum.gym, frequency=2):
+    return SimpleNamespace(
+        fitness_level=level, equipment_type=equipment, workout_frequency=frequency, goal=GoalEnum.maintenance
+    )
+
+
+def make_week(frequency: int = 2, sets: int = 3) -> list:
+    """Прошлая неделя: `frequency` тренировок по два упражнения (в обратном порядке дат)."""
+    workouts = []
+    for n in range(frequency):
+        exercises = [
+            SimpleNamespace(
+                order=order,
+                sets=sets,
+                exercise=SimpleNamespace(id=10 * n + order, name=f"Упражнение {n}-{order}", muscle_groups="Грудь"),
+            )
+            for order in (2, 1)
+        ]
+        workouts.append(SimpleNamespace(
+            planned_date=MONDAY + timedelta(days=2 * n),
+            workout_exercises=exercises,
+            warm_up=None,
+            cool_down="Растяжка",
+        ))
+    return list(reversed(workouts))
+
+
+@pytest.mark.parametrize(
+    ("week", "sets", "reps"),
+    [(2, 3, "12"), (3, 4, "10"), (4, 4, "8"), (5, 5, "6"), (6, 2, "15")],
+)
+def test_beginner_linear_table(week, sets, reps):
+    plan = build_local_plan(make_user(), week, make_week())
+
+    assert plan.plan_summary.periodization_type == "Линейная"
+    assert {(e.sets, e.reps) for day in plan.workout_plan for e in day.exercises} == {(sets, reps)}
+
+
+@pytest.mark.parametrize(("week", "sets", "reps"), [(2, 3, "10-12"), (3, 3, "15")])
+def test_advanced_undulating_table(week, sets, reps):
+    plan = build_local_plan(make_user(level=FitnessLevelEnum.intermediate), week, make_week())
+
+    assert plan.plan_summary.periodization_type == "Волновая"
+    assert {(e.sets, e.reps) for day in plan.workout_plan for e in day.exercises} == {(sets, reps)}
+
+
+def test_last_week_exercises_are_kept_in_order():
+    plan = build_local_plan(make_user(), 2, make_week())
+
+    assert [d.day for d in plan.workout_plan] == [1, 2]
+    first_day = plan.workout_plan[0]
+    assert [(e.order, e.exercise_name, e.exercise_id) for e in first_day.exercises] == [
+        (1, "Упражнение 0-1", 1), (2, "Упражнение 0-2", 2),
+    ]
+    assert first_day.cool_down == "Растяжка"
+
+
+@pytest.mark.parametrize(("previous_sets", "expected_sets"), [(2, 3), (3, 3), (4, 4), (6, 4)])
+def test_bodyweight_reps_to_failure_with_clamped_sets(previous_sets, expected_sets):
+    user = make_user(level=FitnessLevelEnum.advanced, equipment=EquipmentTypeEnum.bodyweight)
+
+    plan = build_local_plan(user, 2, make_week(sets=previous_sets))
+
+    assert plan.plan_summary.split_type == "Full Body"
+    assert {(e.sets, e.reps) for day in plan.workout_plan for e in day.exercises} == {
+        (expected_sets, "До отказа")
+    }
+
+
+@pytest.mark.parametrize(
+    ("level", "equipment", "week", "expected"),
+    [
+        (FitnessLevelEnum.beginner, EquipmentTypeEnum.gym, 1, False),
+        (FitnessLevelEnum.beginner, EquipmentTypeEnum.gym, 3, True),
+        (FitnessLevelEnum.beginner, EquipmentTypeEnum.bodyweight, 2, True),
+        (FitnessLevelEnum.beginner, EquipmentTypeEnum.bodyweight, 3, False),
+        (FitnessLevelEnum.beginner, EquipmentTypeEnum.bodyweight, 5, False),
+        (FitnessLevelEnum.advanced, EquipmentTypeEnum.bodyweight, 3, True),
+    ],
+)
+def test_can_build_locally(level, equipment, week, expected):
+    assert can_build_locally(make_user(level=level, equipment=equipment), week) is expected
+
+
+def test_bodyweight_beginner_progression_week_falls_back_to_llm():
+    user = make_user(equipment=EquipmentTypeEnum.bodyweight)
+
+    assert build_local_plan(user, 3, make_week()) is None
+    assert build_local_plan(user, 5, make_week()) is None
+
+
+def test_incomplete_previous_week_falls_back_to_llm():
+    user = make_user(frequency=3)
+
+    assert build_local_plan(user, 2, make_week(frequency=2)) is None
+    assert build_local_plan(user, 2, []) is None
+
+
+def test_previous_workout_without_exercises_falls_back_to_llm():
+    week = make_week()
+    week[0].workout_exercises = []
+
+    assert build_local_plan(make_user(), 2, week) is None
@@ -0,0 +1,106 @@
+from types import SimpleNamespace
+
+import pytest
+
+from bot.services.plan_repair import PlanRepairError, _coerce_reps, repair_workout_plan
+
+CATALOG = [
+    SimpleNamespace(id=1, name="Жим штанги лежа"),
+    SimpleNamespace(id=2, name="Приседания со штангой"),
+    SimpleNamespace(id=3, name="Подтягивания"),
+]
+SUMMARY = {"periodization_type": "linear", "split_type": "full_body", "primary_goal": "strength"}
+
+
+def exercise(name, order=1, sets=3, reps=10, **extra) -> dict:
+    return {"order": order, "exercise_name": name, "sets": sets, "reps": reps, **extra}
+
+
+def day(*exercises, number=1) -> dict:
+    return {
+        "day": number,
+        "focus": "Все тело",
+        "warm_up": "Разминка",
+        "cool_down": "Заминка",
+        "exercises": list(exercises),
+    }
+
+
+def plan(*days) -> dict:
+    return {"plan_summary": SUMMARY, "workout_plan": list(days)}
+
+
+async def test_misspelled_name_is_matched_to_catalog():
+    result = await repair_workout_plan(
+        plan(day(exercise("жим штанги лёжа"), exercise("Приседания со штангoй", order=2))), CATALOG, 1
+    )
+
+    assert [e.exercise_name for e in result.workout_plan[0].exercises] == [
+        "Жим штанги лежа", "Приседания со штангой",
+    ]
+
+
+async def test_exercise_id_wins_over_name():
+    result = await repair_workout_plan(
+        plan(day(exercise("Что-то совсем другое", exercise_id=3))), CATALOG, 1
+    )
+
+    assert result.workout_plan[0].exercises[0].exercise_name == "Подтягивания"
+
+
+@pytest.mark.parametrize(
+    ("raw", "expected"),
+    [
+        ("8 - 10 повт.", "8-10"),
+        ("до отказа", "До отказа"),
+        ("12 раз", "12"),
+        (10.0, 10),
+        (12, 12),
+        ("", None),
+    ],
+)
+def test_reps_coercion(raw, expected):
+    assert _coerce_reps(raw) == expected
+
+
+async def test_orders_and_days_are_renumbered_and_extra_days_trimmed():
+    response = plan(
+        day(exercise("Подтягивания", order=5), exercise("Жим штанги лежа", order=5), number=3),
+        day(exercise("Приседания со штангой", order=0), number=3),
+        day(exercise("Подтягивания"), number=7),
+    )
+
+    result = await repair_workout_plan(response, CATALOG, workout_frequency=2)
+
+    assert [d.day for d in result.workout_plan] == [1, 2]
+    assert [e.order for e in result.workout_plan[0].exercises] == [1, 2]
+    assert result.workout_plan[1].exercises[0].order == 1
+
+
+async def test_broken_day_is_reasked_alone():
+    reasked = []
+
+    async def reask_day(day_number, broken_day, problems):
+        reasked.append((day_number, problems))
+        return day(exercise("Подтягивания"))
+
+    result = await repair_workout_plan(
+        plan(day(exercise("Жим штанги лежа")), day(exercise("Становая тяга"))), CATALOG, 2, reask_day
+    )
+
+    assert [number for number, _ in reasked] == [2]
+    assert "Становая тяга" in reasked[0][1][0]
+    assert result.workout_plan[1].exercises[0].exercise_name == "Подтягивания"
+
+
+async def test_still_invalid_reask_raises():
+    async def reask_day(day_number, broken_day, problems):
+        return day(exercise("Становая тяга"))
+
+    with pytest.raises(PlanRepairError, match="day 1"):
+        await repair_workout_plan(plan(day(exercise("Становая тяга"))), CATALOG, 1, reask_day)
+
+
+async def test_unfixable_day_without_reask_raises():
+    with pytest.raises(PlanRepairError):
+        await repair_workout_plan(plan(day(exercise("Подтягивания", sets="много"))), CATALOG, 1)
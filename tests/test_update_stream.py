@@ -0,0 +1,71 @@
+import asyncio
+
+from redis.exceptions import ConnectionError
+
+from bot.update_stream import CONSUMER_GROUP, STREAM_PREFIX, UpdateStreamConsumer, publish_update
+
+
+class FakeDispatcher:
+    def __init__(self):
+        self.updates: list[int] = []
+
+    async def feed_raw_update(self, bot, update: dict):
+        self.updates.append(update["update_id"])
+
+
+def make_update(update_id: int) -> dict:
+    return {"update_id": update_id, "message": {"chat": {"id": 0}, "text": "hi"}}
+
+
+async def wait_for(condition, timeout: float = 3) -> None:
+    """Ждет, пока асинхронное условие станет истинным."""
+    async def poll():
+        while not await condition():
+            await asyncio.sleep(0.01)
+    await asyncio.wait_for(poll(), timeout)
+
+
+async def test_ack_failure_does_not_stop_the_partition(redis, monkeypatch):
+    dp = FakeDispatcher()
+    consumer = UpdateStreamConsumer(redis, dp, bot=None, worker_index=0, worker_count=1)
+    stream = f"{STREAM_PREFIX}0"
+
+    real_xack = redis.xack
+    failures = iter([True])
+
+    async def flaky_xack(*args):
+        if next(failures, False):
+            raise ConnectionError("redis is restarting")
+        return await real_xack(*args)
+
+    monkeypatch.setattr(redis, "xack", flaky_xack)
+
+    real_xreadgroup = redis.xreadgroup
+
+    async def blocking_xreadgroup(*args, block=None, **kwargs):
+        # fakeredis не ждет новых записей при block: после пустого чтения уступаем цикл событий сами
+        response = await real_xreadgroup(*args, block=block, **kwargs)
+        if block and not response:
+            await asyncio.sleep(0.01)
+        return response
+
+    monkeypatch.setattr(redis, "xreadgroup", blocking_xreadgroup)
+
+    async def all_processed():
+        return dp.updates == [1, 2]
+
+    async def all_acknowledged():
+        return (await redis.xpending(stream, CONSUMER_GROUP))["pending"] == 0
+
+    consume = asyncio.create_task(consumer._consume(0))
+    try:
+        await publish_update(redis, make_update(1))
+        await publish_update(redis, make_update(2))
+        await wait_for(all_processed)
+        # Неподтвержденный апдейт подтверждается повторно, без повторной обработки
+        await wait_for(all_acknowledged)
+        assert not consume.done()
+        assert dp.updates == [1, 2]
+    finally:
+        consume.cancel()
+        await asyncio.gather(consume, return_exceptions=True)